@@ -0,0 +1,363 @@
+"""
+Search-as-you-type over product names.
+
+`AutocompleteIndex` keeps, for every word of every product name, the ids of
+the products containing it ordered best first, and a sorted array of all
+words. A query word is completed by bisecting that array for the range of
+words starting with it and merging their (already ranked) product lists.
+Prefixes matching many words ("a", "x1") keep their best results
+precomputed, so a lookup only touches about as many products as it returns.
+
+Products are ranked by `popularity_score`: the rating, boosted by how many
+reviews back it. Both are columns of the product, so product change events
+keep the ranking current. The engagement counters (app/engagement.py) are
+not used: they change with every view and are flushed per worker without
+change events, so the index would only see them at rebuilds. There are two
+scopes, all products (admins & vendors) and active products (everyone else).
+
+The index is built in the background on startup (or by the first query),
+updated from product change events and rebuilt in the background every
+AUTOCOMPLETE_REFRESH_SECONDS to pick up writes made by other workers.
+"""
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from itertools import islice
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Product
+from app.product_events import on_products_changed
+from app.search import tokenize
+
+logger = logging.getLogger(__name__)
+
+AUTOCOMPLETE_REFRESH_SECONDS = int(os.getenv("AUTOCOMPLETE_REFRESH_SECONDS", "600"))
+# More pending changes than this are left to a background rebuild instead of being applied one by one
+AUTOCOMPLETE_MAX_PENDING_UPDATES = 5000
+# How long queries wait for a build that is already running before answering empty
+AUTOCOMPLETE_BUILD_WAIT_SECONDS = 30
+# Prefixes matching more words than this keep their best results precomputed
+WIDE_PREFIX_WORDS = 32
+# Most suggestions a query can ask for
+MAX_RESULTS = 20
+# Candidates checked at most for a query of several words
+MAX_SCANNED = 20_000
+
+SCOPES = ("all", "active")
+
+
+def popularity_score(rating, review_count) -> float:
+    """Rating weighted by the number of reviews, 0 for unrated products."""
+    return (rating or 0.0) * math.log2(2 + (review_count or 0))
+
+
+def _unique(ids):
+    seen = set()
+    for product_id in ids:
+        if product_id not in seen:
+            seen.add(product_id)
+            yield product_id
+
+
+class _IndexState:
+    """The data of one index build, swapped as a whole on rebuilds."""
+
+    def __init__(self):
+        self.products = {}                                  # id -> (name, score, is_active)
+        self.postings = {scope: {} for scope in SCOPES}     # scope -> word -> ids, best first
+        self.words = {scope: [] for scope in SCOPES}        # scope -> sorted words
+        self.top = {scope: {} for scope in SCOPES}          # scope -> wide prefix -> best MAX_RESULTS ids
+
+    def rank(self, product_id):
+        _, score, _ = self.products[product_id]
+        return (-score, product_id)
+
+    def _scopes(self, is_active):
+        return SCOPES if is_active else ("all",)
+
+    def load(self, rows):
+        """Bulk load `(id, name, rating, review_count, is_active)` rows into an empty state."""
+        for product_id, name, rating, review_count, is_active in rows:
+            self.products[product_id] = (name or "", popularity_score(rating, review_count), bool(is_active))
+            for word in set(tokenize(name)):
+                for scope in self._scopes(is_active):
+                    self.postings[scope].setdefault(word, []).append(product_id)
+        for scope in SCOPES:
+            for ids in self.postings[scope].values():
+                ids.sort(key=self.rank)
+            self.words[scope] = sorted(self.postings[scope])
+            # Precompute the results of all wide prefixes, so no query has to merge thousands of lists
+            self._best(scope, "", 0, len(self.words[scope]))
+
+    def _offer(self, scope, word, product_id):
+        """Put a product added under `word` into the precomputed results of the word's prefixes."""
+        top = self.top[scope]
+        rank = self.rank(product_id)
+        for length in range(len(word) + 1):
+            best = top.get(word[:length])
+            if best is None or product_id in best:
+                continue
+            if len(best) < MAX_RESULTS or rank < self.rank(best[-1]):
+                insort(best, product_id, key=self.rank)
+                del best[MAX_RESULTS:]
+
+    def _forget(self, scope, word, product_id):
+        """Drop the precomputed results a removed product was part of, they are recomputed when queried."""
+        top = self.top[scope]
+        for length in range(len(word) + 1):
+            best = top.get(word[:length])
+            if best is not None and product_id in best:
+                del top[word[:length]]
+
+    def add(self, product_id, name, rating, review_count, is_active):
+        self.products[product_id] = (name or "", popularity_score(rating, review_count), bool(is_active))
+        for word in set(tokenize(name)):
+            for scope in self._scopes(is_active):
+                postings = self.postings[scope]
+                if word not in postings:
+                    postings[word] = []
+                    insort(self.words[scope], word)
+                insort(postings[word], product_id, key=self.rank)
+                self._offer(scope, word, product_id)
+
+    def remove(self, product_id):
+        entry = self.products.get(product_id)
+        if entry is None:
+            return
+        name, score, is_active = entry
+        for word in set(tokenize(name)):
+            for scope in self._scopes(is_active):
+                ids = self.postings[scope].get(word)
+                if not ids:
+                    continue
+                position = bisect_left(ids, (-score, product_id), key=self.rank)
+                if position < len(ids) and ids[position] == product_id:
+                    del ids[position]
+                if not ids:
+                    del self.postings[scope][word]
+                    words = self.words[scope]
+                    del words[bisect_left(words, word)]
+                self._forget(scope, word, product_id)
+        del self.products[product_id]
+
+    def _range(self, scope, prefix):
+        """Positions of the words starting with `prefix` in the sorted words."""
+        words = self.words[scope]
+        start = bisect_left(words, prefix)
+        return start, bisect_left(words, prefix + "\U0010ffff", start)
+
+    def _best(self, scope, prefix, start, end):
+        """
+        Best MAX_RESULTS products with a word in words[start:end], all of which start with `prefix`.
+        - Narrow ranges merge the ranked product lists of their words directly.
+        - Wide ranges merge the results of their one letter longer prefixes and are kept in `top`,
+          updated as products are added and dropped when one of their products is removed.
+        """
+        words = self.words[scope]
+        postings = self.postings[scope]
+        if end - start <= WIDE_PREFIX_WORDS:
+            lists = [postings[word] for word in words[start:end]]
+            return list(islice(_unique(heapq.merge(*lists, key=self.rank)), MAX_RESULTS))
+
+        top = self.top[scope]
+        if prefix in top:
+            return top[prefix]
+        parts = []
+        position = start
+        if words[position] == prefix:
+            parts.append(postings[prefix][:MAX_RESULTS])
+            position += 1
+        depth = len(prefix) + 1
+        while position < end:
+            child = words[position][:depth]
+            child_end = bisect_left(words, child + "\U0010ffff", position, end)
+            parts.append(self._best(scope, child, position, child_end))
+            position = child_end
+        top[prefix] = list(islice(_unique(heapq.merge(*parts, key=self.rank)), MAX_RESULTS))
+        return top[prefix]
+
+    def complete(self, scope, query: str, limit: int):
+        """Ids of the best products whose names contain the query words, the last one as a prefix."""
+        words = tokenize(query)
+        if not words:
+            return []
+        # A trailing space means the last word is complete as well
+        prefix = None if query[-1].isspace() else words.pop()
+        postings = self.postings[scope]
+
+        if not words:
+            start, end = self._range(scope, prefix)
+            return self._best(scope, prefix, start, end)[:limit] if end > start else []
+
+        # Several words: walk the shortest ranked list that every match must be in, check the rest
+        if any(word not in postings for word in words):
+            return []
+        candidates = min((postings[word] for word in words), key=len)
+        required = set(words)
+        if prefix is not None:
+            start, end = self._range(scope, prefix)
+            if end == start:
+                return []
+            if end - start <= WIDE_PREFIX_WORDS:
+                lists = [postings[word] for word in self.words[scope][start:end]]
+                if sum(map(len, lists)) < len(candidates):
+                    candidates, prefix = _unique(heapq.merge(*lists, key=self.rank)), None
+
+        result = []
+        for product_id in islice(_unique(candidates), MAX_SCANNED):
+            name_words = set(tokenize(self.products[product_id][0]))
+            if not required <= name_words:
+                continue
+            if prefix is not None and not any(word.startswith(prefix) for word in name_words):
+                continue
+            result.append(product_id)
+            if len(result) >= limit:
+                break
+        return result
+
+
+class AutocompleteIndex:
+    """Prefix index over product names, maintained from product change events."""
+
+    def __init__(self, refresh_seconds: int = AUTOCOMPLETE_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._state = None
+        self._built_at = None
+        self._pending = set()
+        self._changed_during_build = None   # ids changed while a rebuild reads the database
+        self._ready = threading.Event()
+        self._building = False
+
+    def invalidate(self, product_ids):
+        """Reindex these products on the next query."""
+        with self._lock:
+            self._pending.update(product_ids)
+            if self._changed_during_build is not None:
+                self._changed_during_build.update(product_ids)
+
+    @staticmethod
+    def _rows(db: Session, product_ids=None):
+        stmt = select(Product.id, Product.name, Product.product_rating, Product.review_count, Product.is_active)
+        if product_ids is not None:
+            stmt = stmt.where(Product.id.in_(product_ids))
+        return db.execute(stmt.execution_options(yield_per=10_000))
+
+    def rebuild(self, db: Session):
+        """Build a new index from the database and swap it in; queries keep using the old one meanwhile."""
+        with self._lock:
+            self._changed_during_build = set()
+        started = time.perf_counter()
+        state = _IndexState()
+        try:
+            state.load(self._rows(db))
+        except Exception:
+            with self._lock:
+                self._changed_during_build = None
+            raise
+        with self._lock:
+            self._state = state
+            self._built_at = time.monotonic()
+            # Changes committed after the rows were read are applied on the next query
+            self._pending = self._changed_during_build
+            self._changed_during_build = None
+        self._ready.set()
+        logger.info(f"Built product autocomplete index: {len(state.products)} products in {time.perf_counter() - started:.2f}s")
+
+    def _claim_build(self):
+        """True when the caller may build, i.e. no other build is running; called with the lock held."""
+        if self._building:
+            return False
+        self._building = True
+        return True
+
+    def _build(self, db: Session = None):
+        from app.database import ReadSessionLocal
+
+        own_session = db is None
+        db = ReadSessionLocal() if own_session else db
+        try:
+            self.rebuild(db)
+        except Exception:
+            logger.exception("Building the product autocomplete index failed")
+        finally:
+            if own_session:
+                db.close()
+            with self._lock:
+                self._building = False
+
+    def start_rebuild(self):
+        """Rebuild in a background thread, unless a build is already running."""
+        with self._lock:
+            if not self._claim_build():
+                return
+        threading.Thread(target=self._build, name="autocomplete-rebuild", daemon=True).start()
+
+    def _sync(self, db: Session):
+        """
+        Apply pending changes.
+        - The pending ids are taken under the lock but read from the database outside it, like `rebuild`,
+          so concurrent queries never wait on that round trip.
+        """
+        with self._lock:
+            if not self._pending:
+                return
+            if len(self._pending) > AUTOCOMPLETE_MAX_PENDING_UPDATES:
+                # Bulk changes (imports) are left to a background rebuild
+                if self._claim_build():
+                    threading.Thread(target=self._build, name="autocomplete-rebuild", daemon=True).start()
+                return
+            product_ids, self._pending = list(self._pending), set()
+        try:
+            rows = self._rows(db, product_ids).all()
+        except Exception:
+            with self._lock:
+                self._pending.update(product_ids)
+            raise
+        # Changes committed after the read are pending again, the next query applies them
+        with self._lock:
+            for product_id in product_ids:
+                self._state.remove(product_id)
+            for row in rows:
+                self._state.add(*row)
+
+    def complete(self, db: Session, query: str, active_only: bool, limit: int = 10):
+        """`(id, name)` of the best products matching a partially typed query."""
+        if self._state is None:
+            # The first query builds the index, or waits for the build started on startup
+            with self._lock:
+                build_here = self._claim_build()
+            if build_here:
+                self._build(db)
+            else:
+                self._ready.wait(AUTOCOMPLETE_BUILD_WAIT_SECONDS)
+            if self._state is None:
+                return []
+        elif time.monotonic() - self._built_at > self.refresh_seconds:
+            self.start_rebuild()
+
+        self._sync(db)
+        with self._lock:
+            state = self._state
+            product_ids = state.complete("active" if active_only else "all", query, limit)
+            return [(product_id, state.products[product_id][0]) for product_id in product_ids]
+
+    def status(self):
+        state = self._state
+        return {
+            "products": len(state.products) if state else 0,
+            "words": len(state.words["all"]) if state else 0,
+            "pending": len(self._pending),
+            "building": self._building,
+            "age_seconds": None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+        }
+
+
+autocomplete_index = AutocompleteIndex()
+on_products_changed(autocomplete_index.invalidate)
@@ -0,0 +1,92 @@
+"""
+Maintenance commands, run against DATABASE_URL:
+
+    python -m app.cli backfill-ratings [--batch-size 10000]
+    python -m app.cli rebuild-categories
+    python -m app.cli build-related [--full] [--batch-size 1000] [--top-k 20]
+    python -m app.cli expire-holds [--batch-size 1000]
+"""
+import argparse
+import time
+
+from app.database import SessionLocal
+
+
+def backfill_ratings(args):
+    """Recompute the review aggregates of every product from its reviews."""
+    from app.crud.review import backfill_rating_aggregates
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        updated = backfill_rating_aggregates(db, batch_size=args.batch_size)
+        print(f"✅ Updated the review aggregates of {updated} products in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+def rebuild_categories(args):
+    """Link products to their categories and recount the active products per category."""
+    from app.crud.category import rebuild_categories as rebuild
+
+    db = SessionLocal()
+    try:
+        categories, linked = rebuild(db)
+        print(f"✅ {categories} categories, linked {linked} products")
+    finally:
+        db.close()
+
+
+def build_related(args):
+    """Count newly paid orders into the co-purchase table and refresh the related products."""
+    from app.crud.co_purchase import build_related_products, RELATED_PRODUCTS_TOP_K
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        orders, products = build_related_products(
+            db, full=args.full, batch_size=args.batch_size, top_k=args.top_k or RELATED_PRODUCTS_TOP_K
+        )
+        print(f"✅ Counted {orders} orders, refreshed the related products of {products} products in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+def expire_holds(args):
+    """Delete expired stock holds of cart lines."""
+    from app.crud.stock import expire_holds as expire
+
+    db = SessionLocal()
+    try:
+        print(f"✅ Deleted {expire(db, batch_size=args.batch_size)} expired stock holds")
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("backfill-ratings", help=backfill_ratings.__doc__)
+    command.add_argument("--batch-size", type=int, default=10_000, help="product ids per transaction")
+    command.set_defaults(run=backfill_ratings)
+
+    command = commands.add_parser("rebuild-categories", help=rebuild_categories.__doc__)
+    command.set_defaults(run=rebuild_categories)
+
+    command = commands.add_parser("build-related", help=build_related.__doc__)
+    command.add_argument("--full", action="store_true", help="forget all counts and recount every paid order")
+    command.add_argument("--batch-size", type=int, default=1000, help="orders per transaction")
+    command.add_argument("--top-k", type=int, help="related products kept per product (default RELATED_PRODUCTS_TOP_K, 20)")
+    command.set_defaults(run=build_related)
+
+    command = commands.add_parser("expire-holds", help=expire_holds.__doc__)
+    command.add_argument("--batch-size", type=int, default=1000, help="holds deleted per transaction")
+    command.set_defaults(run=expire_holds)
+
+    args = parser.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,166 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.models import Cart, Wishlist, Product
-from app.schemas import CartCreate, WishlistCreate, CartListResponse, WishlistResponse, ProductResponse, CartResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Wishlist, Product
+from app.crud.cart_store import LINE_PRODUCT_COLUMNS, cart_store
+from app.crud.stock import release_stock, reserve_stock, reserve_stock_many
+from app.engagement import engagement_counters
+from app.schemas import CartCreate, WishlistCreate
+from app.serializers import serialize_product
 from fastapi import HTTPException
-from datetime import datetime
-import pytz
 
-IST = pytz.timezone("Asia/Kolkata")
 
-def get_cart_items(db: Session, user_id: int) -> CartListResponse:
-    """
-    Retrieve all cart items for a user, fetch product details, and calculate total cart amount.
-    """
-    cart_items = db.query(Cart).filter(Cart.user_id == user_id).all()
-    if not cart_items:
+def _cart_response(rows) -> dict:
+    """Cart lines and the total amount, computed in one pass over the joined rows."""
+    if not rows:
         raise HTTPException(status_code=404, detail="Cart is empty.")
 
     result = []
     total_amount = 0  # Total cart amount
-
-    for item in cart_items:
-        print(f"Processing Cart Item ID: {item.id}, Product ID: {item.product_id}, Quantity: {item.quantity}")
-        
-        # Fetch product details
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
+    for item in rows:
+        if item.Product is None:
             raise HTTPException(status_code=404, detail=f"Product with ID {item.product_id} not found.")
+        total_amount += item.Product.price_after_discount * item.quantity
+        result.append(_cart_line(item, item.Product))
 
-        # Calculate item total price
-        item_total_price = product.price_after_discount * item.quantity
-        total_amount += item_total_price
+    return {"cart_items": result, "total_amount": total_amount}
 
-        # Convert timestamps to IST
-        created_at_ist = product.created_at.astimezone(IST).isoformat() if product.created_at else None
-        updated_at_ist = product.updated_at.astimezone(IST).isoformat() if product.updated_at else None
 
-        # Product response data
-        product_data = ProductResponse(
-            id=product.id, name=product.name, description=product.description,
-            price_before_discount=product.price_before_discount, price_after_discount=product.price_after_discount,
-            discount_percentage=product.discount_percentage, category=product.category, image_url=product.image_url,
-            stock_remaining=product.stock_remaining, product_rating=product.product_rating, is_active=product.is_active,
-            created_at=created_at_ist, updated_at=updated_at_ist
-        )
+def get_cart_items(db: Session, user_id: int) -> dict:
+    """
+    Retrieve all cart items for a user with their product details and the total cart amount.
+    - At most one query, whatever the number of lines (see `cart_store`).
+    """
+    return _cart_response(cart_store.rows(db, user_id))
+
+
+async def get_cart_items_async(db: AsyncSession, user_id: int) -> dict:
+    """
+    Async variant of `get_cart_items`, for the "orm" cart store (its calls do not block the event loop).
+    """
+    return _cart_response(await db.run_sync(cart_store.rows, user_id))
 
-        result.append(CartResponse(
-            id=item.id, user_id=item.user_id, product_id=item.product_id, 
-            quantity=item.quantity, product=product_data
-        ))
 
-    return CartListResponse(cart_items=result, total_amount=total_amount)
+def _cart_line(item, product: Product) -> dict:
+    """Build the response for one cart line with its product details."""
+    return {
+        "id": item.id, "user_id": item.user_id, "product_id": item.product_id,
+        "quantity": item.quantity, "product": serialize_product(product, "customer"),
+    }
 
 
 def get_wishlist_items(db: Session, user_id: int):
     """
-    Retrieve all items in the user's wishlist.
+    Retrieve all items in the user's wishlist with their product details.
+    - One query, whatever the number of items.
     """
-    wishlist_items = db.query(Wishlist).filter(Wishlist.user_id == user_id).all()
-    if not wishlist_items:
+    rows = db.execute(
+        select(Wishlist.id, Wishlist.user_id, Wishlist.product_id, Product)
+        .outerjoin(Product, Product.id == Wishlist.product_id)
+        .where(Wishlist.user_id == user_id)
+        .options(LINE_PRODUCT_COLUMNS)
+        .order_by(Wishlist.id)
+    ).all()
+    if not rows:
         raise HTTPException(status_code=200, detail="Your wishlist is empty.")  # Changed 404 to 200
 
     result = []
-
-    for item in wishlist_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if not product:
+    for item in rows:
+        if item.Product is None:
             raise HTTPException(status_code=404, detail=f"Product with ID {item.product_id} not found.")
-
-        # Convert timestamps to IST
-        created_at_ist = product.created_at.astimezone(IST).isoformat() if product.created_at else None
-        updated_at_ist = product.updated_at.astimezone(IST).isoformat() if product.updated_at else None
-
-        product_data = ProductResponse(
-            id=product.id, name=product.name, description=product.description,
-            price_before_discount=product.price_before_discount, price_after_discount=product.price_after_discount,
-            discount_percentage=product.discount_percentage, category=product.category, image_url=product.image_url,
-            stock_remaining=product.stock_remaining, product_rating=product.product_rating, is_active=product.is_active,
-            created_at=created_at_ist, updated_at=updated_at_ist
-        )
-
-        result.append(WishlistResponse(id=item.id, user_id=item.user_id, product_id=item.product_id, product=product_data))
+        result.append({
+            "id": item.id, "user_id": item.user_id, "product_id": item.product_id,
+            "product": serialize_product(item.Product, "customer"),
+        })
 
     return result
 
 
-def add_to_cart(db: Session, user_id: int, cart_data: CartCreate):
+def add_to_cart(db: Session, user_id: int, cart_data: CartCreate) -> dict:
     """
     Add a product to the cart.
+    - The quantity is held for STOCK_HOLD_MINUTES instead of being taken off the product's stock.
     """
-    product = db.query(Product).filter(Product.id == cart_data.product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    if cart_data.quantity > product.stock_remaining:
-        raise HTTPException(status_code=400, detail=f"Only {product.stock_remaining} units available")
-
-    cart_item = db.query(Cart).filter(Cart.user_id == user_id, Cart.product_id == cart_data.product_id).first()
-    if cart_item:
-        raise HTTPException(status_code=400, detail="Product already in cart. Update quantity instead.")
+    with cart_store.user_lock(db, user_id):
+        if cart_store.quantities(db, user_id, [cart_data.product_id]):
+            raise HTTPException(status_code=400, detail="Product already in cart. Update quantity instead.")
 
-    cart_item = Cart(user_id=user_id, **cart_data.dict())
-    db.add(cart_item)
-    product.stock_remaining -= cart_data.quantity
-    db.commit()
-    db.refresh(cart_item)
+        reserve_stock(db, user_id, cart_data.product_id, cart_data.quantity)
+        cart_store.set(db, user_id, {cart_data.product_id: cart_data.quantity})
+        db.commit()
+    engagement_counters.record(cart_data.product_id, "cart_add")
 
-    return cart_item
+    line = cart_store.rows(db, user_id, [cart_data.product_id])[0]
+    return _cart_line(line, line.Product)
 
 def remove_from_cart(db: Session, user_id: int, product_id: int):
     """
-    Remove a product from the user's cart.
+    Remove a product from the user's cart and release its stock hold.
     """
-    cart_item = db.query(Cart).filter(Cart.user_id == user_id, Cart.product_id == product_id).first()
-    if not cart_item:
-        raise HTTPException(status_code=404, detail="Item not found in cart")
-
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if product:
-        product.stock_remaining += cart_item.quantity
+    with cart_store.user_lock(db, user_id):
+        if not cart_store.remove(db, user_id, product_id):
+            raise HTTPException(status_code=404, detail="Item not found in cart")
 
-    db.delete(cart_item)
-    db.commit()
+        release_stock(db, user_id, product_id)
+        db.commit()
     return {"message": "Item removed from cart"}
     
+# Most lines one bulk merge may carry
+CART_BULK_MAX_LINES = 100
+
+
+def set_cart_quantity(db: Session, user_id: int, product_id: int, quantity: int) -> dict:
+    """
+    Set the quantity of a product in the cart, adding the line when it is missing.
+    - The line is written after the stock check; with the "orm" store in the same transaction as the hold.
+    """
+    if quantity < 1:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1. Remove the item instead.")
+
+    with cart_store.user_lock(db, user_id):
+        added = not cart_store.quantities(db, user_id, [product_id])
+        reserve_stock(db, user_id, product_id, quantity)
+        cart_store.set(db, user_id, {product_id: quantity})
+        db.commit()
+    if added:
+        engagement_counters.record(product_id, "cart_add")
+
+    line = cart_store.rows(db, user_id, [product_id])[0]
+    return _cart_line(line, line.Product)
+
+
+def merge_cart(db: Session, user_id: int, items) -> dict:
+    """
+    Merge cart lines (e.g. a guest cart after login) into the user's cart, in one transaction.
+    - Quantities of products already in the cart are added up.
+    - Stock is validated for all lines at once; if any line is short, nothing changes.
+    - Returns the whole cart, like `get_cart_items`.
+    """
+    if not items:
+        raise HTTPException(status_code=400, detail="No cart items given.")
+    if len(items) > CART_BULK_MAX_LINES:
+        raise HTTPException(status_code=400, detail=f"At most {CART_BULK_MAX_LINES} lines per request.")
+
+    quantities = {}
+    for item in items:
+        if item.quantity < 1:
+            raise HTTPException(status_code=400, detail=f"Quantity of product {item.product_id} must be at least 1.")
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    with cart_store.user_lock(db, user_id):
+        existing = cart_store.quantities(db, user_id, list(quantities))
+        for product_id, quantity in existing.items():
+            quantities[product_id] += quantity
+
+        reserve_stock_many(db, user_id, quantities)
+        cart_store.set(db, user_id, quantities)
+        db.commit()
+    for product_id in quantities.keys() - existing.keys():
+        engagement_counters.record(product_id, "cart_add")
+
+    return get_cart_items(db, user_id)
+
+
 def add_to_wishlist(db: Session, user_id: int, wishlist_data: WishlistCreate):
     """
     Add a product to the user's wishlist.
@@ -135,6 +175,7 @@ def add_to_wishlist(db: Session, user_id: int, wishlist_data: WishlistCreate):
     db.add(wishlist_item)
     db.commit()
     db.refresh(wishlist_item)
+    engagement_counters.record(wishlist_data.product_id, "wishlist_add")
     return wishlist_item
 
 def remove_from_wishlist(db: Session, user_id: int, product_id: int):
@@ -0,0 +1,463 @@
+"""
+Where cart lines live, selected with CART_STORE.
+
+- "orm" (default): the `carts` table, changed in the request's transaction.
+- "kv": a local SQLite database in WAL mode (CART_STORE_PATH), shared by the
+  workers of one host. A change updates the line and appends it to
+  `cart_log` in one local transaction; a background thread writes the log to
+  the `carts` table every CART_FLUSH_SECONDS and deletes the entries only
+  after that commit, so entries left behind by a crash are replayed on the
+  next start. Entries set a quantity (0 removes the line), replaying one twice
+  changes nothing. A user's lines are copied from `carts` on first use.
+
+Stock holds stay in the database with either store, so stock is shared
+correctly between hosts. The lines of the kv store are not: route the
+requests of a user to the same host. The kv store also writes a line before
+the request commits its stock hold; should that commit fail, the line is
+left without a hold and checkout checks its stock again.
+
+A read-modify-write of a user's cart runs under `user_lock`, which both
+stores take in what the workers share: the user's row in the database, or
+a byte of a lock file next to the kv store. The kv store's calls block, so
+the async routes only use the orm store (see app/main.py).
+"""
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.orm import Session, load_only
+
+from app.models import Cart, Product, User
+from app.serializers import PUBLIC_FIELDS
+
+logger = logging.getLogger(__name__)
+
+CART_STORE = os.getenv("CART_STORE", "orm")
+CART_STORE_PATH = os.getenv("CART_STORE_PATH", "cart_store.db")
+CART_FLUSH_SECONDS = float(os.getenv("CART_FLUSH_SECONDS", "1"))
+# NORMAL survives a crash of the worker, FULL also a power loss (one fsync per change)
+CART_STORE_SYNCHRONOUS = os.getenv("CART_STORE_SYNCHRONOUS", "NORMAL")
+# Log entries written to the database per transaction
+CART_FLUSH_BATCH_SIZE = 1000
+# Per user thread locks of a kv worker, striped: user_id % USER_LOCK_STRIPES
+USER_LOCK_STRIPES = 256
+
+# Product columns shown on a cart or wishlist line (see serialize_product)
+LINE_PRODUCT_COLUMNS = load_only(*(getattr(Product, field) for field in PUBLIC_FIELDS), Product.created_at, Product.updated_at)
+
+# A cart line with its product, shaped like the rows of `cart_lines_query`; `id` is None in the kv store
+CartRow = namedtuple("CartRow", "id user_id product_id quantity Product")
+
+
+def cart_lines_query(user_id: int, product_ids=None, for_order: bool = False):
+    """
+    A user's cart lines with their products, in one joined statement.
+    - `for_order` loads whole products, locked for the stock deduction, in id order.
+    """
+    stmt = select(Cart.id, Cart.user_id, Cart.product_id, Cart.quantity, Product).where(Cart.user_id == user_id)
+    if product_ids is not None:
+        stmt = stmt.where(Cart.product_id.in_(product_ids))
+    if for_order:
+        return stmt.join(Product, Product.id == Cart.product_id).order_by(Product.id).with_for_update(of=Product)
+    return stmt.outerjoin(Product, Product.id == Cart.product_id).options(LINE_PRODUCT_COLUMNS).order_by(Cart.id)
+
+
+def cart_upsert(db: Session):
+    """`INSERT ... ON CONFLICT DO UPDATE` setting the quantity of a user's cart line."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(Cart)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "product_id"],
+        set_={"quantity": stmt.excluded.quantity},
+    )
+
+
+class CartStore(ABC):
+    """Interface of the cart stores; quantities are `{product_id: quantity}`."""
+
+    name = None
+
+    @abstractmethod
+    def user_lock(self, db: Session, user_id: int):
+        """Context manager held around a read-modify-write of a user's cart, serializes the user's requests across workers."""
+
+    @abstractmethod
+    def rows(self, db: Session, user_id: int, product_ids=None, for_order: bool = False):
+        """The user's lines with their products (see `cart_lines_query`)."""
+
+    @abstractmethod
+    def quantities(self, db: Session, user_id: int, product_ids=None) -> dict:
+        """Quantities of the user's lines, only of `product_ids` when given."""
+
+    @abstractmethod
+    def set(self, db: Session, user_id: int, quantities: dict):
+        """Set the quantity of these lines, adding the missing ones."""
+
+    @abstractmethod
+    def remove(self, db: Session, user_id: int, product_id: int) -> bool:
+        """Remove a line; False when it was not in the cart."""
+
+    @abstractmethod
+    def clear(self, db: Session, user_id: int, product_ids):
+        """Remove these lines, e.g. once they are ordered."""
+
+    def flush(self) -> int:
+        """Write changes that are not in the `carts` table yet; returns how many were written."""
+        return 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def status(self):
+        return {"store": self.name}
+
+
+class OrmCartStore(CartStore):
+    """Cart lines in the `carts` table, changed in the caller's transaction."""
+
+    name = "orm"
+
+    @contextmanager
+    def user_lock(self, db: Session, user_id: int):
+        """
+        Locks the user's row until the caller's transaction ends.
+        - SQLite has no row locks: a no-op update of the row takes the database's write lock up front instead.
+        """
+        if db.get_bind().dialect.name == "sqlite":
+            db.execute(update(User).where(User.id == user_id).values(id=User.id))
+        else:
+            db.execute(select(User.id).where(User.id == user_id).with_for_update())
+        yield
+
+    def rows(self, db: Session, user_id: int, product_ids=None, for_order: bool = False):
+        return db.execute(cart_lines_query(user_id, product_ids, for_order)).all()
+
+    def quantities(self, db: Session, user_id: int, product_ids=None) -> dict:
+        stmt = select(Cart.product_id, Cart.quantity).where(Cart.user_id == user_id)
+        if product_ids is not None:
+            stmt = stmt.where(Cart.product_id.in_(product_ids))
+        return dict(db.execute(stmt).all())
+
+    def set(self, db: Session, user_id: int, quantities: dict):
+        db.execute(cart_upsert(db), [
+            {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+            for product_id, quantity in sorted(quantities.items())
+        ])
+
+    def remove(self, db: Session, user_id: int, product_id: int) -> bool:
+        result = db.execute(
+            delete(Cart)
+            .where(Cart.user_id == user_id, Cart.product_id == product_id)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
+    def clear(self, db: Session, user_id: int, product_ids):
+        db.execute(
+            delete(Cart)
+            .where(Cart.user_id == user_id, Cart.product_id.in_(product_ids))
+            .execution_options(synchronize_session=False)
+        )
+
+
+_KV_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cart_lines (
+    user_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    UNIQUE (user_id, product_id)
+);
+CREATE TABLE IF NOT EXISTS cart_users (user_id INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS cart_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL
+);
+"""
+
+
+class KvCartStore(CartStore):
+    """Cart lines in a local SQLite WAL database, written behind to the `carts` table."""
+
+    name = "kv"
+
+    def __init__(self, path: str = CART_STORE_PATH, flush_seconds: float = CART_FLUSH_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self._local = threading.local()     # one connection per thread
+        self._loaded = set()                # users whose lines are in the store; they stay once copied
+        self._flush_lock = threading.Lock()
+        self._user_locks = [threading.Lock() for _ in range(USER_LOCK_STRIPES)]
+        self._user_lock_file = None
+        self._user_lock_file_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self.flushed_entries = 0
+        self.failed_flushes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={CART_STORE_SYNCHRONOUS}")
+            conn.executescript(_KV_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """A local write transaction; IMMEDIATE takes the write lock up front, so it never has to be upgraded."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _user_lock_handle(self):
+        # Kept open: closing any handle of the file would drop all fcntl locks of this process on it
+        with self._user_lock_file_lock:
+            if self._user_lock_file is None:
+                self._user_lock_file = open(self.path + ".user-locks", "a")
+            return self._user_lock_file
+
+    @contextmanager
+    def user_lock(self, db: Session, user_id: int):
+        """
+        Locks byte `user_id` of the store's lock file, shared by the workers of the host.
+        - fcntl locks belong to the process, so the threads of this worker take a striped thread lock first.
+        """
+        with self._user_locks[user_id % USER_LOCK_STRIPES]:
+            handle = self._user_lock_handle()
+            fcntl.lockf(handle, fcntl.LOCK_EX, 1, user_id)
+            try:
+                yield
+            finally:
+                fcntl.lockf(handle, fcntl.LOCK_UN, 1, user_id)
+
+    def _is_loaded(self, user_id: int) -> bool:
+        if user_id in self._loaded:
+            return True
+        if self._connection().execute("SELECT 1 FROM cart_users WHERE user_id = ?", (user_id,)).fetchone():
+            self._loaded.add(user_id)
+            return True
+        return False
+
+    def _load(self, user_id: int, quantities: dict):
+        """Copy the user's lines read from `carts` into the store, unless another worker did meanwhile."""
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM cart_users WHERE user_id = ?", (user_id,)).fetchone() is None:
+                conn.executemany(
+                    "INSERT INTO cart_lines (user_id, product_id, quantity) VALUES (?, ?, ?)",
+                    [(user_id, product_id, quantity) for product_id, quantity in quantities.items()],
+                )
+                conn.execute("INSERT INTO cart_users (user_id) VALUES (?)", (user_id,))
+        self._loaded.add(user_id)
+
+    def _ensure_loaded(self, db: Session, user_id: int):
+        if not self._is_loaded(user_id):
+            self._load(user_id, dict(db.execute(select(Cart.product_id, Cart.quantity).where(Cart.user_id == user_id)).all()))
+
+    def _lines(self, user_id: int, product_ids=None):
+        """`(product_id, quantity)` of the user's lines, in the order they were added."""
+        rows = self._connection().execute(
+            "SELECT product_id, quantity FROM cart_lines WHERE user_id = ? ORDER BY rowid", (user_id,)
+        ).fetchall()
+        if product_ids is not None:
+            wanted = set(product_ids)
+            rows = [row for row in rows if row[0] in wanted]
+        return rows
+
+    def rows(self, db: Session, user_id: int, product_ids=None, for_order: bool = False):
+        from app.crud.product import get_products_by_ids
+
+        products = {}
+        if not self._is_loaded(user_id):
+            # First use: the lines come from `carts`, together with their products
+            loaded = db.execute(cart_lines_query(user_id, None, for_order)).all()
+            self._load(user_id, {row.product_id: row.quantity for row in loaded})
+            products = {row.product_id: row.Product for row in loaded if row.Product is not None}
+        lines = self._lines(user_id, product_ids)
+        missing = [product_id for product_id, _ in lines if product_id not in products]
+
+        if for_order:
+            if missing:
+                products.update((product.id, product) for product in db.scalars(
+                    select(Product).where(Product.id.in_(missing)).order_by(Product.id).with_for_update()
+                ))
+            return [
+                CartRow(None, user_id, product_id, quantity, products[product_id])
+                for product_id, quantity in sorted(lines) if product_id in products
+            ]
+        if missing:
+            products.update(get_products_by_ids(db, missing))
+        return [CartRow(None, user_id, product_id, quantity, products.get(product_id)) for product_id, quantity in lines]
+
+    def quantities(self, db: Session, user_id: int, product_ids=None) -> dict:
+        self._ensure_loaded(db, user_id)
+        return dict(self._lines(user_id, product_ids))
+
+    def set(self, db: Session, user_id: int, quantities: dict):
+        self._ensure_loaded(db, user_id)
+        values = [(user_id, product_id, quantity) for product_id, quantity in sorted(quantities.items())]
+        with self._write() as conn:
+            conn.executemany(
+                "INSERT INTO cart_lines (user_id, product_id, quantity) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = excluded.quantity",
+                values,
+            )
+            conn.executemany("INSERT INTO cart_log (user_id, product_id, quantity) VALUES (?, ?, ?)", values)
+
+    def remove(self, db: Session, user_id: int, product_id: int) -> bool:
+        self._ensure_loaded(db, user_id)
+        with self._write() as conn:
+            removed = conn.execute(
+                "DELETE FROM cart_lines WHERE user_id = ? AND product_id = ?", (user_id, product_id)
+            ).rowcount > 0
+            if removed:
+                conn.execute("INSERT INTO cart_log (user_id, product_id, quantity) VALUES (?, ?, 0)", (user_id, product_id))
+        return removed
+
+    def clear(self, db: Session, user_id: int, product_ids):
+        self._ensure_loaded(db, user_id)
+        values = [(user_id, product_id) for product_id in sorted(product_ids)]
+        with self._write() as conn:
+            conn.executemany("DELETE FROM cart_lines WHERE user_id = ? AND product_id = ?", values)
+            conn.executemany("INSERT INTO cart_log (user_id, product_id, quantity) VALUES (?, ?, 0)", values)
+
+    def _claim_flush(self):
+        """
+        The open lock file when this worker may flush, None while another worker of the host does.
+        - One flusher at a time, or an older entry written late could overwrite a newer one.
+        """
+        handle = open(self.path + ".flush-lock", "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            handle.close()
+            return None
+        return handle
+
+    def _write_entries(self, entries):
+        """Apply log entries to `carts` in one transaction, the last entry of each line wins."""
+        from app.database import SessionLocal
+
+        latest = {}
+        for _, user_id, product_id, quantity in entries:
+            latest[(user_id, product_id)] = quantity
+        db = SessionLocal()
+        try:
+            # Lines of products or users deleted since are dropped, they would fail the whole batch
+            products = set(db.scalars(select(Product.id).where(Product.id.in_({product_id for _, product_id in latest}))))
+            users = set(db.scalars(select(User.id).where(User.id.in_({user_id for user_id, _ in latest}))))
+            upserts = [
+                {"user_id": user_id, "product_id": product_id, "quantity": quantity}
+                for (user_id, product_id), quantity in sorted(latest.items())
+                if quantity > 0 and product_id in products and user_id in users
+            ]
+            removed = [key for key, quantity in latest.items() if quantity == 0]
+            if upserts:
+                db.execute(cart_upsert(db), upserts)
+            if removed:
+                db.execute(
+                    delete(Cart)
+                    .where(tuple_(Cart.user_id, Cart.product_id).in_(removed))
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def flush(self):
+        """Write the logged changes to the `carts` table; returns the number of log entries written."""
+        written = 0
+        with self._flush_lock:
+            handle = self._claim_flush()
+            if handle is None:
+                return 0
+            try:
+                conn = self._connection()
+                while True:
+                    entries = conn.execute(
+                        "SELECT seq, user_id, product_id, quantity FROM cart_log ORDER BY seq LIMIT ?",
+                        (CART_FLUSH_BATCH_SIZE,),
+                    ).fetchall()
+                    if not entries:
+                        break
+                    try:
+                        self._write_entries(entries)
+                    except Exception:
+                        self.failed_flushes += 1
+                        raise
+                    # Only after the commit; a crash before this replays the batch
+                    conn.execute("DELETE FROM cart_log WHERE seq <= ?", (entries[-1][0],))
+                    written += len(entries)
+                    self.flushed_entries += len(entries)
+                    if len(entries) < CART_FLUSH_BATCH_SIZE:
+                        break
+            finally:
+                handle.close()
+        return written
+
+    def _run(self):
+        # The first flush replays what a previous run left in the log
+        while not self._stopped:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing the cart log to the database failed")
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background flusher, once per worker."""
+        with self._flush_lock:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="cart-store-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write what is left (worker shutdown)."""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 30)
+            self._thread = None
+        self.flush()
+
+    def status(self):
+        pending = self._connection().execute("SELECT count(*) FROM cart_log").fetchone()[0]
+        return {
+            "store": self.name,
+            "path": self.path,
+            "pending_entries": pending,
+            "loaded_users": len(self._loaded),
+            "flushed_entries": self.flushed_entries,
+            "failed_flushes": self.failed_flushes,
+            "flush_seconds": self.flush_seconds,
+        }
+
+
+cart_store = KvCartStore() if CART_STORE == "kv" else OrmCartStore()
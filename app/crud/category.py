@@ -0,0 +1,169 @@
+import re
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from app.models import Category, Product
+
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+
+def slugify(name: str):
+    """URL slug of a category name, e.g. "Home & Kitchen" -> "home-kitchen"."""
+    return _NON_ALPHANUMERIC.sub("-", (name or "").lower()).strip("-")
+
+
+def _insert_ignoring_duplicates(db: Session):
+    """`INSERT ... ON CONFLICT DO NOTHING` for the session's database."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(Category).on_conflict_do_nothing(index_elements=["slug"])
+
+
+def get_or_create_categories(db: Session, names):
+    """
+    Resolve category names to category ids, creating the missing categories.
+    - Names with the same slug share a category, names without one map to None.
+    - Safe against concurrent creation: duplicates are skipped by the unique slug.
+    """
+    slugs = {name: slugify(name) for name in set(names)}
+    wanted = {slug: name.strip() for name, slug in slugs.items() if slug}
+    if not wanted:
+        return {name: None for name in slugs}
+
+    ids = dict(db.execute(select(Category.slug, Category.id).where(Category.slug.in_(wanted))).all())
+    missing = [{"name": wanted[slug], "slug": slug} for slug in wanted if slug not in ids]
+    if missing:
+        db.execute(_insert_ignoring_duplicates(db), missing)
+        ids.update(db.execute(
+            select(Category.slug, Category.id).where(Category.slug.in_([row["slug"] for row in missing]))
+        ).all())
+    return {name: ids.get(slug) for name, slug in slugs.items()}
+
+
+def get_category_id(db: Session, name: str):
+    return get_or_create_categories(db, [name])[name]
+
+
+def adjust_active_counts(db: Session, deltas: dict):
+    """
+    Add `deltas` ({category_id: change}) to the active product counts, in the caller's transaction.
+    - Rows are updated in id order, so concurrent adjustments cannot deadlock.
+    """
+    for category_id in sorted(category_id for category_id, delta in deltas.items() if category_id and delta):
+        db.execute(
+            update(Category)
+            .where(Category.id == category_id)
+            .values(active_product_count=Category.active_product_count + deltas[category_id])
+            .execution_options(synchronize_session=False)
+        )
+
+
+def count_change(deltas: dict, category_id, was_active: bool, is_active: bool, old_category_id=None):
+    """Record in `deltas` how a product moving between categories / activity changes the counts."""
+    if was_active:
+        deltas[old_category_id] = deltas.get(old_category_id, 0) - 1
+    if is_active:
+        deltas[category_id] = deltas.get(category_id, 0) + 1
+    return deltas
+
+
+def get_category_tree(db: Session, include_empty: bool = False):
+    """
+    Categories as a tree for the navigation menu, read from the categories table only.
+    - `total_active_product_count` includes the subcategories.
+    - Categories without active products (also below them) are left out unless `include_empty`.
+    """
+    nodes = {}
+    for category in db.execute(select(Category).order_by(Category.name)).scalars():
+        nodes[category.id] = {
+            "id": category.id,
+            "name": category.name,
+            "slug": category.slug,
+            "parent_id": category.parent_id,
+            "active_product_count": category.active_product_count,
+            "total_active_product_count": category.active_product_count,
+            "children": [],
+        }
+
+    roots = []
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+
+    def total(node):
+        node["total_active_product_count"] += sum(total(child) for child in node["children"])
+        if not include_empty:
+            node["children"] = [child for child in node["children"] if child["total_active_product_count"]]
+        return node["total_active_product_count"]
+
+    for node in roots:
+        total(node)
+    return [node for node in roots if include_empty or node["total_active_product_count"]]
+
+
+def get_category_with_descendants(db: Session, name: str):
+    """Ids of the category matching `name` (by slug) and of all categories below it, [] when unknown."""
+    slug = slugify(name)
+    root = db.scalar(select(Category.id).where(Category.slug == slug)) if slug else None
+    if root is None:
+        return []
+    children = {}
+    for category_id, parent_id in db.execute(select(Category.id, Category.parent_id).where(Category.parent_id.is_not(None))):
+        children.setdefault(parent_id, []).append(category_id)
+    ids, stack = [], [root]
+    while stack:
+        category_id = stack.pop()
+        ids.append(category_id)
+        stack.extend(children.get(category_id, ()))
+    return ids
+
+
+def set_category_parent(db: Session, name: str, parent_name: str = None):
+    """Create or move a category under `parent_name` (top level when None)."""
+    category_id = get_category_id(db, name)
+    parent_id = get_category_id(db, parent_name) if parent_name else None
+    if category_id is None or (parent_name and parent_id is None):
+        raise ValueError("Category names need at least one letter or digit.")
+
+    # A category cannot be moved below itself
+    parents = dict(db.execute(select(Category.id, Category.parent_id)).all())
+    ancestor = parent_id
+    while ancestor is not None:
+        if ancestor == category_id:
+            raise ValueError("A category cannot be placed below itself.")
+        ancestor = parents.get(ancestor)
+
+    db.execute(update(Category).where(Category.id == category_id).values(parent_id=parent_id))
+    db.commit()
+    return db.get(Category, category_id)
+
+
+def rebuild_categories(db: Session):
+    """
+    Link every product to the category of its `category` name and recount the active products.
+    - Creates the categories that do not exist yet.
+    - Returns `(categories, products linked)`.
+    """
+    names = db.scalars(select(Product.category).distinct().where(Product.category.is_not(None))).all()
+    category_ids = get_or_create_categories(db, names)
+    linked = 0
+    for name, category_id in category_ids.items():
+        result = db.execute(
+            update(Product)
+            .where(Product.category == name, Product.category_id.is_distinct_from(category_id))
+            .values(category_id=category_id)
+            .execution_options(synchronize_session=False)
+        )
+        linked += result.rowcount
+    db.execute(
+        update(Category)
+        .values(active_product_count=(
+            select(func.count(Product.id))
+            .where(Product.category_id == Category.id, Product.is_active == True)
+            .scalar_subquery()
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return len(category_ids), linked
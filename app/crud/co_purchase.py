@@ -0,0 +1,145 @@
+import os
+from datetime import datetime
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app.models import Order, OrderItem, Product, ProductCoPurchase, RelatedProduct
+
+# Related products kept per product
+RELATED_PRODUCTS_TOP_K = int(os.getenv("RELATED_PRODUCTS_TOP_K", "20"))
+# Paid orders counted per transaction
+CO_PURCHASE_BATCH_SIZE = 1000
+# Products whose related products are recomputed per statement
+REFRESH_CHUNK_SIZE = 500
+
+
+def _upsert_counts(db: Session):
+    """`INSERT ... ON CONFLICT DO UPDATE` adding to the existing pair counts."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(ProductCoPurchase)
+    return stmt.on_conflict_do_update(
+        index_elements=["product_id", "related_product_id"],
+        set_={"order_count": ProductCoPurchase.order_count + stmt.excluded.order_count},
+    )
+
+
+def count_co_purchases(db: Session, order_ids):
+    """
+    Add the product pairs of these orders to product_co_purchases, in the caller's transaction.
+    - Pairs are counted by a self-join of the orders' items in the database, a product bought twice in one order counts once.
+      NumPy is in requirements.txt, but a sparse matrix would need every order's items loaded into the job first;
+      the grouped join ships only the pair counts.
+    - Returns the ids of the products whose counts changed.
+    """
+    items = (
+        select(OrderItem.order_id, OrderItem.product_id)
+        .where(OrderItem.order_id.in_(order_ids), OrderItem.product_id.is_not(None))
+        .distinct()
+        .subquery()
+    )
+    first, second = items.alias("first"), items.alias("second")
+    pairs = db.execute(
+        select(first.c.product_id, second.c.product_id, func.count())
+        .join(second, and_(second.c.order_id == first.c.order_id, second.c.product_id != first.c.product_id))
+        .group_by(first.c.product_id, second.c.product_id)
+        .order_by(first.c.product_id, second.c.product_id)  # a fixed lock order for concurrent runs
+    ).all()
+    if pairs:
+        db.execute(_upsert_counts(db), [
+            {"product_id": product_id, "related_product_id": related_id, "order_count": orders}
+            for product_id, related_id, orders in pairs
+        ])
+    return {product_id for product_id, _, _ in pairs}
+
+
+def refresh_related_products(db: Session, product_ids, top_k: int = RELATED_PRODUCTS_TOP_K):
+    """Recompute the top `top_k` related products of these products from their pair counts."""
+    product_ids = sorted(product_ids)
+    for start in range(0, len(product_ids), REFRESH_CHUNK_SIZE):
+        chunk = product_ids[start:start + REFRESH_CHUNK_SIZE]
+        ranked = (
+            select(
+                ProductCoPurchase.product_id,
+                ProductCoPurchase.related_product_id,
+                ProductCoPurchase.order_count,
+                func.row_number().over(
+                    partition_by=ProductCoPurchase.product_id,
+                    order_by=(ProductCoPurchase.order_count.desc(), ProductCoPurchase.related_product_id),
+                ).label("rank"),
+            )
+            .where(ProductCoPurchase.product_id.in_(chunk))
+            .subquery()
+        )
+        db.execute(delete(RelatedProduct).where(RelatedProduct.product_id.in_(chunk)))
+        db.execute(insert(RelatedProduct).from_select(
+            ["product_id", "rank", "related_product_id", "order_count"],
+            select(ranked.c.product_id, ranked.c.rank, ranked.c.related_product_id, ranked.c.order_count)
+            .where(ranked.c.rank <= top_k),
+        ))
+        db.commit()
+
+
+def build_related_products(db: Session, full: bool = False, batch_size: int = CO_PURCHASE_BATCH_SIZE, top_k: int = RELATED_PRODUCTS_TOP_K):
+    """
+    Count the paid orders that were not counted yet, then refresh the related products of the products in them.
+    - Each batch of orders is counted and marked as counted in one transaction, so an interrupted run
+      resumes where it stopped and no order is counted twice.
+    - `full` forgets all counts and recounts every paid order (after changing how pairs are counted).
+    - Returns `(orders counted, products refreshed)`.
+    """
+    touched = set()
+    if full:
+        touched.update(db.scalars(select(RelatedProduct.product_id).distinct()))
+        db.execute(delete(ProductCoPurchase))
+        db.execute(
+            update(Order)
+            .where(Order.co_purchases_counted_at.is_not(None))
+            .values(co_purchases_counted_at=None, updated_at=Order.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    counted = 0
+    while True:
+        # ✅ SKIP LOCKED lets a second run take other orders instead of waiting (PostgreSQL)
+        order_ids = db.scalars(
+            select(Order.id)
+            .where(Order.payment_status == "Paid", Order.co_purchases_counted_at.is_(None))
+            .order_by(Order.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not order_ids:
+            break
+        touched |= count_co_purchases(db, order_ids)
+        db.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids))
+            # Keep updated_at, the order itself did not change
+            .values(co_purchases_counted_at=datetime.utcnow(), updated_at=Order.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        counted += len(order_ids)
+
+    refresh_related_products(db, touched, top_k=top_k)
+    return counted, len(touched)
+
+
+def get_related_products(db: Session, product_id: int, limit: int = 10, active_only: bool = False):
+    """
+    Products most often bought together with `product_id`, as `(product, order_count)`.
+    - One lookup on the related_products primary key (product_id, rank) joined to products.
+    """
+    stmt = (
+        select(Product, RelatedProduct.order_count)
+        .join(RelatedProduct, RelatedProduct.related_product_id == Product.id)
+        .where(RelatedProduct.product_id == product_id)
+        .order_by(RelatedProduct.rank)
+        .limit(limit)
+    )
+    if active_only:
+        stmt = stmt.where(Product.is_active == True)
+    return db.execute(stmt).all()
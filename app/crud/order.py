@@ -1,5 +1,10 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
 from app.models import Order, OrderItem
+from app.crud.cart_store import cart_store
+from app.crud.stock import active_holds_query, release_holds_statement
 from app.schemas import OrderCreate, OrderItemCreate
 
 # def create_order(db: Session, user_id: int, order_data: OrderCreate, cart_items: list):
@@ -46,4 +51,100 @@ def get_orders_by_user(db: Session, user_id: int):
 
 def get_all_orders(db: Session):
    
-   return db.query(Order).all()
\ No newline at end of file
+   return db.query(Order).all()
+
+
+async def get_orders_by_user_async(db: AsyncSession, user_id: int):
+    """Async variant of `get_orders_by_user`, order items are loaded up front."""
+    result = await db.execute(
+        select(Order).options(selectinload(Order.order_items)).where(Order.user_id == user_id)
+    )
+    return result.scalars().all()
+
+
+def _new_order(user_id: int, rows, held_by_others: dict):
+    """
+    The order for the cart lines (with their `Product`) and the values of its items, after checking
+    the stock of every line, with the stock of its products deducted.
+    - Stock held by other carts is not available; the user's own holds become the deduction.
+    """
+    if not rows:
+        raise HTTPException(
+            status_code=400,
+            detail="Cart is empty. Add items to the cart before placing an order."
+        )
+
+    for line in rows:
+        available = line.Product.stock_remaining - held_by_others.get(line.product_id, 0)
+        if available < line.quantity:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Insufficient stock for product {line.Product.name}. Only {max(available, 0)} left.",
+            )
+
+    order = Order(
+        user_id=user_id,
+        total_price=sum(line.Product.price_after_discount * line.quantity for line in rows),
+        payment_status="Pending",
+        shipment_status="Pending",
+        tracking_id=None,
+    )
+    items = [
+        {"product_id": line.product_id, "quantity": line.quantity, "price": line.Product.price_after_discount}
+        for line in rows
+    ]
+    for line in rows:
+        line.Product.stock_remaining -= line.quantity
+    return order, items
+
+
+def _order_items_insert(order: Order, items):
+    # One executemany; ORM inserts with RETURNING run row by row on SQLite
+    return insert(OrderItem), [dict(item, order_id=order.id) for item in items]
+
+
+def _checkout(db: Session, user_id: int):
+    """
+    The order for the user's cart, written in the caller's transaction; run under `cart_store.user_lock`.
+    - Cart lines come from `cart_store`, their products are locked with a single query and reused for the order.
+    - Stock is checked for every line before anything is written.
+    """
+    rows = cart_store.rows(db, user_id, for_order=True)
+    product_ids = [line.product_id for line in rows]
+    held_by_others = dict(db.execute(active_holds_query(product_ids, exclude_user_id=user_id)).all()) if rows else {}
+    order, items = _new_order(user_id, rows, held_by_others)
+    db.add(order)
+    db.flush()
+    db.execute(*_order_items_insert(order, items))
+    db.execute(release_holds_statement(user_id, product_ids))
+    cart_store.clear(db, user_id, product_ids)
+    return order
+
+
+def _locked_checkout(db: Session, user_id: int):
+    # The "orm" store's lock is the user's row, it is held until the caller commits
+    with cart_store.user_lock(db, user_id):
+        return _checkout(db, user_id)
+
+
+def place_order(db: Session, user_id: int):
+    """
+    Place an order for all items in the user's cart.
+    - Runs under the user's cart lock, so a double submit places one order: the second finds the cart empty.
+    - The order, its items, the stock deductions, the release of the cart's stock holds and the removal of
+      the ordered cart lines are committed together (the "kv" store removes the lines just before the commit).
+    """
+    with cart_store.user_lock(db, user_id):
+        order = _checkout(db, user_id)
+        db.commit()
+    return order
+
+
+async def place_order_async(db: AsyncSession, user_id: int):
+    """
+    Place an order for all items in the user's cart (asyncio engine, "orm" cart store), like `place_order`.
+    """
+    order = await db.run_sync(_locked_checkout, user_id)
+    await db.commit()
+    await db.refresh(order, ["order_items"])
+    return order
@@ -1,85 +1,117 @@
-from sqlalchemy.orm import Session
-from app.models import Product, User
+from sqlalchemy.orm import Session, aliased, make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import SequenceBlockAllocator
+from app.models import Product, ProductBulkUpdate, User, utc_now
 from app.schemas import ProductCreate
 from datetime import datetime
 from fastapi import HTTPException
-from sqlalchemy import func
+from sqlalchemy import Numeric, cast, func, insert, inspect, literal, select, tuple_, update
+from pydantic import ValidationError
 from app.models import Review
+from app.crud.category import adjust_active_counts, count_change, get_category_id, get_category_with_descendants, get_or_create_categories, slugify
+from app.serializers import PRIVATE_FIELDS, PUBLIC_FIELDS, active_only, serialize_products
+from app.search import full_text_search_query, search_index, uses_full_text_search
+from app.cache import LRUCache, MISSING
+from app.product_events import on_products_changed, record_product_changes
+from itertools import islice
+import base64
+import csv
+import io
+import json
+import os
+import time
 import pytz
 
 IST = pytz.timezone("Asia/Kolkata")
 
-def get_all_products_with_reviews(db: Session):
+# Products by id, shared by all requests of this worker (see get_product_by_id).
+# Committed product changes invalidate their entries; the TTL bounds staleness
+# from writes made by other workers.
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "30"))
+product_cache = LRUCache("products", PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL_SECONDS)
+on_products_changed(product_cache.invalidate_many)
+
+# Product ids for bulk inserts, reserved from products' id sequence in blocks per worker
+PRODUCT_ID_BLOCK_SIZE = int(os.getenv("PRODUCT_ID_BLOCK_SIZE", "1000"))
+product_id_allocator = SequenceBlockAllocator("products", block_size=PRODUCT_ID_BLOCK_SIZE)
+
+def rating_distribution(product: Product):
+    """Number of reviews per star (1-5) of a product."""
+    return {str(stars): getattr(product, f"rating_{stars}") for stars in range(1, 6)}
+
+
+def iter_products_with_reviews(db: Session, after_id: int = 0, limit: int = None, max_reviews: int = None, page_size: int = 500):
     """
-    Fetch all products with their reviews, ratings, and other details for analysis.
-    This function fetches products and calculates the average ratings.
+    Stream products with their review statistics and reviews for analysis, ordered by id.
+    - Products are read in keyset pages of `page_size`, starting after `after_id`, at most `limit` in total.
+    - Review count, average and star distribution come from the aggregates stored on the product.
+    - Reviews of a page are fetched with one `IN` query, newest first, at most `max_reviews` per product.
     """
-    print("🔍 [DEBUG] Fetching all products from the database...")
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        products = db.execute(
+            select(Product).where(Product.id > after_id).order_by(Product.id).limit(size)
+        ).scalars().all()
+        if not products:
+            return
+        product_ids = [product.id for product in products]
+
+        # ✅ Reviews for the whole page in one query, truncated per product with row_number()
+        reviews = {product_id: [] for product_id in product_ids}
+        if max_reviews != 0:
+            position = func.row_number().over(
+                partition_by=Review.product_id, order_by=(Review.created_at.desc(), Review.id.desc())
+            ).label("position")
+            ranked = select(Review, position).where(Review.product_id.in_(product_ids)).subquery()
+            review = aliased(Review, ranked)
+            query = select(review).order_by(ranked.c.product_id, ranked.c.position)
+            if max_reviews is not None:
+                query = query.where(ranked.c.position <= max_reviews)
+            for row in db.execute(query).scalars():
+                reviews[row.product_id].append({
+                    "id": row.id,
+                    "user_id": row.user_id,
+                    "product_id": row.product_id,
+                    "rating": row.rating,
+                    "comment": row.comment,
+                    "created_at": row.created_at,
+                })
+
+        for product in products:
+            yield {
+                "id": product.id,
+                "name": product.name,
+                "category": product.category,
+                "price_before_discount": product.price_before_discount,
+                "price_after_discount": product.price_after_discount,
+                "stock_remaining": product.stock_remaining,
+                "product_rating": product.rating_sum / product.review_count if product.review_count else 0.0,
+                "review_count": product.review_count,
+                "rating_distribution": rating_distribution(product),
+                "reviews": reviews[product.id],
+                "reviews_truncated": len(reviews[product.id]) < product.review_count,
+            }
 
-    # Fetching all products
-    products = db.query(Product).all()
-    print(f"✅ [DEBUG] Found {len(products)} products.")
+        after_id = product_ids[-1]
+        if remaining is not None:
+            remaining -= len(products)
+        db.expunge_all()  # ✅ Keep memory flat across pages
 
-    product_details = []
-    
-    for product in products:
-        print(f"🔍 [DEBUG] Processing product ID: {product.id} - {product.name}")
-
-        # Fetch the reviews for this product
-        reviews = db.query(Review).filter(Review.product_id == product.id).all()
-        print(f"✅ [DEBUG] Found {len(reviews)} reviews for product ID {product.id}.")
-
-        # Calculate the average rating if there are reviews
-        if reviews:
-            total_rating = sum([review.rating for review in reviews])
-            avg_rating = total_rating / len(reviews)
-            print(f"✅ [DEBUG] Calculated average rating: {avg_rating} for product {product.name}.")
-        else:
-            avg_rating = 0.0
-            print(f"❌ [DEBUG] No reviews found for product {product.name}. Setting average rating to 0.0.")
-
-        # Prepare the product data with its reviews
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "category": product.category,
-            "price_before_discount": product.price_before_discount,
-            "price_after_discount": product.price_after_discount,
-            "stock_remaining": product.stock_remaining,
-            "product_rating": avg_rating,
-            "reviews": [
-                {
-                    "id": review.id,  # Add review ID
-                    "user_id": review.user_id,
-                    "product_id": review.product_id,  # Add product_id
-                    "rating": review.rating,
-                    "comment": review.comment,
-                    "created_at": review.created_at,  # Add created_at
-                }
-                for review in reviews
-            ],
-        }
-
-        product_details.append(product_data)
-        print(f"✅ [DEBUG] Added product data for {product.name}.")
-
-    print(f"✅ [DEBUG] Returning {len(product_details)} products with reviews.")
-    return product_details
 
 def add_product(db: Session, product_data, vendor_id=None):
     """Add a new product with calculated fields."""
     
-    last_product = db.query(Product).order_by(Product.id.desc()).first()
-    next_product_id = last_product.id + 1 if last_product else 1
-
     price_before_discount = product_data.price
     price_after_discount = price_before_discount - (price_before_discount * product_data.discount_percentage / 100)
     profit_per_item_inr = price_after_discount - product_data.expenditure_cost_inr
 
-    current_time_ist = datetime.now().astimezone(IST)
+    created_at = utc_now()
+    category_id = get_category_id(db, product_data.category)
 
+    # ✅ The id comes from the database sequence on insert
     new_product = Product(
-        id=next_product_id,
         name=product_data.name,
         description=product_data.description,
         price=product_data.price,
@@ -88,6 +120,7 @@ def add_product(db: Session, product_data, vendor_id=None):
         total_stock=product_data.total_stock,
         stock_remaining=product_data.total_stock,
         category=product_data.category,
+        category_id=category_id,
         image_url=product_data.image_url,
         price_before_discount=price_before_discount,
         price_after_discount=price_after_discount,
@@ -95,46 +128,171 @@ def add_product(db: Session, product_data, vendor_id=None):
         vendor_id=vendor_id or product_data.vendor_id,
         is_active=True,
         product_rating=0.0,
-        created_at=current_time_ist,
-        updated_at=current_time_ist,
+        created_at=created_at,
+        updated_at=created_at,
     )
     db.add(new_product)
+    adjust_active_counts(db, {category_id: 1})  # ✅ Same transaction as the insert
     db.commit()
     db.refresh(new_product)
     return new_product
 
 
-def get_products(db: Session, user_role: str):
+# Sort modes of the product listing: key column and direction, ties broken by id
+PRODUCT_SORTS = {
+    "newest": (Product.created_at, "desc"),
+    "price": (Product.price_after_discount, "asc"),
+    "rating": (Product.product_rating, "desc"),
+}
+
+
+def encode_cursor(sort: str, product, direction: str) -> str:
+    """Opaque cursor pointing before/after `product` in the given sort order."""
+    column, _ = PRODUCT_SORTS[sort]
+    key = getattr(product, column.key)
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    payload = json.dumps({"s": sort, "k": key, "id": product.id, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> dict:
+    """Decode a cursor from `encode_cursor`, rejecting tampered or mismatched ones."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["s"] != sort or data["d"] not in ("next", "prev"):
+            raise ValueError("cursor does not match the requested sort")
+        if sort == "newest":
+            data["k"] = datetime.fromisoformat(data["k"])
+        return data
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+
+
+def _products_page_query(user_role: str, sort: str, cursor: str = None, limit: int = 20):
     """
-    Fetch all products with role-based filtering.
-    - Customers see only active products.
+    Build the keyset query for one page of the product listing.
+    - Seeks past the cursor's (sort key, id) instead of using OFFSET, so deep pages stay fast.
+    - Fetches one extra row to know whether another page exists.
+    """
+    if sort not in PRODUCT_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort. Use one of: {', '.join(PRODUCT_SORTS)}.")
+    column, order = PRODUCT_SORTS[sort]
+    position = decode_cursor(cursor, sort) if cursor else None
+    backwards = position is not None and position["d"] == "prev"
+
+    stmt = select(Product)
+
+    # ✅ Guests and customers see only active products
+    if active_only(user_role):
+        stmt = stmt.where(Product.is_active == True)
+
+    # Walking backwards flips the ordering, the rows are reversed again afterwards
+    descending = (order == "desc") != backwards
+    if position is not None:
+        key = tuple_(column, Product.id)
+        bound = tuple_(literal(position["k"], column.type), literal(position["id"]))
+        stmt = stmt.where(key < bound if descending else key > bound)
+    if descending:
+        stmt = stmt.order_by(column.desc(), Product.id.desc())
+    else:
+        stmt = stmt.order_by(column.asc(), Product.id.asc())
+    return stmt.limit(limit + 1), backwards
+
+
+def _products_page(rows, sort: str, cursor: str, limit: int, backwards: bool):
+    """Trim the extra row and work out the next/previous cursors."""
+    has_more = len(rows) > limit
+    products = rows[:limit]
+    if backwards:
+        products.reverse()
+    if not products:
+        return products, None, None
+
+    next_cursor = prev_cursor = None
+    if has_more or backwards:
+        next_cursor = encode_cursor(sort, products[-1], "next")
+    if cursor and (has_more or not backwards):
+        prev_cursor = encode_cursor(sort, products[0], "prev")
+    return products, next_cursor, prev_cursor
+
+
+def get_products_page(db: Session, user_role: str, sort: str = "newest", cursor: str = None, limit: int = 20):
+    """
+    Fetch one page of products with role-based filtering and keyset pagination.
+    - Guests and customers see only active products.
     - Admins & vendors see all products.
+    - Returns `(products, next_cursor, prev_cursor)`.
     """
-    query = db.query(Product)
-    
-    # ✅ Customers see only active products
-    if user_role == "customer":
-        query = query.filter(Product.is_active == True)
-    
-    # ✅ Fetch all products without pagination
-    products = query.all()
-    return products
+    stmt, backwards = _products_page_query(user_role, sort, cursor, limit)
+    rows = list(db.execute(stmt).scalars().all())
+    return _products_page(rows, sort, cursor, limit, backwards)
 
 
+async def get_products_page_async(db: AsyncSession, user_role: str, sort: str = "newest", cursor: str = None, limit: int = 20):
+    """Async variant of `get_products_page` for the asyncio engine."""
+    stmt, backwards = _products_page_query(user_role, sort, cursor, limit)
+    rows = list((await db.execute(stmt)).scalars().all())
+    return _products_page(rows, sort, cursor, limit, backwards)
 
 
-def get_product_by_id(db: Session, product_id: int):
-    """Fetch a product by its ID."""
-    print(f"[get_product_by_id] Fetching product with ID: {product_id}")
-    try:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if product:
-            print(f"[get_product_by_id] Product found: {product.__dict__}")  
-            print(f"[get_product_by_id] No product found with ID: {product_id}")
-        return product
-    except Exception as e:
-        print(f"[get_product_by_id] Error occurred: {e}")
-        raise e
+
+
+def get_product_by_id(db: Session, product_id: int, bypass_cache: bool = False):
+    """
+    Fetch a product by its ID.
+    - Served from the in-process product cache when possible.
+    - Pass `bypass_cache=True` before modifying the product or when the stock must be exact (cart, checkout).
+    """
+    if not bypass_cache:
+        cached = product_cache.get(product_id)
+        if cached is not MISSING:
+            return db.merge(cached, load=False)
+
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if product is not None and not bypass_cache:
+        _cache_product(product)
+    return product
+
+
+async def get_product_by_id_async(db: AsyncSession, product_id: int, bypass_cache: bool = False):
+    """Async variant of `get_product_by_id`."""
+    if not bypass_cache:
+        cached = product_cache.get(product_id)
+        if cached is not MISSING:
+            return await db.merge(cached, load=False)
+
+    product = await db.get(Product, product_id)
+    if product is not None and not bypass_cache:
+        _cache_product(product)
+    return product
+
+
+def get_products_by_ids(db: Session, product_ids):
+    """
+    Fetch many products by id, from the product cache or else with a single `IN` query.
+    - Returns `{id: product}` for the ids that exist, cached products are returned detached.
+    """
+    found = {}
+    uncached = []
+    for product_id in set(product_ids):
+        cached = product_cache.get(product_id)
+        if cached is MISSING:
+            uncached.append(product_id)
+        else:
+            found[product_id] = cached
+    if uncached:
+        for product in db.execute(select(Product).where(Product.id.in_(uncached))).scalars():
+            _cache_product(product)
+            found[product.id] = product
+    return found
+
+
+def _cache_product(product: Product):
+    """Store a detached copy of the product's columns, sessions get their own copy via `merge`."""
+    snapshot = Product(**{attr.key: getattr(product, attr.key) for attr in inspect(Product).column_attrs})
+    make_transient_to_detached(snapshot)
+    product_cache.set(product.id, snapshot)
 
 
 
@@ -175,6 +333,15 @@ def update_product(db, product, product_data):
     try:
         print(f"Updating product with data: {product_data}")
 
+        if 'category' in product_data:
+            # ✅ Lock the row so the category counts cannot race with a concurrent soft delete
+            db.refresh(product, with_for_update=True)
+            category_id = get_category_id(db, product_data['category'])
+            if category_id != product.category_id:
+                if product.is_active:
+                    adjust_active_counts(db, count_change({}, category_id, True, True, product.category_id))
+                product.category_id = category_id
+
         if 'name' in product_data:
             product.name = product_data['name']
         if 'description' in product_data:
@@ -203,8 +370,10 @@ def update_product(db, product, product_data):
         print(f"Price after conversion: {product.price}")
         print(f"Discount after conversion: {product.discount_percentage}")
 
-        # Calculate price after discount
+        # Calculate price after discount and the profit per item
+        product.price_before_discount = product.price
         product.price_after_discount = product.price - (product.discount_percentage * product.price / 100)
+        product.profit_per_item_inr = product.price_after_discount - (product.expenditure_cost_inr or 0)
         print(f"Price after discount: {product.price_after_discount}")
 
         db.commit()
@@ -221,9 +390,13 @@ def soft_delete_product(db: Session, product):
     """
     Soft delete a product by marking it as inactive.
     - Sets `is_active = False` and adds a `deleted_at` timestamp.
+    - Decrements the active product count of its category in the same transaction.
     """
+    db.refresh(product, with_for_update=True)  # ✅ Lock the row, the product is counted once
+    if product.is_active:
+        adjust_active_counts(db, {product.category_id: -1})
     product.is_active = False
-    product.deleted_at = datetime.now().astimezone(IST)  # ✅ Store IST timestamp
+    product.deleted_at = utc_now()  # ✅ Stored in UTC like the other product timestamps
 
     db.commit()
     db.refresh(product)
@@ -233,10 +406,130 @@ def soft_delete_product(db: Session, product):
 
 
 
+BULK_OPERATIONS = ("set_discount", "adjust_price", "activate", "deactivate", "set_category")
+# Product ids returned in the response of a bulk update, the audit record keeps all of them
+BULK_MAX_RETURNED_IDS = 1000
+
+
+def _bulk_conditions(db: Session, filters):
+    """WHERE conditions of a bulk update filter, at least one criterion is required."""
+    conditions = []
+    if filters.ids:
+        conditions.append(Product.id.in_(filters.ids))
+    if filters.vendor_id is not None:
+        conditions.append(Product.vendor_id == filters.vendor_id)
+    if filters.category:
+        conditions.append(Product.category_id.in_(get_category_with_descendants(db, filters.category)))
+    if not conditions:
+        raise HTTPException(status_code=400, detail="Give at least one filter: ids, category or vendor_id.")
+    return conditions
+
+
+def _repriced(price, discount_percentage):
+    """Derived price and profit columns for a price and discount, as SQL expressions."""
+    price_after_discount = price - price * func.coalesce(discount_percentage, 0) / 100
+    return {
+        Product.price_before_discount: price,
+        Product.price_after_discount: price_after_discount,
+        Product.profit_per_item_inr: price_after_discount - func.coalesce(Product.expenditure_cost_inr, 0),
+    }
+
+
+def bulk_update_products(db: Session, user_id: int, filters, operation: str, value=None, dry_run: bool = False):
+    """
+    Apply one operation to every product matching `filters` with a single `UPDATE ... RETURNING`.
+    - `set_discount` / `adjust_price` recompute price_before/after_discount and profit_per_item_inr in SQL.
+    - `activate` / `deactivate` / `set_category` only touch products that change, and adjust the category counts.
+    - `dry_run` only counts the products that would change.
+    - Real runs are recorded in `product_bulk_updates`.
+    """
+    if operation not in BULK_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid operation. Use one of: {', '.join(BULK_OPERATIONS)}.")
+    conditions = _bulk_conditions(db, filters)
+    now = utc_now()
+
+    try:
+        if operation == "set_discount":
+            discount = float(value)
+            if not 0 <= discount <= 100:
+                raise ValueError
+            values = {Product.discount_percentage: discount, **_repriced(Product.price, literal(discount))}
+        elif operation == "adjust_price":
+            percent = float(value)
+            if percent <= -100:
+                raise ValueError
+            price = func.round(cast(Product.price * (1 + percent / 100), Numeric), 2)
+            values = {Product.price: price, **_repriced(price, Product.discount_percentage)}
+        elif operation in ("activate", "deactivate"):
+            is_active = operation == "activate"
+            conditions.append(Product.is_active.is_not(is_active))
+            values = {Product.is_active: is_active, Product.deleted_at: None if is_active else now}
+        else:
+            category = str(value or "").strip()
+            if not slugify(category):
+                raise ValueError
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Invalid value for {operation}: {value!r}.")
+
+    if dry_run:
+        if operation == "set_category":
+            conditions.append(Product.category.is_distinct_from(category))
+        matched = db.scalar(select(func.count(Product.id)).where(*conditions))
+        return {"operation": operation, "dry_run": True, "matched": matched}
+
+    deltas = {}
+    if operation == "set_category":
+        # ✅ The old categories are needed for the counts: lock the rows and read them first
+        category_id = get_category_id(db, category)
+        conditions.append(Product.category.is_distinct_from(category))
+        moved = db.execute(
+            select(Product.id, Product.category_id).where(*conditions, Product.is_active == True).with_for_update()
+        ).all()
+        for _, old_category_id in moved:
+            count_change(deltas, category_id, True, True, old_category_id)
+        values = {Product.category: category, Product.category_id: category_id}
+
+    rows = db.execute(
+        update(Product)
+        .where(*conditions)
+        .values(values)
+        .returning(Product.id, Product.category_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    product_ids = sorted(row.id for row in rows)
+
+    if operation in ("activate", "deactivate"):
+        for row in rows:
+            count_change(deltas, row.category_id, operation == "deactivate", operation == "activate", row.category_id)
+    adjust_active_counts(db, deltas)
+
+    audit = ProductBulkUpdate(
+        user_id=user_id,
+        operation=operation,
+        value=None if value is None else str(value),
+        filters=filters.model_dump(exclude_none=True),
+        updated_count=len(product_ids),
+        product_ids=product_ids,
+        created_at=now,
+    )
+    db.add(audit)
+    record_product_changes(db, product_ids)
+    db.commit()
+    return {
+        "batch_id": audit.id,
+        "operation": operation,
+        "dry_run": False,
+        "updated": len(product_ids),
+        "product_ids": product_ids[:BULK_MAX_RETURNED_IDS],
+        "product_ids_truncated": len(product_ids) > BULK_MAX_RETURNED_IDS,
+    }
+
+
 def search_products_by_name(db: Session, keyword: str, user_role: str, skip: int = 0, limit: int = 10):
     """
-    Search products by name containing a given keyword.
-    - Customers see only active products.
+    Search products by keyword, best matches first.
+    - Matches words in name, category and description, name substrings and misspellings.
+    - Guests and customers see only active products.
     - Admins/Vendors see all products.
     - Supports pagination.
     """
@@ -248,15 +541,21 @@ def search_products_by_name(db: Session, keyword: str, user_role: str, skip: int
         return []
 
     try:
-        # ✅ Use `ILIKE` for case-insensitive search and match any part of the name
-        query = db.query(Product).filter(Product.name.ilike(f"%{keyword}%"))
+        if uses_full_text_search(db):
+            # ✅ Indexed full-text + trigram search, ranked by relevance
+            query = full_text_search_query(keyword)
 
-        # ✅ Restrict "customer" users to only active products
-        if user_role == "customer":
-            query = query.filter(Product.is_active == True)
+            # ✅ Restrict guests and customers to only active products
+            if active_only(user_role):
+                query = query.where(Product.is_active == True)
 
-        # ✅ Apply pagination
-        products = query.offset(skip).limit(limit).all()
+            # ✅ Apply pagination
+            products = db.execute(query.offset(skip).limit(limit)).scalars().all()
+        else:
+            # ✅ In-process index (SQLite), ranked by relevance
+            product_ids = search_index.search(db, keyword, active_only(user_role), skip, limit)
+            by_id = {p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()} if product_ids else {}
+            products = [by_id[product_id] for product_id in product_ids if product_id in by_id]
         print(f"✅ [DEBUG] Found {len(products)} products matching the keyword: {keyword}")
         return products
 
@@ -267,88 +566,208 @@ def search_products_by_name(db: Session, keyword: str, user_role: str, skip: int
 #=====================================================================#
 
 
-def import_products(db: Session, products):
+# Rows validated and inserted per round trip by the bulk import
+IMPORT_CHUNK_SIZE = int(os.getenv("PRODUCT_IMPORT_CHUNK_SIZE", "1000"))
+# Per-row errors listed in the import report, the counts are always complete
+IMPORT_MAX_REPORTED_ERRORS = 1000
+IMPORT_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "text/csv", "application/json")
+
+
+def read_import_rows(upload, content_type: str):
     """
-    Bulk import multiple products.
-    - Validates each product's vendor_id.
-    - Calculates derived fields (`price_after_discount`, `profit_per_item_inr`).
-    - Uses a **soft auto-increment strategy** for product IDs.
-    - Stores timestamps in **IST timezone**.
+    Parse an uploaded import file row by row.
+    - NDJSON: one product object per line, blank lines are skipped.
+    - CSV: header row with the `ProductCreate` field names, empty cells count as missing.
+    - JSON: a list of product objects (the original request format).
+    Yields `(row_number, data)`, where `data` is an error message for unparsable rows.
     """
+    if content_type == "application/json":
+        try:
+            products = json.load(io.TextIOWrapper(upload, encoding="utf-8-sig"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        if not isinstance(products, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON list of products.")
+        yield from enumerate(products, start=1)
+        return
+
+    text = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+    if content_type == "text/csv":
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            yield row_number, {field: value for field, value in row.items() if field and value not in ("", None)}
+        return
+
+    row_number = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError as e:
+            yield row_number, f"Invalid JSON: {e}"
+
+
+def import_products(db: Session, rows, chunk_size: int = IMPORT_CHUNK_SIZE):
+    """
+    Bulk import products from `(row_number, data)` pairs (see `read_import_rows`).
+    - Validates rows chunk by chunk, invalid rows are reported and skipped.
+    - Resolves the vendors of a chunk with one `IN` query.
+    - Inserts each chunk with a single executemany, all chunks in one transaction.
+    - Takes product ids from the sequence in pre-allocated blocks, no read-before-write.
+    - Calculates derived fields and stores timestamps in UTC (rendered in IST).
+    """
+    started = time.perf_counter()
+    received = imported = failed = chunks = 0
+    errors = []
+    product_ids = []
+
+    def reject(row_number, messages):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "errors": messages})
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        chunks += 1
+        received += len(chunk)
+
+        # ✅ Validate the rows of the chunk
+        valid = []
+        for row_number, data in chunk:
+            if isinstance(data, str):
+                reject(row_number, [data])
+                continue
+            try:
+                product_data = ProductCreate.model_validate(data)
+            except ValidationError as e:
+                reject(row_number, [f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()])
+                continue
+            if not product_data.vendor_id:
+                reject(row_number, ["vendor_id: Vendor ID is required for importing products."])
+                continue
+            valid.append((row_number, product_data))
+
+        # ✅ Ensure the vendors exist, one query per chunk
+        vendor_ids = {product_data.vendor_id for _, product_data in valid}
+        known_vendors = set(db.scalars(select(User.id).where(User.id.in_(vendor_ids)))) if vendor_ids else set()
+
+        created_at = utc_now()
+        values = []
+        for row_number, product_data in valid:
+            if product_data.vendor_id not in known_vendors:
+                reject(row_number, [f"vendor_id: Vendor with ID {product_data.vendor_id} does not exist."])
+                continue
+
+            # ✅ Calculate derived fields
+            price_before_discount = float(product_data.price)
+            price_after_discount = price_before_discount - (price_before_discount * product_data.discount_percentage / 100)
+            profit_per_item_inr = price_after_discount - product_data.expenditure_cost_inr
+
+            values.append({
+                "name": product_data.name,
+                "description": product_data.description,
+                "price": price_before_discount,
+                "expenditure_cost_inr": product_data.expenditure_cost_inr,
+                "discount_percentage": float(product_data.discount_percentage),
+                "total_stock": product_data.total_stock,
+                "stock_remaining": product_data.total_stock,
+                "category": product_data.category,
+                "image_url": product_data.image_url,
+                "price_before_discount": price_before_discount,
+                "price_after_discount": price_after_discount,
+                "profit_per_item_inr": profit_per_item_inr,
+                "vendor_id": product_data.vendor_id,
+                "is_active": True,  # ✅ Default to active upon import
+                "product_rating": 0.0,  # ✅ New products have no ratings initially
+                "created_at": created_at,
+                "updated_at": created_at,
+            })
+
+        # ✅ Link the categories, creating new ones, and count the products in one go
+        if values:
+            category_ids = get_or_create_categories(db, {value["category"] for value in values})
+            deltas = {}
+            for value in values:
+                value["category_id"] = category_ids[value["category"]]
+                count_change(deltas, value["category_id"], False, True)
+            adjust_active_counts(db, deltas)
+
+        # ✅ One executemany per chunk, ids come from a pre-allocated sequence block
+        if values:
+            chunk_ids = product_id_allocator.allocate(len(values))
+            if chunk_ids is not None:
+                for value, product_id in zip(values, chunk_ids):
+                    value["id"] = product_id
+                db.execute(insert(Product), values)
+            else:
+                # ✅ No sequences (SQLite): the database assigns the ids
+                chunk_ids = list(db.scalars(insert(Product).returning(Product.id, sort_by_parameter_order=True), values))
+            record_product_changes(db, chunk_ids)
+            product_ids.extend(chunk_ids)
+            imported += len(values)
 
-    # ✅ Fetch the last product ID
-    last_product = db.query(Product).order_by(Product.id.desc()).first()
-    next_product_id = last_product.id + 1 if last_product else 1
-
-    imported_products = []
-
-    for product_data in products:
-        # ✅ Validate vendor_id is provided
-        if not product_data.vendor_id:
-            raise HTTPException(status_code=400, detail="Vendor ID is required for importing products.")
-
-        # ✅ Ensure vendor exists
-        vendor = db.query(User).filter(User.id == product_data.vendor_id).first()
-        if not vendor:
-            raise HTTPException(status_code=404, detail=f"Vendor with ID {product_data.vendor_id} does not exist.")
-
-        # ✅ Calculate derived fields
-        price_before_discount = product_data.price
-        price_after_discount = price_before_discount - (price_before_discount * product_data.discount_percentage / 100)
-        profit_per_item_inr = price_after_discount - product_data.expenditure_cost_inr
-
-        # ✅ Get current timestamp in IST
-        current_time_ist = datetime.now(IST)
-
-        # ✅ Create new product instance
-        new_product = Product(
-            id=next_product_id,
-            name=product_data.name,
-            description=product_data.description,
-            price = float(product_data.price) ,
-            expenditure_cost_inr=product_data.expenditure_cost_inr,
-            discount_percentage = float(product_data.discount_percentage) , # Ensure it's a float
-            total_stock=product_data.total_stock,
-            stock_remaining=product_data.total_stock,
-            category=product_data.category,
-            image_url=product_data.image_url,
-            price_before_discount=price_before_discount,
-            price_after_discount=price_after_discount,
-            profit_per_item_inr=profit_per_item_inr,
-            vendor_id=product_data.vendor_id,
-            is_active=True,  # ✅ Default to active upon import
-            product_rating=0.0,  # ✅ New products have no ratings initially
-            created_at=current_time_ist,
-            updated_at=current_time_ist,
-        )
-
-        db.add(new_product)
-        db.commit()
-        db.refresh(new_product)
-
-        imported_products.append(new_product)
-        next_product_id += 1  # ✅ Increment for the next product
+    db.commit()
+    errors.sort(key=lambda error: error["row"])
 
+    duration = time.perf_counter() - started
     return {
-        "message": "Products imported successfully.",
-        "products": [
-            {
-                "id": p.id,
-                "name": p.name,
-                "created_at": p.created_at.isoformat(),
-                "updated_at": p.updated_at.isoformat(),
-            }
-            for p in imported_products
-        ],
+        "message": f"Imported {imported} of {received} products.",
+        "received": received,
+        "imported": imported,
+        "failed": failed,
+        "first_id": min(product_ids) if product_ids else None,
+        "last_id": max(product_ids) if product_ids else None,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+        "chunks": chunks,
+        "duration_seconds": round(duration, 3),
+        "rows_per_second": round(received / duration, 1) if duration else None,
     }
 
 
 #===================================================#
 
+EXPORT_CHUNK_SIZE = int(os.getenv("PRODUCT_EXPORT_CHUNK_SIZE", "10000"))
+EXPORT_YIELD_PER = 1000
+EXPORT_COLUMNS = [getattr(Product, field) for field in (*PUBLIC_FIELDS, *PRIVATE_FIELDS, "created_at", "updated_at")]
+
+
+def iter_product_export(db: Session, user_role: str, updated_since: datetime = None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    Stream the catalog in id order as lists of response dicts, projected for `user_role`.
+    - Only admins and vendors get inactive products.
+    - `updated_since` (naive UTC, like `updated_at`) keeps products changed at or after it.
+    - Each chunk of `chunk_size` ids is read through a server-side cursor (`yield_per`) in its own
+      short transaction, so an export never holds a snapshot open for long.
+    """
+    after_id = 0
+    while True:
+        stmt = select(*EXPORT_COLUMNS).where(Product.id > after_id)
+        if active_only(user_role):
+            stmt = stmt.where(Product.is_active == True)
+        if updated_since is not None:
+            stmt = stmt.where(Product.updated_at >= updated_since)
+        stmt = stmt.order_by(Product.id).limit(chunk_size).execution_options(yield_per=EXPORT_YIELD_PER)
+
+        exported = 0
+        for rows in db.execute(stmt).partitions():
+            exported += len(rows)
+            after_id = rows[-1].id
+            yield serialize_products(rows, user_role)
+        db.rollback()  # ✅ End the read transaction between chunks
+        if exported < chunk_size:
+            return
+
+
 def get_products_by_category(db: Session, category: str, user_role: str, skip: int = 0, limit: int = 10):
     """
-    Fetch products by category.
-    - Customers see only active products.
+    Fetch products by category, including its subcategories.
+    - Guests and customers see only active products.
     - Admins/Vendors see all products.
     - Supports pagination.
     """
@@ -359,11 +778,14 @@ def get_products_by_category(db: Session, category: str, user_role: str, skip: i
         return []
 
     try:
-        # ✅ Use case-insensitive filtering with partial match
-        query = db.query(Product).filter(Product.category.ilike(f"%{category}%"))
-
-        # ✅ Restrict "customer" users to only active products
-        if user_role == "customer":
+        # ✅ Exact category (by slug) and its subcategories, on the indexed category_id
+        category_ids = get_category_with_descendants(db, category)
+        if not category_ids:
+            return []
+        query = db.query(Product).filter(Product.category_id.in_(category_ids)).order_by(Product.id)
+
+        # ✅ Restrict guests and customers to only active products
+        if active_only(user_role):
             query = query.filter(Product.is_active == True)
 
         # ✅ Apply pagination
@@ -380,7 +802,7 @@ def get_products_by_category(db: Session, category: str, user_role: str, skip: i
 def get_products_by_rating(db: Session, min_rating: float, max_rating: float, user_role: str, skip: int = 0, limit: int = 10):
     """
     Fetch products by rating range.
-    - Customers see only active products.
+    - Guests and customers see only active products.
     - Admins/Vendors see all products.
     - Supports pagination.
     """
@@ -394,8 +816,8 @@ def get_products_by_rating(db: Session, min_rating: float, max_rating: float, us
         # ✅ Use rating filter
         query = db.query(Product).filter(Product.product_rating.between(min_rating, max_rating))
 
-        # ✅ Restrict "customer" users to only active products
-        if user_role == "customer":
+        # ✅ Restrict guests and customers to only active products
+        if active_only(user_role):
             query = query.filter(Product.is_active == True)
 
         # ✅ Apply pagination
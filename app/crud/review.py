@@ -1,15 +1,43 @@
+import base64
+import json
 import pytz
 from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import Numeric, case, cast, func, literal, select, tuple_, update
 from sqlalchemy.orm import Session
-from app.models import Product, Review  # Make sure Review is imported
+from app.models import Product, Review, User  # Make sure Review is imported
 from app.schemas import ReviewCreate
+from app.product_events import record_product_changes
 
 # IST timezone
 IST = pytz.timezone("Asia/Kolkata")
 
+# Positive reviews (rating 4 or above) count twice in the weighted average rating
+POSITIVE_RATING = 4
+POSITIVE_WEIGHT = 2
+
+
+def rating_weight(rating: float) -> int:
+    return POSITIVE_WEIGHT if rating >= POSITIVE_RATING else 1
+
+
+def rating_stars(rating: float) -> int:
+    """Histogram bucket (1-5 stars) of a rating, rounded half up."""
+    return min(5, max(1, int(rating + 0.5)))
+
+
+def weighted_average(weighted_sum, weight_total):
+    """SQL expression for the weighted average rating, rounded to 2 decimals."""
+    return case(
+        (weight_total > 0, func.round(cast(weighted_sum, Numeric) / weight_total, 2)),
+        else_=0.0,
+    )
+
+
 def create_review(db: Session, user_id: int, product_id: int, review_data: ReviewCreate):
     """
     Create a new review for a product by a customer.
+    - The product's review aggregates and rating are updated in the same transaction.
     """
     # Create a new review instance with timestamp in IST
     review = Review(
@@ -20,13 +48,158 @@ def create_review(db: Session, user_id: int, product_id: int, review_data: Revie
         created_at=datetime.now(IST),  # Use IST for timestamp
     )
     db.add(review)
+
+    # ✅ Increment the aggregates in SQL, so concurrent reviews cannot overwrite each other
+    weight = rating_weight(review.rating)
+    stars = getattr(Product, f"rating_{rating_stars(review.rating)}")
+    weighted_sum = Product.rating_weighted_sum + review.rating * weight
+    weight_total = Product.rating_weight_total + weight
+    db.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values({
+            Product.review_count: Product.review_count + 1,
+            Product.rating_sum: Product.rating_sum + review.rating,
+            Product.rating_weighted_sum: weighted_sum,
+            Product.rating_weight_total: weight_total,
+            stars: stars + 1,
+            Product.product_rating: weighted_average(weighted_sum, weight_total),
+        })
+        .execution_options(synchronize_session=False)
+    )
+    record_product_changes(db, [product_id])
     db.commit()
     db.refresh(review)
     return review
 
-def get_reviews_for_product(db: Session, product_id: int):
+
+def backfill_rating_aggregates(db: Session, batch_size: int = 10_000):
     """
-    Fetch all reviews for a product.
+    Recompute the review aggregates and rating of every product from its reviews.
+    - Runs one set-based UPDATE per range of `batch_size` product ids, each in its own transaction.
+    - Returns the number of products updated.
     """
-    return db.query(Review).filter(Review.product_id == product_id).all()
+    star = case(
+        (Review.rating >= 4.5, 5),
+        (Review.rating >= 3.5, 4),
+        (Review.rating >= 2.5, 3),
+        (Review.rating >= 1.5, 2),
+        else_=1,
+    )
+    weight = case((Review.rating >= POSITIVE_RATING, POSITIVE_WEIGHT), else_=1)
+
+    updated = 0
+    last_id = db.scalar(select(func.max(Product.id))) or 0
+    for start in range(0, last_id, batch_size):
+        in_range = Product.id.between(start + 1, start + batch_size)
+        stats = (
+            select(
+                Review.product_id,
+                func.count(Review.id).label("review_count"),
+                func.sum(Review.rating).label("rating_sum"),
+                func.sum(Review.rating * weight).label("rating_weighted_sum"),
+                func.sum(weight).label("rating_weight_total"),
+                *[func.sum(case((star == stars, 1), else_=0)).label(f"rating_{stars}") for stars in range(1, 6)],
+            )
+            .where(Review.product_id.between(start + 1, start + batch_size))
+            .group_by(Review.product_id)
+            .subquery()
+        )
+        # Products without reviews are reset, in case their reviews were deleted
+        db.execute(
+            update(Product)
+            .where(in_range)
+            .values(
+                review_count=0, rating_sum=0.0, rating_weighted_sum=0.0, rating_weight_total=0,
+                rating_1=0, rating_2=0, rating_3=0, rating_4=0, rating_5=0, product_rating=0.0,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = db.execute(
+            update(Product)
+            .where(Product.id == stats.c.product_id)
+            .values(
+                review_count=stats.c.review_count,
+                rating_sum=stats.c.rating_sum,
+                rating_weighted_sum=stats.c.rating_weighted_sum,
+                rating_weight_total=stats.c.rating_weight_total,
+                rating_1=stats.c.rating_1,
+                rating_2=stats.c.rating_2,
+                rating_3=stats.c.rating_3,
+                rating_4=stats.c.rating_4,
+                rating_5=stats.c.rating_5,
+                product_rating=weighted_average(stats.c.rating_weighted_sum, stats.c.rating_weight_total),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        updated += result.rowcount
+        record_product_changes(db, db.scalars(select(Product.id).where(in_range)).all())
+        db.commit()
+    return updated
+
+
+REVIEW_SORTS = {
+    "newest": (Review.created_at, "desc"),
+    "highest": (Review.rating, "desc"),
+    "lowest": (Review.rating, "asc"),
+}
+
+
+def encode_review_cursor(sort: str, review) -> str:
+    """Opaque cursor pointing after `review` in the given sort order."""
+    column, _ = REVIEW_SORTS[sort]
+    key = getattr(review, column.key)
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    payload = json.dumps({"s": sort, "k": key, "id": review.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_review_cursor(cursor: str, sort: str) -> dict:
+    """Decode a cursor from `encode_review_cursor`, rejecting tampered or mismatched ones."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["s"] != sort:
+            raise ValueError("cursor does not match the requested sort")
+        if sort == "newest":
+            data["k"] = datetime.fromisoformat(data["k"])
+        else:
+            data["k"] = float(data["k"])
+        return data
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor.")
+
+
+def get_reviews_page(db: Session, product_id: int, sort: str = "newest", cursor: str = None, limit: int = 20):
+    """
+    Fetch one page of a product's reviews with the reviewers' usernames, in a single query.
+    - Seeks past the cursor's (sort key, id) on the (product_id, sort key, id) indexes, so every page costs the same.
+    - Returns `(reviews, next_cursor)`, each review with a `username` attribute.
+    """
+    if sort not in REVIEW_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort. Use one of: {', '.join(REVIEW_SORTS)}.")
+    column, order = REVIEW_SORTS[sort]
+
+    stmt = (
+        select(Review, User.username)
+        .outerjoin(User, User.id == Review.user_id)
+        .where(Review.product_id == product_id)
+    )
+    if cursor:
+        position = decode_review_cursor(cursor, sort)
+        key = tuple_(column, Review.id)
+        bound = tuple_(literal(position["k"], column.type), literal(position["id"]))
+        stmt = stmt.where(key < bound if order == "desc" else key > bound)
+    if order == "desc":
+        stmt = stmt.order_by(column.desc(), Review.id.desc())
+    else:
+        stmt = stmt.order_by(column.asc(), Review.id.asc())
+
+    reviews = []
+    for review, username in db.execute(stmt.limit(limit + 1)):
+        review.username = username
+        reviews.append(review)
 
+    # ✅ One extra row tells whether another page exists
+    next_cursor = encode_review_cursor(sort, reviews[limit - 1]) if len(reviews) > limit else None
+    return reviews[:limit], next_cursor
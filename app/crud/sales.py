@@ -111,62 +111,33 @@ def get_daily_sales_trend(
 
 
 def get_popular_products(db: Session, limit=10):
-    from app.models import Wishlist, Cart
+    """
+    Most wishlisted and carted products, from the engagement counters (app/engagement.py)
+    instead of counting the wishlists and carts tables on every request.
+    - The counts are cumulative adds: removing a product from a wishlist or cart does not lower them.
+      Migration 0012 started them from the wishlists and carts rows of the time.
+    """
+    from app.models import ProductEngagement
     try:
-        # Get all products before filtering
-        all_products = db.query(Product.id, Product.name).all()
-        logger.debug(f"ALL PRODUCTS (Unfiltered): {all_products}")
-
-        # Get wishlist popularity
-        wishlist_popularity = db.query(
+        results = db.query(
             Product.id,
             Product.name,
-            func.coalesce(func.count(Wishlist.product_id), 0).label("wishlist_count")  # Default 0 if no data
-        ).outerjoin(Wishlist, Wishlist.product_id == Product.id)\
-        .group_by(Product.id, Product.name)\
-        .order_by(func.count(Wishlist.product_id).desc())\
+            ProductEngagement.wishlist_add_count,
+            ProductEngagement.cart_add_count,
+            ProductEngagement.view_count,
+        ).join(ProductEngagement, ProductEngagement.product_id == Product.id)\
+        .order_by(ProductEngagement.wishlist_add_count.desc(), ProductEngagement.cart_add_count.desc(), Product.id)\
         .limit(limit).all()
 
-        logger.debug(f"Wishlist popularity: {wishlist_popularity}")
-
-        # Get cart popularity
-        cart_popularity = db.query(
-            Product.id,
-            Product.name,
-            func.count(Cart.product_id).label("cart_count")
-        ).join(Cart, Cart.product_id == Product.id)\
-        .group_by(Product.id, Product.name)\
-        .order_by(func.count(Cart.product_id).desc())\
-        .limit(limit).all()
+        logger.debug(f"Popular products: {results}")
 
-        logger.debug(f"Cart popularity: {cart_popularity}")
-
-        # Combine results manually
-        popularity_dict = {}
-
-        for item in wishlist_popularity:
-            popularity_dict[item[0]] = {
-                "id": item[0],
-                "name": item[1],
-                "wishlist_count": item[2],
-                "cart_count": 0  # Default value
-            }
-
-        for item in cart_popularity:
-            if item[0] in popularity_dict:
-                popularity_dict[item[0]]["cart_count"] = item[2]
-            else:
-                popularity_dict[item[0]] = {
-                    "id": item[0],
-                    "name": item[1],
-                    "wishlist_count": 0,
-                    "cart_count": item[2]
-                }
-
-        final_results = sorted(popularity_dict.values(), key=lambda x: x["wishlist_count"], reverse=True)
-
-        # Return top N products or default products if empty
-        return final_results[:limit] if final_results else all_products[:limit]
+        if not results:
+            # Return some products when nothing was counted yet
+            return db.query(Product.id, Product.name).order_by(Product.id).limit(limit).all()
+        return [
+            {"id": r[0], "name": r[1], "wishlist_count": r[2], "cart_count": r[3], "view_count": r[4]}
+            for r in results
+        ]
     except Exception as e:
         logger.error(f"Error fetching popular products: {e}")
         return None
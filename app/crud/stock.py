@@ -0,0 +1,177 @@
+"""
+Stock reservations: cart lines hold stock for STOCK_HOLD_MINUTES.
+
+`products.stock_remaining` is the physical stock; it only changes at
+checkout. What customers can still add to a cart is
+
+    available = stock_remaining - unexpired holds of the product
+
+summed from the (product_id, expires_at) INCLUDE (quantity) index of
+stock_reservations, an index-only range scan per product. A hold
+counts only until `expires_at`, so abandoned carts free their stock without
+any write; `HoldSweeper` deletes expired holds in batches in the background.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.models import Product, StockReservation
+
+logger = logging.getLogger(__name__)
+
+STOCK_HOLD_MINUTES = int(os.getenv("STOCK_HOLD_MINUTES", "30"))
+STOCK_HOLD_SWEEP_SECONDS = int(os.getenv("STOCK_HOLD_SWEEP_SECONDS", "60"))
+# Expired holds deleted per transaction
+HOLD_SWEEP_BATCH_SIZE = 1000
+
+
+def _utcnow():
+    return datetime.utcnow()
+
+
+def active_holds_query(product_ids, exclude_user_id: int = None):
+    """`(product_id, held quantity)` of the unexpired holds of these products."""
+    stmt = (
+        select(StockReservation.product_id, func.sum(StockReservation.quantity))
+        .where(StockReservation.product_id.in_(product_ids), StockReservation.expires_at > _utcnow())
+        .group_by(StockReservation.product_id)
+    )
+    if exclude_user_id is not None:
+        stmt = stmt.where(StockReservation.user_id != exclude_user_id)
+    return stmt
+
+
+def _hold_upsert(db: Session):
+    """`INSERT ... ON CONFLICT DO UPDATE` replacing a user's hold on a product and restarting its expiry."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(StockReservation)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "product_id"],
+        set_={"quantity": stmt.excluded.quantity, "expires_at": stmt.excluded.expires_at},
+    )
+
+
+def reserve_stock_many(db: Session, user_id: int, quantities: dict):
+    """
+    Hold `quantities` ({product_id: quantity}) for the user's cart, in the caller's transaction.
+    - The product rows are locked (not written) in id order while the holds of other carts are
+      summed, so concurrent reservations cannot together hold more than the stock.
+    - Set-based: one query for the products, one for the holds, one upsert, whatever the number of products.
+    - Replaces existing holds of the user on these products and restarts their expiry.
+    """
+    product_ids = sorted(quantities)
+    stock = dict(db.execute(
+        select(Product.id, Product.stock_remaining)
+        .where(Product.id.in_(product_ids))
+        .order_by(Product.id)
+        .with_for_update()
+    ).all())
+    missing = [product_id for product_id in product_ids if product_id not in stock]
+    if missing:
+        detail = "Product not found" if len(product_ids) == 1 else f"Products not found: {', '.join(map(str, missing))}"
+        raise HTTPException(status_code=404, detail=detail)
+
+    held = dict(db.execute(active_holds_query(product_ids, exclude_user_id=user_id)).all())
+    available = {product_id: max((stock[product_id] or 0) - held.get(product_id, 0), 0) for product_id in product_ids}
+    short = [product_id for product_id in product_ids if quantities[product_id] > available[product_id]]
+    if short:
+        if len(product_ids) == 1:
+            detail = f"Only {available[short[0]]} units available"
+        else:
+            detail = "Insufficient stock for products " + ", ".join(
+                f"{product_id} ({available[product_id]} available)" for product_id in short
+            )
+        raise HTTPException(status_code=400, detail=detail)
+
+    expires_at = _utcnow() + timedelta(minutes=STOCK_HOLD_MINUTES)
+    db.execute(_hold_upsert(db), [
+        {"user_id": user_id, "product_id": product_id, "quantity": quantities[product_id], "expires_at": expires_at}
+        for product_id in product_ids
+    ])
+
+
+def reserve_stock(db: Session, user_id: int, product_id: int, quantity: int):
+    """Hold `quantity` of a product for the user's cart, in the caller's transaction (see `reserve_stock_many`)."""
+    reserve_stock_many(db, user_id, {product_id: quantity})
+
+
+def release_stock(db: Session, user_id: int, product_id: int):
+    """Drop the user's hold on a product, in the caller's transaction."""
+    db.execute(
+        delete(StockReservation)
+        .where(StockReservation.user_id == user_id, StockReservation.product_id == product_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def release_holds_statement(user_id: int, product_ids):
+    """DELETE of the user's holds on these products, for checkout."""
+    return (
+        delete(StockReservation)
+        .where(StockReservation.user_id == user_id, StockReservation.product_id.in_(product_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def expire_holds(db: Session, batch_size: int = HOLD_SWEEP_BATCH_SIZE):
+    """Delete expired holds, `batch_size` per transaction; returns how many were deleted."""
+    deleted = 0
+    while True:
+        ids = db.scalars(
+            select(StockReservation.id)
+            .where(StockReservation.expires_at <= _utcnow())
+            .order_by(StockReservation.expires_at)
+            .limit(batch_size)
+        ).all()
+        if not ids:
+            return deleted
+        db.execute(delete(StockReservation).where(StockReservation.id.in_(ids)).execution_options(synchronize_session=False))
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
+
+
+class HoldSweeper:
+    """Background thread deleting expired holds every STOCK_HOLD_SWEEP_SECONDS."""
+
+    def __init__(self, interval_seconds: int = STOCK_HOLD_SWEEP_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        from app.database import SessionLocal
+
+        while not self._stopped.wait(self.interval_seconds):
+            db = SessionLocal()
+            try:
+                deleted = expire_holds(db)
+                if deleted:
+                    logger.info(f"Deleted {deleted} expired stock holds")
+            except Exception:
+                db.rollback()
+                logger.exception("Deleting expired stock holds failed")
+            finally:
+                db.close()
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="stock-hold-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread = None
+
+
+hold_sweeper = HoldSweeper()
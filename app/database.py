@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
+from starlette.requests import Request
+import itertools
+import math
 import os
+import sqlite3
+import threading
+import time
 
 # Load environment variables
 load_dotenv()
@@ -10,17 +19,439 @@ load_dotenv()
 # PostgreSQL Database URL
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Connection pool settings (per worker process)
+DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)  # seconds to wait for a free connection
+DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)  # seconds before a connection is replaced
+DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+# Read replicas for read-only endpoints (comma separated URLs)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+DB_REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin")  # or "least_connections"
+DB_REPLICA_RETRY_SECONDS = _env_int("DB_REPLICA_RETRY_SECONDS", 30)  # how long a failed replica is skipped
+
+# Serve the hot catalog/cart/checkout routes from the asyncio engine (asyncpg)
+DB_ASYNC_MODE = _env_bool("DB_ASYNC_MODE", False)
+
+# Total connections this deployment may open, shared by all gunicorn workers.
+# When set, pool_size + max_overflow of every worker is capped to its share.
+DB_CONNECTION_BUDGET = _env_int("DB_CONNECTION_BUDGET", 0)
+WEB_CONCURRENCY = max(_env_int("WEB_CONCURRENCY", 1), 1)
+
+
+def worker_pool_limits(pool_size: int, max_overflow: int, budget: int, workers: int):
+    """
+    Fit pool_size/max_overflow into the per-worker share of the connection budget.
+    - A budget of 0 means "no budget", the configured values are used as-is.
+    - The steady pool is filled first, overflow gets whatever is left of the share.
+    """
+    if budget <= 0:
+        return pool_size, max_overflow
+    per_worker = max(budget // workers, 1)
+    size = min(pool_size, per_worker)
+    overflow = min(max_overflow, per_worker - size)
+    return size, overflow
+
+
+class LatencyHistogram:
+    """Thread-safe cumulative histogram of durations in milliseconds."""
+
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.BUCKETS_MS) + 1)
+            self._count = 0
+            self._total_ms = 0.0
+            self._max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        index = len(self.BUCKETS_MS)
+        for i, bound in enumerate(self.BUCKETS_MS):
+            if duration_ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._total_ms += duration_ms
+            if duration_ms > self._max_ms:
+                self._max_ms = duration_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            count, total_ms, max_ms = self._count, self._total_ms, self._max_ms
+        labels = [f"le_{bound}ms" for bound in self.BUCKETS_MS] + ["le_inf"]
+        return {
+            "count": count,
+            "avg_ms": round(total_ms / count, 3) if count else 0.0,
+            "max_ms": round(max_ms, 3),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+class PoolMetrics:
+    """Counters and latency histograms collected from the engine's connection pool."""
+
+    def __init__(self):
+        self.wait = LatencyHistogram()  # time spent waiting for a connection from the pool
+        self.hold = LatencyHistogram()  # time a connection stays checked out
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.wait.reset()
+        self.hold.reset()
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.connects = 0
+            self.invalidations = 0
+
+    def incr(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+pool_metrics = PoolMetrics()
+async_pool_metrics = PoolMetrics()
+
+
+class _WaitTimingMixin:
+    """Records how long callers wait to get a connection from the pool."""
+
+    metrics = pool_metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.incr("timeouts")
+            raise
+        finally:
+            self.metrics.wait.observe((time.perf_counter() - started) * 1000)
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _register_pool_events(engine, metrics: PoolMetrics):
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.incr("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.incr("checkouts")
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            metrics.hold.observe((time.perf_counter() - checked_out_at) * 1000)
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.incr("invalidations")
+
+
+def _sqlite_math_functions(dbapi_connection, connection_record):
+    """`ln` and `exp` on SQLite builds without the math functions (used by the engagement upsert)."""
+    for name, function in (("ln", math.log), ("exp", math.exp)):
+        try:
+            dbapi_connection.execute(f"SELECT {name}(1)")
+        except sqlite3.OperationalError:
+            dbapi_connection.create_function(name, 1, function, deterministic=True)
+
+
+def build_engine(url: str, metrics: PoolMetrics = pool_metrics):
+    """Create an engine with the pool settings from the environment."""
+    if url.startswith("sqlite"):
+        # SQLite has no server-side connection limit, keep SQLAlchemy's defaults
+        new_engine = create_engine(url, connect_args={"check_same_thread": False})
+        _register_pool_events(new_engine, metrics)
+        event.listen(new_engine, "connect", _sqlite_math_functions)
+        return new_engine
+
+    pool_size, max_overflow = worker_pool_limits(
+        DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_CONNECTION_BUDGET, WEB_CONCURRENCY
+    )
+    # A subclass per engine keeps the metrics attached when the pool is recreated
+    poolclass = type("InstrumentedQueuePool", (InstrumentedQueuePool,), {"metrics": metrics})
+    new_engine = create_engine(
+        url,
+        poolclass=poolclass,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    _register_pool_events(new_engine, metrics)
+    return new_engine
+
+
+def async_database_url(url: str) -> str:
+    """
+    Map the sync DATABASE_URL onto its asyncio driver.
+    - postgresql:// -> postgresql+asyncpg:// (`sslmode` becomes asyncpg's `ssl`)
+    - sqlite:// -> sqlite+aiosqlite://
+    """
+    if url.startswith("sqlite"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1).replace("+pysqlite", "")
+    scheme, rest = url.split("://", 1)
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        scheme = "postgresql+asyncpg"
+    return f"{scheme}://{rest.replace('sslmode=', 'ssl=')}"
+
+
+def build_async_engine(url: str, metrics: PoolMetrics = async_pool_metrics):
+    """Create the asyncio engine with the same pool settings as the sync one."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    async_url = async_database_url(url)
+    if async_url.startswith("sqlite"):
+        new_engine = create_async_engine(async_url)
+    else:
+        pool_size, max_overflow = worker_pool_limits(
+            DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_CONNECTION_BUDGET, WEB_CONCURRENCY
+        )
+        poolclass = type("InstrumentedAsyncQueuePool", (InstrumentedAsyncQueuePool,), {"metrics": metrics})
+        new_engine = create_async_engine(
+            async_url,
+            poolclass=poolclass,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    _register_pool_events(new_engine.sync_engine, metrics)
+    return new_engine
+
+
+def get_pool_status(target_engine=None, metrics: PoolMetrics = pool_metrics) -> dict:
+    """Current pool occupancy plus the collected wait/hold histograms."""
+    pool = (target_engine or engine).pool
+    status = {
+        "pool_class": pool.__class__.__name__,
+        "metrics": {
+            "checkouts": metrics.checkouts,
+            "timeouts": metrics.timeouts,
+            "connects": metrics.connects,
+            "invalidations": metrics.invalidations,
+            "wait_time": metrics.wait.snapshot(),
+            "checkout_latency": metrics.hold.snapshot(),
+        },
+    }
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+        })
+    return status
+
+
 # SQLAlchemy Engine
-engine = create_engine(DATABASE_URL)
+engine = build_engine(DATABASE_URL)
+
+
+
+class ReplicaSet:
+    """
+    Engines of the read replicas with health tracking.
+    - Replicas are picked round-robin or by fewest checked-out connections.
+    - A replica whose connection fails or drops during a real query is skipped for
+      DB_REPLICA_RETRY_SECONDS, then the next session picking it tries it again.
+      Nothing is probed per request.
+    """
+
+    def __init__(self, urls, strategy: str = "round_robin", retry_seconds: int = 30):
+        self.metrics = [PoolMetrics() for _ in urls]
+        self.engines = [build_engine(url, metrics) for url, metrics in zip(urls, self.metrics)]
+        self.strategy = strategy
+        self.retry_seconds = retry_seconds
+        self._down_until = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        for replica_engine in self.engines:
+            event.listen(replica_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        # No connection: the connect itself failed
+        if context.is_disconnect or context.connection is None:
+            self.mark_down(context.engine)
+
+    def healthy(self):
+        now = time.monotonic()
+        with self._lock:
+            return [e for e in self.engines if self._down_until.get(e, 0) <= now]
+
+    def mark_down(self, replica_engine):
+        with self._lock:
+            self._down_until[replica_engine] = time.monotonic() + self.retry_seconds
+
+    def _ordered_candidates(self):
+        candidates = self.healthy()
+        if not candidates:
+            return []
+        if self.strategy == "least_connections":
+            return sorted(
+                candidates,
+                key=lambda e: e.pool.checkedout() if isinstance(e.pool, QueuePool) else 0,
+            )
+        start = next(self._counter) % len(candidates)
+        return candidates[start:] + candidates[:start]
+
+    def acquire(self):
+        """Return the replica engine to use, or None when all of them are down."""
+        candidates = self._ordered_candidates()
+        return candidates[0] if candidates else None
+
+    def status(self):
+        now = time.monotonic()
+        return [
+            {
+                "replica": replica_engine.url.render_as_string(hide_password=True),
+                "healthy": self._down_until.get(replica_engine, 0) <= now,
+                **get_pool_status(replica_engine, metrics),
+            }
+            for replica_engine, metrics in zip(self.engines, self.metrics)
+        ]
+
+
+replicas = ReplicaSet(DATABASE_REPLICA_URLS, DB_REPLICA_STRATEGY, DB_REPLICA_RETRY_SECONDS)
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to a replica and everything else to the primary.
+    - Flushes and INSERT/UPDATE/DELETE statements always use the primary.
+    - After a write in the same session or request, reads stick to the primary. The request's
+      flag lives on `request.state` (see `get_db`), which sync routes in the threadpool share.
+    - The replica is chosen once per session and the primary is used when none is up.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["sticky_primary"] = True
+            return engine
+        if self.info.get("sticky_primary") or getattr(self.info.get("request_state"), "wrote_primary", False):
+            return engine
+        if "replica" not in self.info:
+            self.info["replica"] = replicas.acquire() if replicas.engines else None
+        return self.info["replica"] or engine
+
+
+def _mark_request_wrote(session, flush_context=None):
+    session.info["sticky_primary"] = True
+    request_state = session.info.get("request_state")
+    if request_state is not None:
+        request_state.wrote_primary = True
+
+
+def _mark_request_wrote_on_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_request_wrote(orm_execute_state.session)
+
+
+class SequenceBlockAllocator:
+    """
+    Primary keys taken from a table's id sequence in blocks (PostgreSQL).
+    - One `nextval` round trip over `generate_series` reserves a whole block, later calls are served from memory.
+    - Every worker process reserves its own blocks, ids it never uses leave gaps.
+    - Returns None on databases without sequences (SQLite), callers then let the database assign ids.
+    """
+
+    def __init__(self, table: str, column: str = "id", block_size: int = 1000):
+        self.table = table
+        self.column = column
+        self.block_size = block_size
+        self._reserved = []
+        self._lock = threading.Lock()
+
+    def allocate(self, count: int):
+        if engine.dialect.name != "postgresql":
+            return None
+        with self._lock:
+            if len(self._reserved) < count:
+                # nextval is not transactional, a separate primary connection keeps it off replicas
+                with engine.connect() as connection:
+                    self._reserved.extend(connection.scalars(
+                        text("SELECT nextval(pg_get_serial_sequence(:table, :column)) FROM generate_series(1, :count)"),
+                        {"table": self.table, "column": self.column, "count": max(self.block_size, count - len(self._reserved))},
+                    ))
+            ids = self._reserved[:count]
+            del self._reserved[:count]
+        return ids
+
 
 # Define Base and Session
 Base = declarative_base()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+for _sessionmaker in (SessionLocal, ReadSessionLocal):
+    event.listen(_sessionmaker, "after_flush", _mark_request_wrote)
+    event.listen(_sessionmaker, "do_orm_execute", _mark_request_wrote_on_dml)
+
+# Async engine and sessions, only created when async mode is enabled
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC_MODE:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = build_async_engine(DATABASE_URL)
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 # Dependency to get database session
-def get_db():
-    db = SessionLocal()
+def get_db(request: Request):
+    db = SessionLocal(info={"request_state": request.state})
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get a session for read-only endpoints (replica when configured)
+def get_read_db(request: Request):
+    db = ReadSessionLocal(info={"request_state": request.state})
     try:
         yield db
     finally:
         db.close()
+
+# Dependency to get an async database session
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database access is disabled. Set DB_ASYNC_MODE=true to enable it.")
+    async with AsyncSessionLocal() as db:
+        yield db
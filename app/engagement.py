@@ -0,0 +1,204 @@
+"""
+Product engagement counters: views, cart adds and wishlist adds.
+
+Requests only bump an in-memory counter of their worker. A background thread
+flushes the aggregated counts every ENGAGEMENT_FLUSH_SECONDS, one upsert per
+batch of products into `product_engagement`, so engagement never adds a
+write to the request itself.
+
+Each flush also folds the new engagement into the product's trending score,
+an exponentially decayed sum with a half-life of TRENDING_HALF_LIFE_HOURS.
+It uses forward decay: new engagement is weighted up by
+2^(half-lives since TRENDING_EPOCH) instead of decaying every stored score,
+and the sum is stored as its log2 so the weights never overflow. Scores of
+all products stay comparable, so the trending list is a plain index scan on
+`trending_score`.
+"""
+import logging
+import math
+import os
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.models import Product, ProductEngagement
+
+logger = logging.getLogger(__name__)
+
+ENGAGEMENT_FLUSH_SECONDS = float(os.getenv("ENGAGEMENT_FLUSH_SECONDS", "10"))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# Products with pending counts that wake the flusher before its interval
+MAX_PENDING_PRODUCTS = 10_000
+# Products written per upsert
+FLUSH_BATCH_SIZE = 500
+
+# Counter columns and their weight in the trending score
+EVENTS = {
+    "view": ("view_count", 1.0),
+    "cart_add": ("cart_add_count", 5.0),
+    "wishlist_add": ("wishlist_add_count", 3.0),
+}
+
+
+LN2 = math.log(2)
+
+
+def half_lives_since_epoch(now: datetime = None) -> float:
+    now = now or datetime.now(timezone.utc)
+    return (now - TRENDING_EPOCH).total_seconds() / 3600 / TRENDING_HALF_LIFE_HOURS
+
+
+def current_trending_score(trending_score, now: datetime = None) -> float:
+    """Decayed engagement as of now: a product viewed once a half-life ago scores 0.5."""
+    if trending_score is None:
+        return 0.0
+    return round(2 ** (trending_score - half_lives_since_epoch(now)), 3)
+
+
+def _upsert(db: Session):
+    """
+    `INSERT ... ON CONFLICT DO UPDATE` adding the flushed counts and score to the stored ones.
+    - The score is log-added in the statement, log2(2^stored + 2^flushed), so concurrent flushes of
+      several workers never overwrite each other's batch.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        greatest = func.greatest
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+        greatest = func.max
+    stmt = insert(ProductEngagement)
+    values = {column: getattr(ProductEngagement, column) + getattr(stmt.excluded, column) for column, _ in EVENTS.values()}
+    stored, flushed = ProductEngagement.trending_score, stmt.excluded.trending_score
+    # log2(2^a + 2^b) = max(a, b) + log2(1 + 2^-|a - b|), in natural logs (see _sqlite_math_functions)
+    values["trending_score"] = greatest(stored, flushed) + func.ln(1 + func.exp(-func.abs(stored - flushed) * LN2)) / LN2
+    values["updated_at"] = stmt.excluded.updated_at
+    return stmt.on_conflict_do_update(index_elements=["product_id"], set_=values)
+
+
+class EngagementCounters:
+    """Per worker counters of product engagement, flushed to the database in batches."""
+
+    def __init__(self, flush_seconds: float = ENGAGEMENT_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pending = {}          # product id -> {event: count}
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self.flushed_products = 0
+        self.failed_flushes = 0
+
+    def record(self, product_id: int, event: str, count: int = 1):
+        """Count an engagement event ("view", "cart_add", "wishlist_add") for a product."""
+        with self._lock:
+            counts = self._pending.setdefault(product_id, {})
+            counts[event] = counts.get(event, 0) + count
+            if len(self._pending) >= MAX_PENDING_PRODUCTS:
+                self._wake.set()
+
+    def flush(self, db: Session = None):
+        """Write the pending counts and trending scores; returns the number of products written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        from app.database import SessionLocal
+
+        own_session = db is None
+        db = SessionLocal() if own_session else db
+        now = datetime.now(timezone.utc)
+        offset = half_lives_since_epoch(now)
+        try:
+            product_ids = sorted(pending)
+            for start in range(0, len(product_ids), FLUSH_BATCH_SIZE):
+                chunk = product_ids[start:start + FLUSH_BATCH_SIZE]
+                # Products deleted since the event was counted are skipped
+                known = set(db.scalars(select(Product.id).where(Product.id.in_(chunk))))
+                rows = []
+                for product_id in chunk:
+                    if product_id not in known:
+                        continue
+                    counts = pending[product_id]
+                    weight = sum(EVENTS[event][1] * count for event, count in counts.items())
+                    row = {column: counts.get(event, 0) for event, (column, _) in EVENTS.items()}
+                    row["product_id"] = product_id
+                    # This batch alone, the upsert adds it to the stored score
+                    row["trending_score"] = math.log2(weight) + offset
+                    row["updated_at"] = now.replace(tzinfo=None)  # naive UTC, like the other timestamps
+                    rows.append(row)
+                if rows:
+                    db.execute(_upsert(db), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            self.failed_flushes += 1
+            # Keep the counts for the next flush
+            with self._lock:
+                for product_id, counts in pending.items():
+                    merged = self._pending.setdefault(product_id, {})
+                    for event, count in counts.items():
+                        merged[event] = merged.get(event, 0) + count
+            raise
+        finally:
+            if own_session:
+                db.close()
+        self.flushed_products += len(pending)
+        return len(pending)
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Flushing product engagement counters failed")
+
+    def start(self):
+        """Start the background flusher, once per worker."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="engagement-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write what is left (worker shutdown)."""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds)
+            self._thread = None
+        self.flush()
+
+    def status(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "pending_products": pending,
+            "flushed_products": self.flushed_products,
+            "failed_flushes": self.failed_flushes,
+            "flush_seconds": self.flush_seconds,
+        }
+
+
+engagement_counters = EngagementCounters()
+
+
+def get_trending_products(db: Session, limit: int = 10, active_only: bool = False):
+    """Products with the highest trending score, as `(product, engagement)`, read along the trending_score index."""
+    stmt = (
+        select(Product, ProductEngagement)
+        .join(ProductEngagement, ProductEngagement.product_id == Product.id)
+        .order_by(ProductEngagement.trending_score.desc(), Product.id)
+        .limit(limit)
+    )
+    if active_only:
+        stmt = stmt.where(Product.is_active == True)
+    return db.execute(stmt).all()
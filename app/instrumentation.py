@@ -0,0 +1,137 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.middleware.base import BaseHTTPMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Same statement shape this many times in one request is reported as a likely N+1
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+# Default query budget for routes without @query_budget (0 = unlimited)
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "0"))
+# Strict mode turns an exceeded budget into a 500 response, meant for tests and CI
+SQL_STRICT_MODE = os.getenv("SQL_STRICT_MODE", "false").strip().lower() in ("1", "true", "yes", "on")
+
+# Bound parameter lists like "(?, ?, ?)" or "(%(id_1)s, %(id_2)s)" collapse to one shape
+_PARAM_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a SQL statement so repeated queries with different parameters compare equal."""
+    return _PARAM_LIST.sub("(?...)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class RequestSQLStats:
+    """Queries issued while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, duration_ms: float):
+        self.count += 1
+        self.duration_ms += duration_ms
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated_statements(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD):
+        """Statement shapes executed at least `threshold` times (likely N+1)."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+_request_stats = ContextVar("sql_request_stats", default=None)
+
+
+def current_sql_stats():
+    """Stats of the request being handled, None outside of a request."""
+    return _request_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_stats.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    started = conn.info.get("query_started_at")
+    if stats is None or not started:
+        return
+    stats.record(statement, (time.perf_counter() - started.pop()) * 1000)
+
+
+def query_budget(max_queries: int):
+    """
+    Declare the maximum number of SQL queries a route may issue per request.
+
+    @router.get("/cart")
+    @query_budget(3)
+    def view_cart(...): ...
+    """
+    def decorator(func):
+        func.__sql_query_budget__ = max_queries
+        return func
+    return decorator
+
+
+class SQLInstrumentationMiddleware(BaseHTTPMiddleware):
+    """
+    Count the SQL queries and database time of every request.
+    - Adds `Server-Timing` and `X-DB-Query-Count` response headers.
+    - Logs one line per request and a warning for repeated statement shapes (likely N+1).
+    - Checks the route's query budget, failing the request in strict mode.
+    - Streaming responses (exports, analysis) query while their body is sent, after the headers:
+      their headers only count the queries made before the first byte. The log line, the N+1
+      warnings and the budget check use the full count once the body is done; strict mode can
+      no longer fail a response that has started, so it logs an error instead.
+    """
+
+    async def dispatch(self, request, call_next):
+        stats = RequestSQLStats()
+        token = _request_stats.set(stats)
+        try:
+            response = await call_next(request)
+        finally:
+            _request_stats.reset(token)
+
+        endpoint = request.scope.get("endpoint")
+        budget = getattr(endpoint, "__sql_query_budget__", SQL_QUERY_BUDGET)
+
+        if budget and stats.count > budget and SQL_STRICT_MODE:
+            message = f"{request.method} {request.url.path} issued {stats.count} SQL queries, budget is {budget}"
+            logger.warning(message)
+            return JSONResponse(status_code=500, content={"detail": f"Query budget exceeded: {message}"})
+
+        response.headers["Server-Timing"] = f'db;dur={stats.duration_ms:.2f};desc="{stats.count} queries"'
+        response.headers["X-DB-Query-Count"] = str(stats.count)
+        response.body_iterator = self._report_after_body(response.body_iterator, request, response, stats, budget)
+        return response
+
+    async def _report_after_body(self, body, request, response, stats, budget):
+        # The body keeps recording into `stats`: it runs in the context copied while the request was handled
+        async for chunk in body:
+            yield chunk
+
+        route_path = request.url.path
+        logger.info(
+            f"{request.method} {route_path} status={response.status_code} "
+            f"queries={stats.count} db_ms={stats.duration_ms:.2f}"
+        )
+        for shape, count in stats.repeated_statements():
+            logger.warning(f"Likely N+1 in {request.method} {route_path}: {count}x {shape[:200]}")
+        if budget and stats.count > budget:
+            message = f"{request.method} {route_path} issued {stats.count} SQL queries, budget is {budget}"
+            if SQL_STRICT_MODE:
+                logger.error(f"Query budget exceeded while streaming: {message}")
+            else:
+                logger.warning(message)
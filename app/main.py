@@ -3,9 +3,11 @@ import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
-from app.database import engine, Base
+from app.database import engine, Base, DB_ASYNC_MODE
+from app.instrumentation import SQLInstrumentationMiddleware
+from app.crud.cart_store import cart_store
 from fastapi.responses import FileResponse
-from app.routers import auth, product, user, cart, order, sales, review, payment, shipment
+from app.routers import auth, product, user, cart, order, sales, review, payment, shipment, internal
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,12 +26,23 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all HTTP methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["Server-Timing", "X-DB-Query-Count"],
 )
+app.add_middleware(SQLInstrumentationMiddleware)
 
 @app.get("/")
 def read_root():
     return {"message": "Server is running!"}
 
+# Async route variants take precedence over the sync ones when enabled
+if DB_ASYNC_MODE:
+    app.include_router(product.async_router, prefix="/product", tags=["Products"])
+    # The "kv" cart store makes blocking sqlite3/fcntl calls: with it the cart routes stay sync, in the threadpool
+    if cart_store.name == "orm":
+        app.include_router(cart.async_router, prefix="/cart", tags=["Cart"])
+        app.include_router(order.async_cart_router, prefix="/orders", tags=["Orders"])
+    app.include_router(order.async_router, prefix="/orders", tags=["Orders"])
+
 # Include Routers
 app.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 app.include_router(user.router, prefix="/user", tags=["Users"])
@@ -40,11 +53,61 @@ app.include_router(order.router, prefix="/orders", tags=["Orders"])
 app.include_router(payment.router, prefix="/payment", tags=["Payment"])
 app.include_router(shipment.router, prefix="/shipment", tags=["Shipment"])  
 app.include_router(sales.router, prefix="/sales", tags=["Sales Analysis"])
+app.include_router(internal.router, prefix="/internal", tags=["Internal"])
+
+# Schema handling on startup (DB_SCHEMA_MODE):
+# - "create_all": create missing tables and indexes from the models (default, local development)
+# - "migrate": apply pending migrations from migrations/ (single instance deployments)
+# - "skip": no DDL at all, migrations run once per release with `alembic upgrade head`
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "create_all")
 
-# Create tables on startup
 @app.on_event("startup")
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    if DB_SCHEMA_MODE == "create_all":
+        Base.metadata.create_all(bind=engine)
+    elif DB_SCHEMA_MODE == "migrate":
+        from alembic import command
+        from alembic.config import Config
+
+        config = Config(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini"))
+        config.attributes["configure_logger"] = False
+        command.upgrade(config, "head")
+
+@app.on_event("startup")
+def warm_up_autocomplete():
+    # Built in the background, so the first search-as-you-type query does not wait for it
+    from app.autocomplete import autocomplete_index
+
+    autocomplete_index.start_rebuild()
+
+@app.on_event("startup")
+def start_engagement_counters():
+    from app.engagement import engagement_counters
+
+    engagement_counters.start()
+
+@app.on_event("startup")
+def start_hold_sweeper():
+    # Deletes expired stock holds; they stop counting against available stock at expiry anyway
+    from app.crud.stock import hold_sweeper
+
+    hold_sweeper.start()
+
+@app.on_event("startup")
+def start_cart_store():
+    # CART_STORE=kv: replays the cart log left by the previous run, then writes new changes behind
+    cart_store.start()
+
+@app.on_event("shutdown")
+def flush_cart_store():
+    cart_store.stop()
+
+@app.on_event("shutdown")
+def flush_engagement_counters():
+    # Counts of this worker that were not flushed yet
+    from app.engagement import engagement_counters
+
+    engagement_counters.stop()
 
 # Add security scheme for Swagger UI
 def custom_openapi():
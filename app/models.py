@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index, JSON, text, DDL, event
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from datetime import datetime, timezone
 import pytz 
 from app.database import Base
 
 IST = pytz.timezone("Asia/Kolkata")
+
+
+def utc_now():
+    """Naive UTC now: product timestamps are stored as naive UTC on every backend."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -19,6 +26,16 @@ class User(Base):
     cart_items = relationship("Cart", back_populates="user", cascade="all, delete")
     wishlist_items = relationship("Wishlist", back_populates="user", cascade="all, delete")
 
+class Category(Base):
+    __tablename__ = "categories"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    slug = Column(String, unique=True, index=True, nullable=False)
+    parent_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), index=True, nullable=True)
+    # ✅ Active products filed directly under this category, kept up to date by app/crud/category.py
+    active_product_count = Column(Integer, default=0, server_default="0", nullable=False)
+    created_at = Column(DateTime, default=utc_now)
+
 class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, index=True)
@@ -32,27 +49,69 @@ class Product(Base):
     profit_per_item_inr = Column(Float)  
     total_stock = Column(Integer)
     stock_remaining = Column(Integer)
-    category = Column(String)
+    category = Column(String, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL", name="fk_products_category_id"), index=True, nullable=True)
     image_url = Column(String)
-    vendor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    vendor_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     is_active = Column(Boolean, default=True) 
     deleted_at = Column(DateTime, nullable=True) 
     product_rating = Column(Float, default=0.0) 
-    # ✅ Add created_at and updated_at in IST
-    created_at = Column(DateTime, default=lambda: datetime.now(IST))
-    updated_at = Column(DateTime, default=lambda: datetime.now(IST), onupdate=lambda: datetime.now(IST))
+    # ✅ Review aggregates, updated with every review (see app/crud/review.py)
+    review_count = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum = Column(Float, default=0.0, server_default="0", nullable=False)
+    rating_weighted_sum = Column(Float, default=0.0, server_default="0", nullable=False)
+    rating_weight_total = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_1 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_2 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_3 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_4 = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_5 = Column(Integer, default=0, server_default="0", nullable=False)
+    # ✅ created_at and updated_at in UTC, rendered in IST by the serializers
+    created_at = Column(DateTime, default=utc_now)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
     # Relationships
     vendor = relationship("User", back_populates="products")
     cart_items = relationship("Cart", back_populates="product", cascade="all, delete")
     wishlist_items = relationship("Wishlist", back_populates="product", cascade="all, delete")
     reviews = relationship("Review", back_populates="product", cascade="all, delete")  
 
+    __table_args__ = (
+        # Customers only ever see active products
+        Index("ix_products_active", "id", postgresql_where=text("is_active"), sqlite_where=text("is_active")),
+        # Keyset pagination of the product listing, one per sort order
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_price_after_discount_id", "price_after_discount", "id"),
+        Index("ix_products_product_rating_id", "product_rating", "id"),
+        # Incremental catalog exports (updated_since)
+        Index("ix_products_updated_at", "updated_at"),
+    )
+
+# Full-text search on PostgreSQL (see app/search.py): a generated tsvector over
+# name, category and description with a GIN index, and pg_trgm indexes that
+# serve typo-tolerant matching and ILIKE '%...%' on name and category.
+# Not part of the model because SQLite has no equivalent; migration 0004 adds
+# the same objects to existing databases.
+PRODUCT_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_category_trgm ON products USING gin (category gin_trgm_ops)",
+]
+# Names of those objects, ignored by `alembic check` / autogenerate
+PRODUCT_SEARCH_OBJECTS = {"search_vector", "ix_products_search_vector", "ix_products_name_trgm", "ix_products_category_trgm"}
+for statement in PRODUCT_SEARCH_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
 class Review(Base):
     __tablename__ = "reviews"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), index=True)
     rating = Column(Float, nullable=False)  # Rating between 0.0 and 5.0
     comment = Column(String, nullable=True)  # Optional review comment
     created_at = Column(DateTime, default=lambda: datetime.now(IST))  # Timestamp in IST
@@ -61,49 +120,106 @@ class Review(Base):
     user = relationship("User")
     product = relationship("Product", back_populates="reviews")
 
+    __table_args__ = (
+        # Keyset pagination of a product's reviews, one per sort order
+        Index("ix_reviews_product_id_created_at_id", "product_id", "created_at", "id"),
+        Index("ix_reviews_product_id_rating_id", "product_id", "rating", "id"),
+    )
+
 class Cart(Base):
     __tablename__ = "carts"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
     quantity = Column(Integer, nullable=False, default=1)
     # Relationships
     user = relationship("User", back_populates="cart_items")
     product = relationship("Product", back_populates="cart_items")
 
+    __table_args__ = (
+        # One line per product, the conflict target of the cart upserts
+        Index("ux_carts_user_id_product_id", "user_id", "product_id", unique=True),
+    )
+
+class StockReservation(Base):
+    """
+    Stock held for a cart line until `expires_at` (app/crud/stock.py).
+    Available stock is `stock_remaining` minus the unexpired holds; checkout turns holds into stock deductions.
+    """
+    __tablename__ = "stock_reservations"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)   # UTC
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # One hold per cart line
+        Index("ux_stock_reservations_user_id_product_id", "user_id", "product_id", unique=True),
+        # ✅ Sums the unexpired holds of a product from the index alone
+        Index(
+            "ix_stock_reservations_product_id_expires_at", "product_id", "expires_at",
+            postgresql_include=["quantity"],
+        ),
+    )
+
 class Wishlist(Base):
     __tablename__ = "wishlists"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
     # Relationships
     user = relationship("User", back_populates="wishlist_items")
     product = relationship("Product", back_populates="wishlist_items")
 
+class ProductBulkUpdate(Base):
+    """Audit record of a bulk catalog update (see `bulk_update_products`)."""
+    __tablename__ = "product_bulk_updates"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    operation = Column(String, nullable=False)
+    value = Column(String, nullable=True)
+    filters = Column(JSON, nullable=False)
+    updated_count = Column(Integer, nullable=False)
+    product_ids = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=utc_now, index=True)
+
 class Order(Base):
     __tablename__ = "orders"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     total_price = Column(Float, nullable=False)
     status = Column(String, default="Pending") 
-    payment_status = Column(String, nullable=True, default=None)  
+    payment_status = Column(String, nullable=True, default=None, index=True)  
     shipment_status = Column(String, nullable=True, default=None) 
     transaction_id = Column(String, nullable=True, unique=True)  
     tracking_id = Column(String, nullable=True, default=None) 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # ✅ Set once the order's items are counted into product_co_purchases (app/crud/co_purchase.py)
+    co_purchases_counted_at = Column(DateTime, nullable=True)
 
     # Relationships
     user = relationship("User")
     order_items = relationship("OrderItem", back_populates="order", cascade="all, delete")
 
+    __table_args__ = (
+        # Paid orders still waiting for the co-purchase job
+        Index(
+            "ix_orders_co_purchases_pending", "id",
+            postgresql_where=text("payment_status = 'Paid' AND co_purchases_counted_at IS NULL"),
+            sqlite_where=text("payment_status = 'Paid' AND co_purchases_counted_at IS NULL"),
+        ),
+    )
+
 
 class OrderItem(Base):
     __tablename__ = "order_items"  
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"))
-    product_id = Column(Integer, ForeignKey("products.id", ondelete="SET NULL"))
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="SET NULL"), index=True)
     quantity = Column(Integer, nullable=False)
     price = Column(Float) 
 
@@ -112,4 +228,33 @@ class OrderItem(Base):
     product = relationship("Product")
 
 
+class ProductEngagement(Base):
+    """Engagement counters and trending score of a product, flushed in batches by app/engagement.py."""
+    __tablename__ = "product_engagement"
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    view_count = Column(Integer, default=0, server_default="0", nullable=False)
+    cart_add_count = Column(Integer, default=0, server_default="0", nullable=False)
+    wishlist_add_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # ✅ log2 of the forward-decayed engagement, comparable across products without rescaling
+    trending_score = Column(Float, nullable=False, index=True)
+    updated_at = Column(DateTime, default=utc_now, onupdate=utc_now)
+
+
+class ProductCoPurchase(Base):
+    """How many paid orders contained both products, stored in both directions."""
+    __tablename__ = "product_co_purchases"
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    related_product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    order_count = Column(Integer, nullable=False)
+
+
+class RelatedProduct(Base):
+    """The top co-purchased products of each product, ranked 1..RELATED_PRODUCTS_TOP_K."""
+    __tablename__ = "related_products"
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    related_product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    order_count = Column(Integer, nullable=False)
+
+
 
@@ -0,0 +1,70 @@
+"""
+Notifications about committed product changes.
+
+Derived data that lives outside the products table (search index, caches)
+registers a listener here instead of every write path calling it directly.
+
+    @on_products_changed
+    def forget(product_ids): ...
+
+Listeners run after the transaction commits, with the set of product ids that
+were inserted, updated or deleted through the ORM. Core statements that bypass
+the unit of work (bulk INSERT/UPDATE) report their ids with
+`record_product_changes(session, ids)` before committing.
+"""
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import Product
+
+logger = logging.getLogger(__name__)
+
+_listeners = []
+
+
+def on_products_changed(listener):
+    """Register `listener(product_ids)` to run after commits that changed products."""
+    _listeners.append(listener)
+    return listener
+
+
+def record_product_changes(session: Session, product_ids):
+    """Mark products as changed in the session's transaction."""
+    session.info.setdefault("changed_product_ids", set()).update(product_ids)
+
+
+def notify_products_changed(product_ids):
+    """Run the listeners now, for changes made outside of an ORM session."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return
+    for listener in _listeners:
+        try:
+            listener(product_ids)
+        except Exception:
+            # A failing listener must not fail the request that already committed
+            logger.exception(f"Product change listener {listener!r} failed")
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_products(session, flush_context):
+    changed = [
+        obj.id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, Product) and obj.id is not None
+    ]
+    if changed:
+        record_product_changes(session, changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changed_products(session):
+    notify_products_changed(session.info.pop("changed_product_ids", ()))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changed_products(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop("changed_product_ids", None)
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.schemas import CartCreate, CartResponse, WishlistCreate, WishlistResponse, CartListResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db
+from app.schemas import CartBulkRequest, CartCreate, CartQuantityUpdate, CartResponse, WishlistCreate, WishlistResponse, CartListResponse
 from app.crud.cart import (
     add_to_cart,
     get_cart_items,
@@ -9,10 +10,22 @@ from app.crud.cart import (
     add_to_wishlist,
     get_wishlist_items,
     remove_from_wishlist,
+    get_cart_items_async,
+    merge_cart,
+    set_cart_quantity,
 )
+from app.instrumentation import query_budget
+from app.serializers import FastJSONResponse
 from app.utils import decode_access_token
 router = APIRouter()
-@router.post("/cart", response_model=CartResponse)
+# Cart and wishlist views load their lines and products in one query at most, whatever their size
+VIEW_QUERY_BUDGET = 1
+# Quantity updates and bulk merges are set-based as well (plus the lock of the user's cart)
+UPDATE_QUERY_BUDGET = 7
+# Async variants of the hot routes, mounted in front of `router` when DB_ASYNC_MODE is enabled
+# and the cart store is "orm" (the "kv" store blocks, its routes stay in the threadpool)
+async_router = APIRouter()
+@router.post("/cart", response_model=CartResponse, response_class=FastJSONResponse)
 def add_item_to_cart(
     cart_data: CartCreate,
     db: Session = Depends(get_db),
@@ -24,8 +37,9 @@ def add_item_to_cart(
     token_data = decode_access_token(authorization.split("Bearer ")[-1])
     if token_data["role"] != "customer":
         raise HTTPException(status_code=403, detail="Only customers can add to cart")
-    return add_to_cart(db, token_data["id"], cart_data)
-@router.get("/cart", response_model=CartListResponse)  # Correct response model
+    return FastJSONResponse(add_to_cart(db, token_data["id"], cart_data))
+@router.get("/cart", response_model=CartListResponse, response_class=FastJSONResponse)  # Correct response model
+@query_budget(VIEW_QUERY_BUDGET)
 def view_cart(
     db: Session = Depends(get_db),
     authorization: str = Header(None),
@@ -42,7 +56,63 @@ def view_cart(
     if token_data["role"] != "customer":
         raise HTTPException(status_code=403, detail="Only customers can view cart")
 
-    return get_cart_items(db, token_data["id"])  # Correct return structure
+    return FastJSONResponse(get_cart_items(db, token_data["id"]))  # Correct return structure
+
+
+@async_router.get("/cart", response_model=CartListResponse, response_class=FastJSONResponse)
+@query_budget(VIEW_QUERY_BUDGET)
+async def view_cart_async(
+    db: AsyncSession = Depends(get_async_db),
+    authorization: str = Header(None),
+):
+    """
+    View all cart items for the logged-in customer (asyncio engine).
+    """
+    if not authorization:
+        raise HTTPException(status_code=400, detail="Authorization header missing")
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=400, detail="Authorization header must start with 'Bearer '")
+
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    if token_data["role"] != "customer":
+        raise HTTPException(status_code=403, detail="Only customers can view cart")
+
+    return FastJSONResponse(await get_cart_items_async(db, token_data["id"]))
+
+@router.post("/cart/bulk", response_model=CartListResponse, response_class=FastJSONResponse)
+@query_budget(UPDATE_QUERY_BUDGET)
+def bulk_add_to_cart(
+    cart_data: CartBulkRequest,
+    db: Session = Depends(get_db),
+    authorization: str = Header(None),
+):
+    """
+    Merge several lines into the cart of the logged-in customer at once, e.g. a guest cart after login.
+    - Quantities of products already in the cart are added up.
+    - All or nothing: when a line exceeds the available stock, the cart stays as it was.
+    """
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    if token_data["role"] != "customer":
+        raise HTTPException(status_code=403, detail="Only customers can add to cart")
+    return FastJSONResponse(merge_cart(db, token_data["id"], cart_data.items))
+
+
+@router.patch("/cart/{product_id}", response_model=CartResponse, response_class=FastJSONResponse)
+@query_budget(UPDATE_QUERY_BUDGET)
+def update_cart_item(
+    product_id: int,
+    cart_data: CartQuantityUpdate,
+    db: Session = Depends(get_db),
+    authorization: str = Header(None),
+):
+    """
+    Set the quantity of a product in the cart of the logged-in customer, adding it when missing.
+    """
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    if token_data["role"] != "customer":
+        raise HTTPException(status_code=403, detail="Only customers can update the cart")
+    return FastJSONResponse(set_cart_quantity(db, token_data["id"], product_id, cart_data.quantity))
+
 
 @router.delete("/cart/{product_id}")
 def delete_cart_item(
@@ -70,7 +140,8 @@ def add_item_to_wishlist(
     if token_data["role"] != "customer":
         raise HTTPException(status_code=403, detail="Only customers can add to wishlist")
     return add_to_wishlist(db, token_data["id"], wishlist_data)
-@router.get("/wishlist", response_model=list[WishlistResponse])
+@router.get("/wishlist", response_model=list[WishlistResponse], response_class=FastJSONResponse)
+@query_budget(VIEW_QUERY_BUDGET)
 def view_wishlist(db: Session = Depends(get_db), authorization: str = Header(None)):
     """
     View all wishlist items for the logged-in customer.
@@ -78,7 +149,7 @@ def view_wishlist(db: Session = Depends(get_db), authorization: str = Header(Non
     token_data = decode_access_token(authorization.split("Bearer ")[-1])
     if token_data["role"] != "customer":
         raise HTTPException(status_code=403, detail="Only customers can view wishlist")
-    return get_wishlist_items(db, token_data["id"])
+    return FastJSONResponse(get_wishlist_items(db, token_data["id"]))
 
 @router.delete("/wishlist/{product_id}")
 def delete_wishlist_item(
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, HTTPException, Header
+from app import database
+from app.database import get_pool_status, pool_metrics, async_pool_metrics
+from app.crud.cart_store import cart_store
+from app.crud.product import product_cache
+from app.search import search_index
+from app.autocomplete import autocomplete_index
+from app.engagement import engagement_counters
+from app.utils import decode_access_token
+
+router = APIRouter()
+
+
+def require_admin(authorization: str):
+    """Only admins may look at the internal diagnostics."""
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header missing")
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    if token_data.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Permission denied. Admins only.")
+    return token_data
+
+
+@router.get("/db-pool")
+def db_pool_status(authorization: str = Header(None)):
+    """
+    Connection pool status of this worker (Admin only).
+    - `checked_out` / `overflow` show the current occupancy.
+    - `wait_time` is how long requests waited for a free connection.
+    - `checkout_latency` is how long connections were held before being returned.
+    - `replicas` lists every read replica with its health and pool status.
+    - `async` reports the asyncio engine's pool when DB_ASYNC_MODE is enabled.
+    """
+    require_admin(authorization)
+    status = get_pool_status()
+    if database.replicas.engines:
+        status["replicas"] = database.replicas.status()
+    if database.async_engine is not None:
+        status["async"] = get_pool_status(database.async_engine.sync_engine, async_pool_metrics)
+    return status
+
+
+@router.post("/db-pool/reset")
+def reset_db_pool_metrics(authorization: str = Header(None)):
+    """Reset the collected pool counters and histograms (Admin only)."""
+    require_admin(authorization)
+    pool_metrics.reset()
+    async_pool_metrics.reset()
+    for metrics in database.replicas.metrics:
+        metrics.reset()
+    return {"message": "Pool metrics reset."}
+
+
+@router.get("/search-index")
+def search_index_status(authorization: str = Header(None)):
+    """Size and age of this worker's in-process product search index (Admin only)."""
+    require_admin(authorization)
+    return search_index.status()
+
+
+@router.get("/autocomplete-index")
+def autocomplete_index_status(authorization: str = Header(None)):
+    """Size, pending changes and age of this worker's product autocomplete index (Admin only)."""
+    require_admin(authorization)
+    return autocomplete_index.status()
+
+
+@router.get("/engagement")
+def engagement_status(authorization: str = Header(None)):
+    """Pending and flushed product engagement counts of this worker (Admin only)."""
+    require_admin(authorization)
+    return engagement_counters.status()
+
+
+@router.post("/engagement/flush")
+def flush_engagement(authorization: str = Header(None)):
+    """Write this worker's pending engagement counts now (Admin only)."""
+    require_admin(authorization)
+    return {"flushed_products": engagement_counters.flush()}
+
+
+@router.get("/cart-store")
+def cart_store_status(authorization: str = Header(None)):
+    """Cart store in use and, for CART_STORE=kv, the changes not written to the database yet (Admin only)."""
+    require_admin(authorization)
+    return cart_store.status()
+
+
+@router.post("/cart-store/flush")
+def flush_cart_store(authorization: str = Header(None)):
+    """Write the logged cart changes to the database now (Admin only)."""
+    require_admin(authorization)
+    return {"flushed_entries": cart_store.flush()}
+
+
+@router.get("/cache")
+def cache_status(authorization: str = Header(None)):
+    """Size and hit, miss and eviction counters of this worker's product cache (Admin only)."""
+    require_admin(authorization)
+    return {"products": product_cache.stats()}
+
+
+@router.post("/cache/clear")
+def clear_cache(authorization: str = Header(None)):
+    """Drop every cached product and reset the counters (Admin only)."""
+    require_admin(authorization)
+    product_cache.clear()
+    return {"message": "Product cache cleared."}
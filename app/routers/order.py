@@ -2,79 +2,28 @@
 
 from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_async_db
 from app.schemas import OrderCreate, OrderResponse
-from app.crud.order import create_order, get_orders_by_user, get_all_orders
-from app.crud.cart import get_cart_items
+from app.crud.order import create_order, get_orders_by_user, get_all_orders, get_orders_by_user_async, place_order, place_order_async
+from app.instrumentation import query_budget
+from app.crud.product import get_product_by_id
 from app.utils import decode_access_token
 from app.models import Order, OrderItem, Product, User
 from typing import List
 from app.crud.user import get_user_by_id
 from app.utils import decode_access_token
 router = APIRouter()
+# Placing an order costs the same number of queries whatever the size of the cart (plus the lock of the user's cart)
+PLACE_ORDER_QUERY_BUDGET = 10
+# Async variants of the hot routes, mounted in front of `router` when DB_ASYNC_MODE is enabled
+async_router = APIRouter()
+# Async checkout reads the cart store, mounted only with the "orm" store (see app/main.py)
+async_cart_router = APIRouter()
 
-@router.post("/orders/place", response_model=OrderResponse)
-def place_order(
-    db: Session = Depends(get_db),
-    authorization: str = Header(None),
-):
-    """
-    Place an order for all items in the cart.
-    """
-    # Decode JWT token and get user ID
-    token_data = decode_access_token(authorization.split("Bearer ")[-1])
-    user_id = token_data["id"]
-
-    # Fetch all items from the user's cart
-    cart_items = get_cart_items(db, user_id)
-    if not cart_items.cart_items:  # Check if the cart is empty
-        raise HTTPException(
-            status_code=400, 
-            detail="Cart is empty. Add items to the cart before placing an order."
-        )
 
-    # Calculate the total price of the order
-    total_price = 0
-    for cart_item in cart_items.cart_items:  # Now iterate directly over cart_items
-        total_price += cart_item.product.price_after_discount * cart_item.quantity
-
-    # Create a new order
-    order = Order(
-        user_id=user_id,
-        total_price=total_price,
-        payment_status="Pending",
-        shipment_status="Pending",
-        tracking_id=None,
-    )
-    db.add(order)
-    db.commit()
-    db.refresh(order)
-
-    # Add all cart items as order items
-    for cart_item in cart_items.cart_items:
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=cart_item.product.id,  # Access product directly from cart_item
-            quantity=cart_item.quantity,
-            price=cart_item.product.price_after_discount,  # Access the product price
-        )
-        db.add(order_item)
-
-        # Deduct stock from the product
-        product = db.query(Product).filter(Product.id == cart_item.product.id).first()
-        if product.stock_remaining < cart_item.quantity:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock for product {product.name}. Only {product.stock_remaining} left.",
-            )
-        product.stock_remaining -= cart_item.quantity
-
-        # Optionally, remove item from the cart
-        # db.delete(cart_item)
-
-    db.commit()
-
-    # Return the created order details
+def _order_response(order: Order):
+    """Order details with its items, as returned by the order endpoints."""
     return {
         "id": order.id,
         "user_id": order.user_id,
@@ -87,15 +36,56 @@ def place_order(
         "updated_at": order.updated_at,
         "order_items": [
             {
-                "id": order_item.id,
-                "product_id": order_item.product_id,
-                "quantity": order_item.quantity,
-                "price": order_item.price,
+                "id": item.id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price": item.price,
             }
-            for order_item in order.order_items
+            for item in order.order_items
         ],
     }
 
+
+@async_cart_router.post("/orders/place", response_model=OrderResponse)
+@query_budget(PLACE_ORDER_QUERY_BUDGET)
+async def place_order_async_route(
+    db: AsyncSession = Depends(get_async_db),
+    authorization: str = Header(None),
+):
+    """
+    Place an order for all items in the cart (asyncio engine).
+    """
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    order = await place_order_async(db, token_data["id"])
+    return _order_response(order)
+
+
+@async_router.get("/orders", response_model=list[OrderResponse])
+async def list_orders_async(
+    db: AsyncSession = Depends(get_async_db),
+    authorization: str = Header(None),
+):
+    """
+    List all orders for the logged-in user (asyncio engine).
+    """
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    orders = await get_orders_by_user_async(db, token_data["id"])
+    return [_order_response(order) for order in orders]
+
+@router.post("/orders/place", response_model=OrderResponse)
+@query_budget(PLACE_ORDER_QUERY_BUDGET)
+def place_order_route(
+    db: Session = Depends(get_db),
+    authorization: str = Header(None),
+):
+    """
+    Place an order for all items in the cart.
+    """
+    # Decode JWT token and get user ID
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    order = place_order(db, token_data["id"])
+    return _order_response(order)
+
 @router.get("/orders/{order_id}", response_model=OrderResponse)
 def get_order_details(
     order_id: int,
@@ -208,7 +198,7 @@ def delete_order(
 
     # Optionally, remove stock that was deducted when the order was placed
     for order_item in order.order_items:
-        product = db.query(Product).filter(Product.id == order_item.product_id).first()
+        product = get_product_by_id(db, order_item.product_id, bypass_cache=True)
         if product:
             product.stock_remaining += order_item.quantity
 
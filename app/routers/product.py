@@ -1,39 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_db, get_read_db, get_async_db, ReadSessionLocal
 from typing import List
-from app.schemas import ProductCreate, ProductResponse, ProductWithReviewsResponse
+from app.schemas import CategoryCreate, ProductBatchRequest, ProductBulkUpdateRequest, ProductCreate, ProductResponse
 from app.crud.product import (
-  get_all_products_with_reviews , add_product, get_products, get_product_by_id, update_product, soft_delete_product, search_products_by_name, get_products_by_category, get_products_by_rating, import_products
+  iter_products_with_reviews, add_product, bulk_update_products, get_products_page, get_product_by_id, update_product, soft_delete_product, search_products_by_name, get_products_by_category, get_products_by_rating, get_products_by_ids, import_products, iter_product_export,
+  get_products_page_async, PRODUCT_SORTS, read_import_rows, IMPORT_CONTENT_TYPES
 )
+from app.crud.category import get_category_tree, set_category_parent
+from app.crud.co_purchase import get_related_products, RELATED_PRODUCTS_TOP_K
+from app.autocomplete import autocomplete_index
+from app.engagement import engagement_counters, get_trending_products, current_trending_score
+from app.instrumentation import query_budget
+from app.serializers import FastJSONResponse, active_only, ist_isoformat, serialize_products
 from app.utils import decode_access_token
 import pytz
-from app.models import Review
+from app.models import Product, Review
+from datetime import datetime, timezone
+import csv
+import io
+import orjson
+import tempfile
 IST = pytz.timezone("Asia/Kolkata")
+# Uploads larger than this are spooled to a temporary file during import
+IMPORT_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
 router = APIRouter()
-
-
-@router.get("/admin-product-analysis", response_model=list[ProductWithReviewsResponse])
+# Async variants of the hot routes, mounted in front of `router` when DB_ASYNC_MODE is enabled
+async_router = APIRouter()
+# Listing, batch, trending and related pages load their products in one query, whatever their size
+LISTING_QUERY_BUDGET = 1
+# Autocomplete is served from memory: one query for pending changes, one more for the first build
+AUTOCOMPLETE_QUERY_BUDGET = 2
+# Related products plus the product lookup telling an unknown product from one without related ones
+RELATED_QUERY_BUDGET = 2
+
+
+@router.get(
+    "/admin-product-analysis",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "One product per line"}},
+)
 def get_products_for_analysis(
-    db: Session = Depends(get_db),
+    after_id: int = Query(0, ge=0, description="Start after this product id (the last id of the previous page)"),
+    limit: int = Query(None, ge=1, description="Maximum number of products, all remaining when omitted"),
+    max_reviews: int = Query(None, ge=0, description="Newest reviews to include per product, all when omitted"),
+    db: Session = Depends(get_read_db),
     authorization: str = Header(None),
 ):
-    print("Received request for /admin-product-analysis")  # Debugging log
+    """
+    Stream products with review statistics for analysis as NDJSON (Admins only).
+    - Each line holds a product with `review_count`, `product_rating` (average) and `rating_distribution`.
+    - `reviews` lists the newest reviews first, `reviews_truncated` tells when `max_reviews` cut them.
+    """
     token_data = decode_access_token(authorization.split("Bearer ")[-1])
-    print("Decoded Token Data:", token_data)  # Debugging log
-    
+
     if token_data["role"] != "admin":
         print("Permission denied. Admins only.")  # Debugging log
         raise HTTPException(status_code=403, detail="Permission denied. Admins only.")
-    
-    # Fetch products along with reviews and ratings for analysis
-    products = get_all_products_with_reviews(db)
-    print("Fetched Products for Analysis:", products)  # Debugging log
-    
-    if not products:
+
+    if db.scalar(select(Product.id).where(Product.id > after_id).limit(1)) is None:
         raise HTTPException(status_code=404, detail="No products found for analysis.")
-    
-    return products
+
+    def stream():
+        # ✅ The request session is closed once the response starts, the stream uses its own
+        stream_db = ReadSessionLocal()
+        try:
+            for product in iter_products_with_reviews(stream_db, after_id, limit, max_reviews):
+                yield orjson.dumps(product) + b"\n"
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 
@@ -55,17 +96,18 @@ def create_product(
     return add_product(db, product, vendor_id)
 
 
-@router.get("/products/search", response_model=list[dict])
+@router.get("/products/search", response_model=list[dict], response_class=FastJSONResponse)
 def search_products_by_name_route(
-    name: str = Query(..., min_length=1, description="Enter keyword to search in product names"),  # ✅ Enforce minimum length
+    name: str = Query(..., min_length=1, description="Enter keywords to search in product names, categories and descriptions"),  # ✅ Enforce minimum length
     skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of records to fetch"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     authorization: str = Header(None),
 ):
     """
-    Search products by name where any part of the name matches the input keyword.
-    - **Customers** see only active products.
+    Search products by keyword, most relevant first.
+    - Matches words in name, category and description, parts of the name and misspellings.
+    - **Guests and customers** see only active products.
     - **Admins/Vendors** see all products.
     - Supports **pagination** (`skip` & `limit`).
     """
@@ -99,57 +141,23 @@ def search_products_by_name_route(
         print(f"❌ [ERROR] No products found for search query: {name}")
         raise HTTPException(status_code=404, detail="No products found matching the search criteria.")
 
-    # ✅ Convert timestamps to IST
-    product_list = []
-    for product in products:
-        try:
-            created_at_ist = product.created_at.astimezone(IST).isoformat() if product.created_at else None
-            updated_at_ist = product.updated_at.astimezone(IST).isoformat() if product.updated_at else None
-
-            product_data = {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price_before_discount": product.price_before_discount,
-                "price_after_discount": product.price_after_discount,
-                "discount_percentage": product.discount_percentage,
-                "category": product.category,
-                "image_url": product.image_url,
-                "stock_remaining": product.stock_remaining,
-                "is_active": product.is_active,
-                "product_rating": product.product_rating,
-                "created_at": created_at_ist,
-                "updated_at": updated_at_ist,
-            }
-
-            # ✅ Include extra fields for admin and vendors
-            if user_role in ["admin", "vendor"]:
-                product_data.update({
-                    "expenditure_cost_inr": product.expenditure_cost_inr,
-                    "total_stock": product.total_stock,
-                    "profit_per_item_inr": product.profit_per_item_inr,
-                    "vendor_id": product.vendor_id,
-                })
-
-            product_list.append(product_data)
-
-        except Exception as e:
-            print(f"❌ [ERROR] Failed to process product {product.id}: {e}")
+    # ✅ Serialize for the caller's role, timestamps in IST
+    product_list = serialize_products(products, user_role)
 
     print(f"✅ [SUCCESS] Returning {len(product_list)} products.")
-    return product_list
+    return FastJSONResponse(product_list)
 
-@router.get("/products/category", response_model=list[dict])
+@router.get("/products/category", response_model=list[dict], response_class=FastJSONResponse)
 def filter_products_by_category(
     category: str = Query(..., min_length=2, description="Category name to filter products"),  # ✅ Ensure valid string
     skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of records to fetch"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     authorization: str = Header(None),
 ):
     """
     Fetch products by category.
-    - Customers see **only active products**.
+    - Guests and customers see **only active products**.
     - Admins & Vendors see **all products**.
     - Supports **pagination** (`skip` & `limit`).
     """
@@ -182,50 +190,25 @@ def filter_products_by_category(
         print(f"❌ [ERROR] No products found in category: {category}")
         raise HTTPException(status_code=404, detail=f"No products found in category: {category}")
 
-    # ✅ Convert timestamps to IST
-    product_list = [
-        {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description,
-            "price_before_discount": product.price_before_discount,
-            "price_after_discount": product.price_after_discount,
-            "discount_percentage": product.discount_percentage,
-            "category": product.category,
-            "image_url": product.image_url,
-            "stock_remaining": product.stock_remaining,
-            "is_active": product.is_active,
-            "product_rating": product.product_rating,
-            "created_at": product.created_at.astimezone(IST).isoformat() if product.created_at else None,
-            "updated_at": product.updated_at.astimezone(IST).isoformat() if product.updated_at else None,
-            **(
-                {  # ✅ Include extra fields for admin and vendors
-                    "expenditure_cost_inr": product.expenditure_cost_inr,
-                    "total_stock": product.total_stock,
-                    "profit_per_item_inr": product.profit_per_item_inr,
-                    "vendor_id": product.vendor_id,
-                } if user_role in ["admin", "vendor"] else {}
-            )
-        }
-        for product in products
-    ]
+    # ✅ Serialize for the caller's role, timestamps in IST
+    product_list = serialize_products(products, user_role)
 
     print(f"✅ [SUCCESS] Returning {len(product_list)} products.")
-    return product_list
+    return FastJSONResponse(product_list)
 
 
-@router.get("/products/rating", response_model=list[dict])
+@router.get("/products/rating", response_model=list[dict], response_class=FastJSONResponse)
 def filter_products_by_rating(
     min_rating: float = Query(0, ge=0, le=5, description="Minimum product rating (0-5)"),
     max_rating: float = Query(5, ge=0, le=5, description="Maximum product rating (0-5)"),
     skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
     limit: int = Query(10, ge=1, le=100, description="Maximum number of records to fetch"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     authorization: str = Header(None),
 ):
     """
     Fetch products by rating range.
-    - Customers see **only active products**.
+    - Guests and customers see **only active products**.
     - Admins & Vendors see **all products**.
     - Supports **pagination** (`skip` & `limit`).
     - Ensures **valid rating input (0-5 range)**.
@@ -254,55 +237,86 @@ def filter_products_by_rating(
         print(f"❌ [ERROR] No products found in rating range {min_rating} - {max_rating}")
         raise HTTPException(status_code=404, detail=f"No products found with rating between {min_rating} and {max_rating}")
 
-    # ✅ Convert timestamps to IST
-    product_list = [
-        {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description,
-            "price_before_discount": product.price_before_discount,
-            "price_after_discount": product.price_after_discount,
-            "discount_percentage": product.discount_percentage,
-            "category": product.category,
-            "image_url": product.image_url,
-            "stock_remaining": product.stock_remaining,
-            "is_active": product.is_active,
-            "product_rating": product.product_rating,
-            "created_at": product.created_at.astimezone(IST).isoformat() if product.created_at else None,
-            "updated_at": product.updated_at.astimezone(IST).isoformat() if product.updated_at else None,
-            **(
-                {  # ✅ Include extra fields for admin and vendors
-                    "expenditure_cost_inr": product.expenditure_cost_inr,
-                    "total_stock": product.total_stock,
-                    "profit_per_item_inr": product.profit_per_item_inr,
-                    "vendor_id": product.vendor_id,
-                } if user_role in ["admin", "vendor"] else {}
-            )
-        }
-        for product in products
-    ]
+    # ✅ Serialize for the caller's role, timestamps in IST
+    product_list = serialize_products(products, user_role)
 
     print(f"✅ [SUCCESS] Returning {len(product_list)} products.")
-    return product_list
+    return FastJSONResponse(product_list)
 
 
 
 
 
 
-@router.get("/products", response_model=list[dict])
+SORT_PATTERN = "^(" + "|".join(PRODUCT_SORTS) + ")$"
+
+
+@router.get("/products", response_model=dict, response_class=FastJSONResponse)
+@query_budget(LISTING_QUERY_BUDGET)
 def list_all_products(
-    db: Session = Depends(get_db),
+    sort: str = Query("newest", pattern=SORT_PATTERN, description="newest, price or rating"),
+    cursor: str = Query(None, description="`next_cursor` or `prev_cursor` of a previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
     authorization: str = Header(None),
 ):
     """
-    List all products with role-based filtering.
-    - Customers see only active products.
+    List products page by page with role-based filtering.
+    - Guests and customers see only active products.
     - Admins & vendors see all products.
+    - Pass `next_cursor` / `prev_cursor` back as `cursor` to move between pages.
     """
     print("🔄 [API CALL] Fetching products...")
 
-    # ✅ Handle authentication (allow guest access)
+    user_role = _listing_role(authorization)
+    print(f"✅ [USER ROLE] {user_role} is accessing products.")
+
+    # ✅ Fetch one page of products based on user role
+    products, next_cursor, prev_cursor = get_products_page(db, user_role, sort, cursor, limit)
+
+    if not products and not cursor:
+        raise HTTPException(status_code=404, detail="No products found.")
+
+    return _product_page(products, user_role, sort, next_cursor, prev_cursor)
+
+
+@async_router.get("/products", response_model=dict, response_class=FastJSONResponse)
+@query_budget(LISTING_QUERY_BUDGET)
+async def list_all_products_async(
+    sort: str = Query("newest", pattern=SORT_PATTERN, description="newest, price or rating"),
+    cursor: str = Query(None, description="`next_cursor` or `prev_cursor` of a previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    authorization: str = Header(None),
+):
+    """
+    List products page by page with role-based filtering (asyncio engine).
+    - Guests and customers see only active products.
+    - Admins & vendors see all products.
+    """
+    user_role = _listing_role(authorization)
+
+    products, next_cursor, prev_cursor = await get_products_page_async(db, user_role, sort, cursor, limit)
+
+    if not products and not cursor:
+        raise HTTPException(status_code=404, detail="No products found.")
+
+    return _product_page(products, user_role, sort, next_cursor, prev_cursor)
+
+
+def _product_page(products, user_role: str, sort: str, next_cursor: str, prev_cursor: str):
+    """Envelope of one listing page."""
+    product_list = serialize_products(products, user_role)
+    return FastJSONResponse({
+        "products": product_list,
+        "sort": sort,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    })
+
+
+def _listing_role(authorization: str):
+    """Role of the caller for the product listing, guests are allowed."""
     user_role = "guest"
     if authorization:
         try:
@@ -311,53 +325,238 @@ def list_all_products(
         except Exception as e:
             print("❌ [ERROR] Token decoding failed:", e)
             raise HTTPException(status_code=401, detail="Invalid authentication token.")
+    return user_role
 
-    print(f"✅ [USER ROLE] {user_role} is accessing products.")
 
-    # ✅ Fetch products based on user role
-    products = get_products(db, user_role)
+@router.post("/products/bulk-update", response_model=dict)
+def bulk_update_products_route(
+    request: ProductBulkUpdateRequest,
+    db: Session = Depends(get_db),
+    authorization: str = Header(None),
+):
+    """
+    Update many products at once (Admins & Vendors).
+    - `filter`: any of `ids`, `category` (with subcategories) and `vendor_id`, combined with AND.
+    - `operation`: `set_discount` (value: percent), `adjust_price` (value: +/- percent),
+      `activate`, `deactivate` or `set_category` (value: category name).
+    - Prices, discounts and profits are recomputed in the database in one statement.
+    - `dry_run: true` returns how many products would change without changing them.
+    - Vendors can only update their own products.
+    """
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    if token_data["role"] not in ["admin", "vendor"]:
+        raise HTTPException(status_code=403, detail="Only admins and vendors can update products.")
 
-    if not products:
-        raise HTTPException(status_code=404, detail="No products found.")
+    filters = request.filter
+    if token_data["role"] == "vendor":
+        if filters.vendor_id not in (None, token_data["id"]):
+            raise HTTPException(status_code=403, detail="Vendors can only update their own products.")
+        filters = filters.model_copy(update={"vendor_id": token_data["id"]})
 
-    # ✅ Convert timestamps to IST and prepare response
-    product_list = []
-    for product in products:
-        created_at_ist = product.created_at.astimezone(IST).isoformat() if product.created_at else None
-        updated_at_ist = product.updated_at.astimezone(IST).isoformat() if product.updated_at else None
-
-        # ✅ Base product data (for all users)
-        product_data = {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description,
-            "price_before_discount": product.price_before_discount,
-            "price_after_discount": product.price_after_discount,
-            "discount_percentage": product.discount_percentage,
-            "category": product.category,
-            "image_url": product.image_url,
-            "stock_remaining": product.stock_remaining,
-            "is_active": product.is_active,
-            "product_rating": product.product_rating,
-            "created_at": created_at_ist,
-            "updated_at": updated_at_ist,
-        }
-
-        # ✅ Include extra fields for admin and vendors
-        if user_role in ["admin", "vendor"]:
-            product_data.update({
-                "expenditure_cost_inr": product.expenditure_cost_inr,
-                "total_stock": product.total_stock,
-                "profit_per_item_inr": product.profit_per_item_inr,
-                "vendor_id": product.vendor_id,
-            })
-
-        product_list.append(product_data)
+    return bulk_update_products(db, token_data["id"], filters, request.operation, request.value, request.dry_run)
+
+
+@router.get("/categories", response_model=list[dict], response_class=FastJSONResponse)
+def list_categories(
+    include_empty: bool = Query(False, description="Also list categories without active products"),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Category tree for the navigation menu.
+    - Each category has its own `active_product_count` and `total_active_product_count` including subcategories.
+    - Served from the precomputed counts, products are not queried.
+    """
+    return FastJSONResponse(get_category_tree(db, include_empty))
+
+
+@router.post("/categories", response_model=dict)
+def create_category(
+    category: CategoryCreate,
+    db: Session = Depends(get_db),
+    authorization: str = Header(None),
+):
+    """
+    Create a category or move it below another one (Admins only).
+    - Missing parent categories are created as well.
+    """
+    token_data = decode_access_token(authorization.split("Bearer ")[-1])
+    if token_data["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Permission denied. Admins only.")
+    try:
+        created = set_category_parent(db, category.name, category.parent)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "id": created.id,
+        "name": created.name,
+        "slug": created.slug,
+        "parent_id": created.parent_id,
+        "active_product_count": created.active_product_count,
+    }
+
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+@router.get(
+    "/products/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type in EXPORT_FORMATS.values()}}},
+)
+def export_products(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    updated_since: datetime = Query(None, description="Only products changed at or after this time (ISO 8601)"),
+    authorization: str = Header(None),
+):
+    """
+    Stream the whole catalog as NDJSON or CSV, in id order, for feeds and search indexers.
+    - Fields are projected for the caller's role, guests and customers get only active products.
+    - For incremental feeds pass the `X-Export-Started-At` header of the previous export as `updated_since`;
+      times without an offset are taken as UTC.
+    """
+    user_role = _listing_role(authorization)
+    if updated_since is not None and updated_since.tzinfo is not None:
+        # Timestamps are stored as naive UTC on every backend
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+    started_at = datetime.now(timezone.utc)
+
+    def stream():
+        # ✅ Reads go to a replica when configured, in a session of their own
+        export_db = ReadSessionLocal()
+        try:
+            chunks = iter_product_export(export_db, user_role, updated_since)
+            if format == "ndjson":
+                for products in chunks:
+                    yield b"".join(orjson.dumps(product) + b"\n" for product in products)
+                return
+            buffer = io.StringIO()
+            writer = None
+            for products in chunks:
+                if writer is None:
+                    writer = csv.DictWriter(buffer, fieldnames=list(products[0]))
+                    writer.writeheader()
+                writer.writerows(products)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        finally:
+            export_db.close()
+
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f"attachment; filename=products.{format}",
+            "X-Export-Started-At": started_at.isoformat(),
+        },
+    )
+
+
+@router.get("/products/autocomplete", response_model=list[dict], response_class=FastJSONResponse)
+@query_budget(AUTOCOMPLETE_QUERY_BUDGET)
+def autocomplete_products(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user typed so far"),
+    limit: int = Query(10, ge=1, le=20),
+    db: Session = Depends(get_read_db),
+    authorization: str = Header(None),
+):
+    """
+    Product name suggestions while typing, best rated and most reviewed first.
+    - Every word of `q` must appear in the name, the last one may be incomplete.
+    - Guests and customers get only active products.
+    - Served from an in-memory index, no table scan per keystroke.
+    """
+    user_role = _listing_role(authorization)
+    suggestions = autocomplete_index.complete(db, q, active_only=active_only(user_role), limit=limit)
+    return FastJSONResponse([{"id": product_id, "name": name} for product_id, name in suggestions])
 
-    print(f"✅ [SUCCESS] Returning {len(product_list)} products.")
-    return product_list
 
+@router.get("/products/trending", response_model=list[dict], response_class=FastJSONResponse)
+@query_budget(LISTING_QUERY_BUDGET)
+def trending_products(
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+    authorization: str = Header(None),
+):
+    """
+    Products with the most recent views, cart adds and wishlist adds, older engagement counting less.
+    - Read in ranking order from the product_engagement table, which the workers' counters write every few seconds.
+    - `trending_score` is the decayed engagement: a view counts 1, a wishlist add 3, a cart add 5,
+      halved every TRENDING_HALF_LIFE_HOURS.
+    - Guests and customers get only active products.
+    """
+    user_role = _listing_role(authorization)
+    rows = get_trending_products(db, limit=limit, active_only=active_only(user_role))
+    products = serialize_products([product for product, _ in rows], user_role)
+    for data, (_, engagement) in zip(products, rows):
+        data["trending_score"] = current_trending_score(engagement.trending_score)
+        data["view_count"] = engagement.view_count
+        data["cart_add_count"] = engagement.cart_add_count
+        data["wishlist_add_count"] = engagement.wishlist_add_count
+    return FastJSONResponse(products)
+
+
+# Upper bound on the ids of one batch request
+PRODUCT_BATCH_MAX_IDS = 500
+
+
+@router.get("/products/batch", response_model=dict, response_class=FastJSONResponse)
+@query_budget(LISTING_QUERY_BUDGET)
+def get_products_batch(
+    ids: str = Query(..., description="Comma-separated product ids, e.g. `3,1,7`"),
+    db: Session = Depends(get_read_db),
+    authorization: str = Header(None),
+):
+    """
+    Fetch several products at once (cart, wishlist and order pages).
+    - See `POST /products/batch` for the response; use the POST variant for long id lists.
+    """
+    try:
+        product_ids = [int(product_id) for product_id in ids.split(",") if product_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers.")
+    return _product_batch(db, product_ids, _listing_role(authorization))
+
+
+@router.post("/products/batch", response_model=dict, response_class=FastJSONResponse)
+@query_budget(LISTING_QUERY_BUDGET)
+def post_products_batch(
+    batch: ProductBatchRequest,
+    db: Session = Depends(get_read_db),
+    authorization: str = Header(None),
+):
+    """
+    Fetch several products at once, ids in the request body.
+    - `products` follows the order of `ids`, with `null` for ids that are missing or hidden.
+    - `missing` lists ids that do not exist, `inactive` ids of deactivated products.
+    - Guests and customers get `null` for inactive products.
+    - Fields are projected for the caller's role, like the listing.
+    """
+    return _product_batch(db, batch.ids, _listing_role(authorization))
+
+
+def _product_batch(db: Session, product_ids: list, user_role: str):
+    if not product_ids:
+        raise HTTPException(status_code=400, detail="No product ids given.")
+    if len(product_ids) > PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {PRODUCT_BATCH_MAX_IDS} ids per request.")
 
+    found = get_products_by_ids(db, product_ids)
+    missing = [product_id for product_id in product_ids if product_id not in found]
+    inactive = [product_id for product_id in product_ids if product_id in found and not found[product_id].is_active]
+
+    # ✅ Guests and customers see only active products, like in the listing
+    hide_inactive = active_only(user_role)
+    visible = {
+        product_id: product for product_id, product in found.items()
+        if product.is_active or not hide_inactive
+    }
+    serialized = dict(zip(visible, serialize_products(visible.values(), user_role)))
+    return FastJSONResponse({
+        "products": [serialized.get(product_id) for product_id in product_ids],
+        "missing": missing,
+        "inactive": inactive,
+    })
 
 
 #===========================================================#
@@ -513,20 +712,15 @@ def list_all_products(
 @router.get("/products/{product_id}", response_model=ProductResponse)
 def retrieve_product(
     product_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     authorization: str = Header(None),
 ):
-    print(f"🔍 [API CALL] Fetching product ID: {product_id}")
-    
     # Fetch product from DB
     product = get_product_by_id(db, product_id)
-    print('=============== Product Data ===============')
-    print(f"Product Object: {product}")  # Print the whole product object
-    print(f"Product Attributes: {product.__dict__}")  # Print all the attributes of the product object
-    print('--------------------------------------------')
 
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
+    engagement_counters.record(product_id, "view")
     
     # Prepare the product data for response
     product_data = {
@@ -541,8 +735,9 @@ def retrieve_product(
         "stock_remaining": product.stock_remaining or 0,  # Default to 0 if NULL
         "is_active": product.is_active,
         "product_rating": product.product_rating or 0,  # Default to 0 if NULL
-        "created_at": product.created_at,
-        "updated_at": product.updated_at,
+        # ✅ Stored in UTC, rendered in IST like the listings
+        "created_at": ist_isoformat(product.created_at),
+        "updated_at": ist_isoformat(product.updated_at),
         "expenditure_cost_inr": product.expenditure_cost_inr or 0,  # Handle NULL
         "total_stock": product.total_stock or 0,  # Handle NULL
         "vendor_id": product.vendor_id or 0,  # Handle NULL
@@ -555,6 +750,31 @@ def retrieve_product(
     return product_data
 
 
+@router.get("/products/{product_id}/related", response_model=dict, response_class=FastJSONResponse)
+@query_budget(RELATED_QUERY_BUDGET)
+def related_products(
+    product_id: int,
+    limit: int = Query(10, ge=1, le=RELATED_PRODUCTS_TOP_K),
+    db: Session = Depends(get_read_db),
+    authorization: str = Header(None),
+):
+    """
+    Products frequently bought together with this one, most often first.
+    - Read from the related_products table, which `python -m app.cli build-related` fills from paid orders.
+    - `bought_together` is the number of paid orders containing both products.
+    - Guests and customers get only active products.
+    """
+    user_role = _listing_role(authorization)
+    rows = get_related_products(db, product_id, limit=limit, active_only=active_only(user_role))
+    if not rows and not get_product_by_id(db, product_id):
+        raise HTTPException(status_code=404, detail="Product not found.")
+
+    related = serialize_products([product for product, _ in rows], user_role)
+    for data, (_, order_count) in zip(related, rows):
+        data["bought_together"] = order_count
+    return FastJSONResponse({"product_id": product_id, "related": related})
+
+
 
 
 @router.put("/products/{product_id}", response_model=ProductResponse)
@@ -575,7 +795,7 @@ def edit_product(
     user_id = token_data["id"]
 
     # ✅ Fetch the product
-    product = get_product_by_id(db, product_id)
+    product = get_product_by_id(db, product_id, bypass_cache=True)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
 
@@ -600,7 +820,7 @@ def remove_product(
     user_id = token_data["id"]
 
     # ✅ Fetch the product from the database
-    product = get_product_by_id(db, product_id)
+    product = get_product_by_id(db, product_id, bypass_cache=True)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
 
@@ -613,111 +833,43 @@ def remove_product(
 
 
 #==================================================================#
-@router.post("/products/import")
-def import_products_route(
-    products: List[ProductCreate],  # ✅ Accepts a list of products
+@router.post(
+    "/products/import",
+    openapi_extra={"requestBody": {"required": True, "content": {
+        content_type: {"schema": {"type": "string", "format": "binary"}} for content_type in IMPORT_CONTENT_TYPES
+    }}},
+)
+async def import_products_route(
+    request: Request,
     db: Session = Depends(get_db),
     authorization: str = Header(None),
 ):
     """
-    Import a list of products (Admin only) with timestamps in IST.
-    - **Admins** can import multiple products.
-    - Ensures **each product has a valid vendor_id**.
-    - Stores timestamps in **IST timezone**.
+    Bulk import products (Admin only) with timestamps in UTC (rendered in IST).
+    - Send **NDJSON** (`application/x-ndjson`), **CSV** (`text/csv`) or a **JSON list** (`application/json`).
+    - The upload is streamed to a spooled temporary file, then validated and inserted in chunks.
+    - Ensures **each product has a valid vendor_id**, invalid rows are reported without aborting the import.
+    - Returns per-row errors and throughput stats.
     """
     # ✅ Decode JWT token & ensure the user is an admin
     token_data = decode_access_token(authorization.split("Bearer ")[-1])
     if token_data["role"] != "admin":
         raise HTTPException(status_code=403, detail="Only admins can import products.")
 
-    return import_products(db, products)
-
-
-
-#==============================================================#
-
-@router.get("/products/category", response_model=list[dict])
-def filter_products_by_category(
-    category: str = Query(..., min_length=2, description="Category name to filter products"),  # ✅ Ensure valid string
-    skip: int = Query(0, ge=0, description="Number of records to skip for pagination"),
-    limit: int = Query(10, ge=1, le=100, description="Maximum number of records to fetch"),
-    db: Session = Depends(get_db),
-    authorization: str = Header(None),
-):
-    """
-    Fetch products by category.
-    - Customers see **only active products**.
-    - Admins & Vendors see **all products**.
-    - Supports **pagination** (`skip` & `limit`).
-    """
-    print(f"🔍 [DEBUG] Received category: {category}")  # 🔍 Check what category is being received
-
-    # ✅ Ensure category is not empty
-    if not category or category.strip() == "":
-        print("❌ [ERROR] Category is empty.")
-        raise HTTPException(status_code=400, detail="Category cannot be empty.")
-
-    # ✅ Handle authentication safely
-    user_role = "guest"
-    if authorization:
-        parts = authorization.split("Bearer ")
-        if len(parts) == 2:
-            token = parts[1]
-            try:
-                token_data = decode_access_token(token)
-                user_role = token_data.get("role", "guest")
-            except Exception as e:
-                print(f"❌ [ERROR] Token decoding failed: {e}")
-                raise HTTPException(status_code=401, detail="Invalid authentication token.")
-
-    print(f"✅ [DEBUG] User Role: {user_role} is filtering products by category.")
-
-    # ✅ Fetch products based on category
-    products = get_products_by_category(db, category, user_role, skip, limit)
-
-    if not products:
-        print(f"❌ [ERROR] No products found in category: {category}")
-        raise HTTPException(status_code=404, detail=f"No products found in category: {category}")
-
-    # ✅ Convert timestamps to IST
-    product_list = [
-        {
-            "id": product.id,
-            "name": product.name,
-            "description": product.description,
-            "price_before_discount": product.price_before_discount,
-            "price_after_discount": product.price_after_discount,
-            "discount_percentage": product.discount_percentage,
-            "category": product.category,
-            "image_url": product.image_url,
-            "stock_remaining": product.stock_remaining,
-            "is_active": product.is_active,
-            "product_rating": product.product_rating,
-            "created_at": product.created_at.astimezone(IST).isoformat() if product.created_at else None,
-            "updated_at": product.updated_at.astimezone(IST).isoformat() if product.updated_at else None,
-            **(
-                {  # ✅ Include extra fields for admin and vendors
-                    "expenditure_cost_inr": product.expenditure_cost_inr,
-                    "total_stock": product.total_stock,
-                    "profit_per_item_inr": product.profit_per_item_inr,
-                    "vendor_id": product.vendor_id,
-                } if user_role in ["admin", "vendor"] else {}
-            )
-        }
-        for product in products
-    ]
-
-    print(f"✅ [SUCCESS] Returning {len(product_list)} products.")
-    return product_list
-
-
-
-
-
-
-
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in IMPORT_CONTENT_TYPES:
+        raise HTTPException(status_code=415, detail=f"Unsupported content type. Use one of: {', '.join(IMPORT_CONTENT_TYPES)}.")
 
+    # ✅ Stream the body to disk instead of holding it in memory; past IMPORT_SPOOL_MAX_MEMORY the writes
+    # are disk I/O, so they run in the threadpool like the parsing
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MAX_MEMORY) as upload:
+        async for chunk in request.stream():
+            await run_in_threadpool(upload.write, chunk)
+        upload.seek(0)
 
+        # ✅ Parsing and inserting are blocking, keep them off the event loop
+        return await run_in_threadpool(import_products, db, read_import_rows(upload, content_type))
 
 
 
+#==============================================================#
@@ -1,11 +1,12 @@
 import pytz
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Query
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas import ReviewCreate, ReviewResponse, ProductReviewsResponse
-from app.crud.product import get_product_by_id
-from app.crud.review import create_review, get_reviews_for_product
+from app.crud.product import get_product_by_id, rating_distribution
+from app.crud.review import create_review, get_reviews_page
+from app.instrumentation import query_budget
 from app.utils import decode_access_token
 from app.models import Review
 
@@ -13,42 +14,42 @@ from app.models import Review
 IST = pytz.timezone("Asia/Kolkata")
 
 router = APIRouter()
+# The product lookup plus one query for the page of reviews and their reviewers, whatever the page size
+REVIEWS_QUERY_BUDGET = 2
 
 @router.get("/products/{product_id}/reviews", response_model=ProductReviewsResponse)
+@query_budget(REVIEWS_QUERY_BUDGET)
 def get_product_reviews(
     product_id: int,
-    db: Session = Depends(get_db),
+    sort: str = Query("newest", pattern="^(newest|highest|lowest)$"),
+    cursor: str = Query(None, description="`next_cursor` of the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
     authorization: str = Header(None),
 ):
     """
-    Get all reviews for a product.
-    - Returns a list of reviews with the weighted average rating.
+    Get one page of reviews for a product.
+    - Returns the reviews with their reviewers' usernames, sorted by `newest`, `highest` or `lowest` rating.
+    - Pass `next_cursor` back as `cursor` for the next page.
+    - The weighted average rating, review count and star distribution cover all reviews.
     """
-    print(f"Fetching reviews for product ID: {product_id}")  # Debug: product_id being fetched
-
     # Fetch product to ensure it exists
     product = get_product_by_id(db, product_id)
     if not product:
         print(f"Product with ID {product_id} not found!")  # Debug: product not found
         raise HTTPException(status_code=404, detail="Product not found.")
 
-    # Fetch reviews for the product
-    reviews = get_reviews_for_product(db, product_id)
-    print(f"Fetched {len(reviews)} reviews for product ID: {product_id}")  # Debug: number of reviews fetched
-    
-    # Calculate weighted average rating
-    if reviews:
-        total_rating = sum([review.rating for review in reviews])
-        weighted_avg_rating = total_rating / len(reviews)
-        print(f"Calculated weighted average rating: {weighted_avg_rating}")  # Debug: average rating
-    else:
-        weighted_avg_rating = 0.0
-        print("No reviews found, setting weighted average rating to 0.0")  # Debug: no reviews found
+    reviews, next_cursor = get_reviews_page(db, product_id, sort, cursor, limit)
 
+    # ✅ The header comes from the aggregates maintained on the product with every review
     return ProductReviewsResponse(
         product_id=product_id,
-        weighted_average_rating=weighted_avg_rating,
-        reviews=[ReviewResponse.from_orm(review) for review in reviews]
+        weighted_average_rating=product.product_rating or 0.0,
+        review_count=product.review_count,
+        rating_distribution=rating_distribution(product),
+        reviews=[ReviewResponse.from_orm(review) for review in reviews],
+        sort=sort,
+        next_cursor=next_cursor,
     )
 
 
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime
 import logging
-from app.database import get_db
+from app.database import get_read_db
 from app.crud.sales import (
     get_total_revenue,
     get_monthly_revenue,
@@ -19,7 +19,7 @@ logger = logging.getLogger(__name__)
 
 # Total Revenue
 @router.get("/total-revenue")
-def total_revenue(db: Session = Depends(get_db)):
+def total_revenue(db: Session = Depends(get_read_db)):
     logger.debug("Fetching total revenue...")
     revenue = get_total_revenue(db)
     if revenue is None:
@@ -28,7 +28,7 @@ def total_revenue(db: Session = Depends(get_db)):
 
 # Monthly Revenue (Trends)
 @router.get("/monthly-revenue")
-def monthly_revenue(year: int, db: Session = Depends(get_db)):
+def monthly_revenue(year: int, db: Session = Depends(get_read_db)):
     logger.debug(f"Fetching monthly revenue for year {year}...")
     
     # Ensure query year is valid
@@ -49,7 +49,7 @@ def monthly_revenue(year: int, db: Session = Depends(get_db)):
 
 # Daily Sales Trend
 @router.get("/daily-sales-trend")
-def daily_sales_trend(start_date: str, end_date: str, db: Session = Depends(get_db)):
+def daily_sales_trend(start_date: str, end_date: str, db: Session = Depends(get_read_db)):
     try:
         start_date = datetime.strptime(start_date, "%Y-%m-%d")
         end_date = datetime.strptime(end_date, "%Y-%m-%d")
@@ -65,7 +65,7 @@ def daily_sales_trend(start_date: str, end_date: str, db: Session = Depends(get_
 
 # Best Performing Products
 @router.get("/best-products")
-def best_performing_products(limit: int = 10, db: Session = Depends(get_db)):
+def best_performing_products(limit: int = 10, db: Session = Depends(get_read_db)):
     logger.debug(f"Fetching best performing products with limit {limit}...")
     products = get_best_performing_products(db, limit)
     if products is None:
@@ -74,7 +74,7 @@ def best_performing_products(limit: int = 10, db: Session = Depends(get_db)):
 
 # Popular Products
 @router.get("/popular-products")
-def popular_products(limit: int = 10, db: Session = Depends(get_db)):
+def popular_products(limit: int = 10, db: Session = Depends(get_read_db)):
     logger.debug(f"Fetching popular products with limit {limit}...")
     products = get_popular_products(db, limit)
     if products is None:
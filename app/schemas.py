@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Union
 from datetime import datetime
 
 class UserCreate(BaseModel):
@@ -63,6 +63,25 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CategoryCreate(BaseModel):
+    name: str
+    parent: Optional[str] = None  # Name of the parent category, top level when empty
+
+class ProductBulkFilter(BaseModel):
+    ids: Optional[List[int]] = None
+    category: Optional[str] = None  # Category name or slug, subcategories included
+    vendor_id: Optional[int] = None
+
+class ProductBulkUpdateRequest(BaseModel):
+    filter: ProductBulkFilter
+    # set_discount (value: percent), adjust_price (value: +/- percent), activate, deactivate, set_category (value: name)
+    operation: str
+    value: Optional[Union[float, str]] = None
+    dry_run: bool = False
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int]
+
 class ReviewCreate(BaseModel):
     product_id: int
     rating: float
@@ -75,6 +94,7 @@ class ReviewResponse(BaseModel):
     rating: float
     comment: Optional[str]
     created_at: datetime
+    username: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -82,7 +102,11 @@ class ReviewResponse(BaseModel):
 class ProductReviewsResponse(BaseModel):
     product_id: int
     weighted_average_rating: float
+    review_count: int = 0
+    rating_distribution: dict[str, int] = {}
     reviews: list[ReviewResponse]
+    sort: str = "newest"
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -105,8 +129,14 @@ class CartCreate(BaseModel):
     product_id: int
     quantity: int
 
+class CartQuantityUpdate(BaseModel):
+    quantity: int
+
+class CartBulkRequest(BaseModel):
+    items: List[CartCreate]
+
 class CartResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None until a line of CART_STORE=kv is written to the database
     user_id: int
     product_id: int
     quantity: int
@@ -0,0 +1,308 @@
+"""
+Product search.
+
+On PostgreSQL the search runs in the database: the generated `search_vector`
+column (GIN indexed) answers full-text matches over name, category and
+description, and pg_trgm indexes on name answer substring and misspelled
+matches. Results are ranked by `ts_rank_cd` plus trigram word similarity.
+
+Other databases (SQLite in development) and PostgreSQL databases without the
+search migration use `ProductSearchIndex`, an in-process inverted index with
+trigram lookups for the same typo tolerance. It is built on the first search,
+updated from product change events and rebuilt every
+SEARCH_INDEX_REFRESH_SECONDS to pick up writes made by other workers. Rebuilds
+read into a new index that is swapped in, searches keep using the old one meanwhile.
+"""
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from bisect import bisect_left
+
+from sqlalchemy import func, inspect, literal, literal_column, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Product
+from app.product_events import on_products_changed
+
+logger = logging.getLogger(__name__)
+
+# "auto" picks PostgreSQL full-text search when available, "memory" forces the in-process index
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto").strip().lower()
+SEARCH_INDEX_REFRESH_SECONDS = int(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "300"))
+
+# Relevance weight of a match per field, mirrors the setweight() labels A/B/C
+FIELD_WEIGHTS = (("name", 3.0), ("category", 2.0), ("description", 1.0))
+# Minimum trigram similarity for a misspelled word to count as a match (pg_trgm default)
+FUZZY_THRESHOLD = 0.3
+# Similarity of a word typed with two adjacent letters swapped, which shares too few trigrams to pass the threshold
+TRANSPOSITION_SIMILARITY = 0.8
+# Cap on the index words a single query word may expand to (prefix/fuzzy matches)
+MAX_EXPANSIONS = 200
+# More pending changes than this trigger a full rebuild instead of reindexing them
+MAX_PENDING_UPDATES = 5000
+# How long searches wait for the first build, run by another search, before answering from an empty index
+BUILD_WAIT_SECONDS = 30
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str):
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def transpositions(word: str):
+    """The word with one pair of adjacent letters swapped ("phnoe" -> "phone"), for words of 3+ letters."""
+    if len(word) < 3:
+        return set()
+    return {word[:i] + word[i + 1] + word[i] + word[i + 2:] for i in range(len(word) - 1) if word[i] != word[i + 1]}
+
+
+def trigrams(word: str):
+    """Trigrams of a word, padded like pg_trgm does."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _SearchState:
+    """The data of one index build, swapped as a whole on rebuilds."""
+
+    def __init__(self):
+        self.active = {}                        # product id -> is_active
+        self.doc_words = {}                     # product id -> words indexed for it
+        self.postings = defaultdict(dict)       # word -> {product id: weight}
+        self.word_trigrams = defaultdict(set)   # trigram -> words
+        self.sorted_words = None                # for prefix lookups, rebuilt lazily
+
+    def add(self, row):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS:
+            for word in tokenize(getattr(row, field)):
+                weights[word] = max(weights.get(word, 0.0), weight)
+        self.active[row.id] = bool(row.is_active)
+        self.doc_words[row.id] = tuple(weights)
+        for word, weight in weights.items():
+            if word not in self.postings:
+                self.sorted_words = None
+                for gram in trigrams(word):
+                    self.word_trigrams[gram].add(word)
+            self.postings[word][row.id] = weight
+
+    def remove(self, product_id):
+        self.active.pop(product_id, None)
+        for word in self.doc_words.pop(product_id, ()):
+            postings = self.postings.get(word)
+            if postings is not None:
+                postings.pop(product_id, None)
+
+    def expand(self, word: str):
+        """Index words matching a query word, with their similarity to it."""
+        matches = {}
+        if word in self.postings:
+            matches[word] = 1.0
+        # Swapped letters, matched by both backends (see `full_text_search_query`)
+        for variant in transpositions(word):
+            if variant in self.postings:
+                matches.setdefault(variant, TRANSPOSITION_SIMILARITY)
+
+        # Prefix matches, so "lap" finds "laptop" while typing
+        if self.sorted_words is None:
+            self.sorted_words = sorted(self.postings)
+        position = bisect_left(self.sorted_words, word)
+        while position < len(self.sorted_words) and len(matches) < MAX_EXPANSIONS:
+            candidate = self.sorted_words[position]
+            if not candidate.startswith(word):
+                break
+            matches.setdefault(candidate, 0.9)
+            position += 1
+
+        # Substring and misspelled matches through shared trigrams
+        if len(word) >= 3:
+            grams = trigrams(word)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.word_trigrams.get(gram, ()))
+            for candidate, common in shared.most_common():
+                if candidate in matches:
+                    continue
+                if word in candidate:
+                    matches[candidate] = 0.8
+                else:
+                    similarity = common / (len(grams) + len(trigrams(candidate)) - common)
+                    if similarity < FUZZY_THRESHOLD:
+                        continue
+                    matches[candidate] = similarity
+                if len(matches) >= MAX_EXPANSIONS:
+                    break
+        return matches
+
+    def scores(self, keyword: str, active_only: bool):
+        """Relevance of every matching product."""
+        scores = defaultdict(float)
+        for word in set(tokenize(keyword)):
+            best = {}
+            for candidate, similarity in self.expand(word).items():
+                for product_id, weight in self.postings[candidate].items():
+                    score = similarity * weight
+                    if score > best.get(product_id, 0.0):
+                        best[product_id] = score
+            for product_id, score in best.items():
+                scores[product_id] += score
+        if active_only:
+            return {product_id: score for product_id, score in scores.items() if self.active.get(product_id)}
+        return scores
+
+
+class ProductSearchIndex:
+    """In-process inverted index over product name, category and description."""
+
+    def __init__(self, refresh_seconds: int = SEARCH_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._state = _SearchState()
+        self._built_at = None
+        self._pending = set()
+        self._changed_during_build = None   # ids changed while a rebuild reads the database
+        self._building = False
+        self._ready = threading.Event()
+
+    def invalidate(self, product_ids):
+        """Reindex these products on the next search."""
+        with self._lock:
+            self._pending.update(product_ids)
+            if self._changed_during_build is not None:
+                self._changed_during_build.update(product_ids)
+
+    @staticmethod
+    def _rows(db: Session, product_ids=None):
+        stmt = select(Product.id, Product.name, Product.category, Product.description, Product.is_active)
+        if product_ids is not None:
+            stmt = stmt.where(Product.id.in_(product_ids))
+        return db.execute(stmt.execution_options(yield_per=10_000))
+
+    def _rebuild(self, db: Session):
+        """Build a new index from the database and swap it in; searches keep using the old one meanwhile."""
+        started = time.perf_counter()
+        state = _SearchState()
+        try:
+            for row in self._rows(db):
+                state.add(row)
+        except Exception:
+            with self._lock:
+                self._pending |= self._changed_during_build
+                self._changed_during_build = None
+                self._building = False
+            raise
+        with self._lock:
+            self._state = state
+            self._built_at = time.monotonic()
+            # Changes committed after the rows were read are applied on the next search
+            self._pending |= self._changed_during_build
+            self._changed_during_build = None
+            self._building = False
+        self._ready.set()
+        logger.info(f"Built product search index: {len(state.active)} products in {time.perf_counter() - started:.2f}s")
+
+    def _sync(self, db: Session):
+        """
+        Build the index on first use, when stale or after bulk changes, otherwise apply pending changes.
+        - The database is read without the lock; searches only wait for the swap or the in-memory updates.
+        """
+        with self._lock:
+            stale = self._built_at is None or time.monotonic() - self._built_at > self.refresh_seconds
+            # Reindexing many products one by one (bulk imports) is slower than a rebuild
+            rebuild = (stale or len(self._pending) > MAX_PENDING_UPDATES) and not self._building
+            product_ids = None
+            if rebuild:
+                self._building = True
+                self._changed_during_build = set()
+                self._pending.clear()
+            elif self._pending:
+                product_ids, self._pending = list(self._pending), set()
+            first_build = self._built_at is None
+
+        if rebuild:
+            self._rebuild(db)
+        elif first_build:
+            # Another search is building the index
+            self._ready.wait(BUILD_WAIT_SECONDS)
+        elif product_ids:
+            try:
+                rows = self._rows(db, product_ids).all()
+            except Exception:
+                with self._lock:
+                    self._pending.update(product_ids)
+                raise
+            with self._lock:
+                for product_id in product_ids:
+                    self._state.remove(product_id)
+                for row in rows:
+                    self._state.add(row)
+
+    def search(self, db: Session, keyword: str, active_only: bool, skip: int = 0, limit: int = 10):
+        """Ids of the best matching products, most relevant first."""
+        self._sync(db)
+        with self._lock:
+            scores = self._state.scores(keyword, active_only)
+        top = heapq.nsmallest(skip + limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in top[skip:]]
+
+    def status(self):
+        state = self._state
+        return {
+            "products": len(state.active),
+            "words": len(state.postings),
+            "pending": len(self._pending),
+            "building": self._building,
+            "age_seconds": None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+        }
+
+
+search_index = ProductSearchIndex()
+on_products_changed(search_index.invalidate)
+
+_full_text_available = {}
+
+
+def uses_full_text_search(db: Session) -> bool:
+    """True when the database can answer the search itself (PostgreSQL with migration 0004)."""
+    if SEARCH_BACKEND == "memory":
+        return False
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql":
+        return False
+    key = str(bind.url)
+    if key not in _full_text_available:
+        columns = {column["name"] for column in inspect(bind).get_columns("products")}
+        _full_text_available[key] = "search_vector" in columns
+        if not _full_text_available[key]:
+            logger.warning("products.search_vector is missing, run `alembic upgrade head`; using the in-process search index")
+    return _full_text_available[key]
+
+
+def full_text_search_query(keyword: str):
+    """
+    Ranked PostgreSQL search over products.
+    - `search_vector @@ query` matches words in name, category and description (GIN index).
+    - `name ILIKE` and `keyword <% name` catch substrings and typos (pg_trgm GIN index).
+    - Words with two adjacent letters swapped share too few trigrams, so every query word also
+      matches its transpositions through the full-text index, like the in-process index does.
+    """
+    search_vector = literal_column("products.search_vector")
+    query = func.websearch_to_tsquery("english", keyword)
+    similarity = func.word_similarity(keyword, Product.name)
+    rank = func.ts_rank_cd(search_vector, query) + similarity
+    conditions = [
+        search_vector.op("@@")(query),
+        Product.name.ilike(f"%{keyword}%"),
+        literal(keyword).op("<%")(Product.name),
+    ]
+    words = tokenize(keyword)
+    if any(transpositions(word) for word in words):
+        # Tokens are \w+ only, safe to_tsquery syntax
+        typo_query = " & ".join("(" + " | ".join(sorted({word} | transpositions(word))) + ")" for word in words)
+        conditions.append(search_vector.op("@@")(func.to_tsquery("english", typo_query)))
+    return select(Product).where(or_(*conditions)).order_by(rank.desc(), Product.id)
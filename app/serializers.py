@@ -0,0 +1,78 @@
+"""
+Fast serialization of products for the listing endpoints.
+
+`serialize_products` turns ORM products into response dicts in a single pass,
+with the fields of the caller's role:
+- guests & customers get the public catalog fields,
+- admins & vendors also get cost, stock and vendor fields.
+
+Timestamps are rendered in IST without going through `astimezone` per value,
+and `FastJSONResponse` writes the result with orjson. Routes return it
+directly, so FastAPI does not validate the already-built dicts again.
+"""
+from datetime import datetime
+from operator import attrgetter
+
+import orjson
+import pytz
+from fastapi.responses import Response
+
+IST = pytz.timezone("Asia/Kolkata")
+
+PUBLIC_FIELDS = (
+    "id", "name", "description", "price_before_discount", "price_after_discount", "discount_percentage",
+    "category", "image_url", "stock_remaining", "is_active", "product_rating",
+)
+PRIVATE_FIELDS = ("expenditure_cost_inr", "total_stock", "profit_per_item_inr", "vendor_id")
+PRIVILEGED_ROLES = ("admin", "vendor")
+
+
+def active_only(user_role: str) -> bool:
+    """Whether `user_role` sees only active products: everyone but admins and vendors, guests included."""
+    return user_role not in PRIVILEGED_ROLES
+
+_get_public = attrgetter(*PUBLIC_FIELDS)
+_get_private = attrgetter(*PRIVATE_FIELDS)
+
+# IST has had a fixed offset since 1945, so it is computed once
+_IST_OFFSET = datetime.now(IST).utcoffset()
+_IST_SUFFIX = datetime.now(IST).strftime("%z")
+_IST_SUFFIX = f"{_IST_SUFFIX[:3]}:{_IST_SUFFIX[3:]}"
+
+
+def ist_isoformat(value: datetime):
+    """`value` in IST as ISO 8601, None for missing timestamps; naive timestamps are UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return (value + _IST_OFFSET).isoformat() + _IST_SUFFIX
+    return value.astimezone(IST).isoformat()
+
+
+def serialize_products(products, user_role: str):
+    """Response dicts for `products`, projected for `user_role`."""
+    privileged = user_role in PRIVILEGED_ROLES
+    result = []
+    append = result.append
+    for product in products:
+        data = dict(zip(PUBLIC_FIELDS, _get_public(product)))
+        data["created_at"] = ist_isoformat(product.created_at)
+        data["updated_at"] = ist_isoformat(product.updated_at)
+        if privileged:
+            data.update(zip(PRIVATE_FIELDS, _get_private(product)))
+        append(data)
+    return result
+
+
+def serialize_product(product, user_role: str):
+    """Response dict for a single product, projected for `user_role`."""
+    return serialize_products((product,), user_role)[0]
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson, for content that is already plain dicts and lists."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
@@ -0,0 +1,178 @@
+"""
+Side-by-side benchmark of the sync and async (DB_ASYNC_MODE) database paths.
+
+Starts the API twice with uvicorn, once per mode, against the DATABASE_URL
+from the environment and drives the catalog and checkout endpoints with
+concurrent clients.
+
+    python -m benchmarks.async_vs_sync --requests 2000 --concurrency 50
+
+The benchmark creates its own customer account and catalog products
+(prefixed with "bench-") in the target database.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BENCH_USER = "bench-customer"
+BENCH_PASSWORD = "bench-password"
+
+
+def prepare_data(products: int):
+    """Create the benchmark customer and catalog directly through the ORM."""
+    from app.database import Base, SessionLocal, engine
+    from app.models import Product, User
+    from app.utils import create_access_token, hash_password
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == BENCH_USER).first()
+        if not user:
+            user = User(
+                username=BENCH_USER,
+                email=f"{BENCH_USER}@example.com",
+                phone_number=BENCH_USER,
+                hashed_password=hash_password(BENCH_PASSWORD),
+                role="customer",
+            )
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+
+        existing = db.query(Product).filter(Product.name.like("bench-%")).count()
+        for i in range(existing, products):
+            db.add(Product(
+                name=f"bench-{i}",
+                description="benchmark product",
+                price=100.0,
+                price_before_discount=100.0,
+                price_after_discount=90.0,
+                expenditure_cost_inr=50.0,
+                discount_percentage=10.0,
+                profit_per_item_inr=40.0,
+                total_stock=10_000_000,
+                stock_remaining=10_000_000,
+                category="Benchmark",
+                image_url="",
+                is_active=True,
+                product_rating=0.0,
+            ))
+        db.commit()
+
+        token = create_access_token({"id": user.id, "username": user.username, "role": user.role})
+        return token
+    finally:
+        db.close()
+
+
+def start_server(port: int, async_mode: bool):
+    env = dict(os.environ, DB_ASYNC_MODE="true" if async_mode else "false")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not start in time")
+
+
+async def drive(base_url: str, method: str, path: str, headers: dict, total: int, concurrency: int):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, path, headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "errors": errors,
+    }
+
+
+def prepare_cart():
+    """Put one unit of each benchmark product into the customer's cart."""
+    from app.database import SessionLocal
+    from app.models import Cart, Product, User
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == BENCH_USER).first()
+        db.query(Cart).filter(Cart.user_id == user.id).delete()
+        for product in db.query(Product).filter(Product.name.like("bench-%")).limit(5):
+            db.add(Cart(user_id=user.id, product_id=product.id, quantity=1))
+        db.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    token = prepare_data(args.products)
+    headers = {"Authorization": f"Bearer {token}"}
+    scenarios = [
+        ("catalog", "GET", "/product/products", {}),
+        ("cart", "GET", "/cart/cart", headers),
+        ("checkout", "POST", "/orders/orders/place", headers),
+    ]
+
+    results = {}
+    for async_mode in (False, True):
+        mode = "async" if async_mode else "sync"
+        server = start_server(args.port, async_mode)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            prepare_cart()
+            for name, method, path, scenario_headers in scenarios:
+                results[(name, mode)] = asyncio.run(
+                    drive(base_url, method, path, scenario_headers, args.requests, args.concurrency)
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'endpoint':<10} {'mode':<6} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+    for (name, mode), stats in results.items():
+        print(f"{name:<10} {mode:<6} {stats['rps']:>10.1f} {stats['p50_ms']:>10.2f} {stats['p99_ms']:>10.2f} {stats['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Latency of the product autocomplete index (app/autocomplete.py).
+
+Builds the index in memory from a synthetic catalog (one million products by
+default, no database needed) and times typing queries keystroke by keystroke,
+in both scopes:
+
+    python -m benchmarks.autocomplete_benchmark --products 1000000 --rounds 5
+
+The target is a p99 below 5 ms per keystroke.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.search_benchmark import ADJECTIVES, BRANDS, NOUNS
+
+# Typed one keystroke at a time, so every prefix is measured
+QUERIES = ["laptop", "wireless headphones", "gaming mouse", "acme camera", "ergonomic chair", "smart watch", "x12", "k"]
+
+
+def make_rows(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    for product_id in range(1, count + 1):
+        name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} x{rng.randint(1, 100_000)}"
+        yield product_id, name, round(rng.uniform(0, 5), 1), rng.randint(0, 500), rng.random() > 0.1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    from app.autocomplete import _IndexState
+
+    started = time.perf_counter()
+    state = _IndexState()
+    state.load(make_rows(args.products))
+    print(f"Built the index ({len(state.products)} products, {len(state.words['all'])} words) in {time.perf_counter() - started:.1f}s")
+
+    print(f"{'scope':<8} {'queries':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for scope in ("active", "all"):
+        latencies = []
+        for _ in range(args.rounds):
+            # Reviews and edits land between rounds and drop the precomputed results of their prefixes
+            for product_id in random.sample(list(state.products), 100):
+                name, _, is_active = state.products[product_id]
+                state.remove(product_id)
+                state.add(product_id, name, random.uniform(1, 5), random.randint(0, 500), is_active)
+            for query in QUERIES:
+                for length in range(1, len(query) + 1):
+                    begin = time.perf_counter()
+                    state.complete(scope, query[:length], 10)
+                    latencies.append((time.perf_counter() - begin) * 1000)
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{scope:<8} {len(latencies):>8} {statistics.median(latencies):>8.3f} {p99:>8.3f} {latencies[-1]:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
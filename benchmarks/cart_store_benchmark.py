@@ -0,0 +1,141 @@
+"""
+Cart operations per second with each cart store (app/crud/cart_store.py).
+
+Runs the same mix of cart operations once per CART_STORE, each in its own
+process, against the DATABASE_URL from the environment:
+
+- `store`: the store alone, i.e. the cart line writes and reads
+  (`set`, `rows`, `remove`), and
+- `crud`: the cart functions behind the routes, which also keep the stock
+  holds in the database (`set_cart_quantity`, `get_cart_items`,
+  `remove_from_cart`).
+
+    python -m benchmarks.cart_store_benchmark --operations 2000 --threads 8
+
+The kv store writes to CART_STORE_PATH (default: a temporary file); the time
+its final flush to the `carts` table takes is reported as well. The benchmark
+creates its own customers and catalog products (prefixed with "bench-") in
+the target database.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.async_vs_sync import prepare_data
+
+BENCH_CUSTOMERS = 50
+
+
+def prepare_customers(count: int):
+    """Ids of `count` benchmark customers, with empty carts."""
+    from app.database import SessionLocal
+    from app.models import Cart, StockReservation, User
+
+    db = SessionLocal()
+    try:
+        ids = []
+        for i in range(count):
+            username = f"bench-cart-{i}"
+            user = db.query(User).filter(User.username == username).first()
+            if not user:
+                # Never logs in, no need for a real password hash
+                user = User(username=username, email=f"{username}@example.com", phone_number=username, hashed_password="-", role="customer")
+                db.add(user)
+                db.flush()
+            ids.append(user.id)
+        db.query(Cart).filter(Cart.user_id.in_(ids)).delete(synchronize_session=False)
+        db.query(StockReservation).filter(StockReservation.user_id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        return ids
+    finally:
+        db.close()
+
+
+def run(operations: int, threads: int):
+    """Time the operation mix with the store of this process's CART_STORE; returns ops/s per operation."""
+    from app.crud.cart import get_cart_items, remove_from_cart, set_cart_quantity
+    from app.crud.cart_store import cart_store
+    from app.database import SessionLocal
+    from app.models import Product
+
+    db = SessionLocal()
+    product_ids = [product_id for (product_id,) in db.query(Product.id).filter(Product.name.like("bench-%"))]
+    db.close()
+    user_ids = prepare_customers(BENCH_CUSTOMERS)
+
+    def store_ops(user_id, product_id, db):
+        cart_store.set(db, user_id, {product_id: 1})
+        db.commit()
+        cart_store.rows(db, user_id)
+        cart_store.remove(db, user_id, product_id)
+        db.commit()
+
+    def crud_ops(user_id, product_id, db):
+        set_cart_quantity(db, user_id, product_id, 1)
+        get_cart_items(db, user_id)
+        remove_from_cart(db, user_id, product_id)
+
+    results = {}
+    cart_store.start()
+    try:
+        for name, ops in (("store", store_ops), ("crud", crud_ops)):
+            def work(i, ops=ops):
+                rng = random.Random(i)
+                db = SessionLocal()
+                try:
+                    user_id = user_ids[i % len(user_ids)]
+                    ops(user_id, rng.choice(product_ids), db)
+                finally:
+                    db.close()
+
+            # One round per operation: add/update, view, remove
+            rounds = operations // 3
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(work, range(rounds)))
+            results[name] = rounds * 3 / (time.perf_counter() - started)
+    finally:
+        started = time.perf_counter()
+        cart_store.stop()
+        results["final_flush_ms"] = (time.perf_counter() - started) * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--run", choices=("orm", "kv"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.operations, args.threads)))
+        return
+
+    prepare_data(args.products)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for store in ("orm", "kv"):
+            env = dict(os.environ, CART_STORE=store)
+            env.setdefault("CART_STORE_PATH", os.path.join(directory, "cart_store.db"))
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.cart_store_benchmark", "--run", store,
+                 "--operations", str(args.operations), "--threads", str(args.threads)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            results[store] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'store':<6} {'store ops/s':>12} {'crud ops/s':>12} {'final flush ms':>15}")
+    for store, stats in results.items():
+        print(f"{store:<6} {stats['store']:>12.1f} {stats['crud']:>12.1f} {stats['final_flush_ms']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Product search latency before and after the indexed search engine.
+
+Fills the DATABASE_URL database with a synthetic catalog (products named
+"synthetic-...", one million by default) and times the same queries through
+
+- `ilike`: the previous `name ILIKE '%keyword%'` scan, and
+- `search`: `search_products_by_name` (PostgreSQL full-text + pg_trgm, or
+  the in-process index on SQLite).
+
+    python -m benchmarks.search_benchmark --products 1000000 --rounds 20
+
+On PostgreSQL run `alembic upgrade head` first so the search column and
+indexes exist. The synthetic products are kept between runs; pass --products
+0 to reuse them as they are.
+"""
+import argparse
+import random
+import statistics
+import time
+
+BRANDS = ["acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "wonka", "tyrell", "cyberdyne"]
+NOUNS = ["laptop", "phone", "headphones", "keyboard", "monitor", "camera", "speaker", "charger", "tablet", "watch",
+         "router", "mouse", "printer", "backpack", "sneakers", "jacket", "kettle", "blender", "lamp", "chair"]
+ADJECTIVES = ["wireless", "portable", "gaming", "compact", "ergonomic", "smart", "waterproof", "premium", "classic", "mini"]
+CATEGORIES = ["Electronics", "Computers", "Audio", "Home", "Fashion", "Sports", "Kitchen", "Office"]
+
+# Exact words, prefixes, substrings and misspellings
+QUERIES = ["laptop", "wireless headphones", "gaming mouse", "lap", "phone", "keybord", "hedphones", "acme camera", "ergonomic chair", "blendr"]
+
+
+def prepare_catalog(count: int, batch_size: int = 10_000):
+    """Insert synthetic products until the catalog holds `count` of them."""
+    from sqlalchemy import func, insert, select
+    from app.database import Base, SessionLocal, engine
+    from app.models import Product
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        existing = db.scalar(select(func.count()).select_from(Product).where(Product.name.like("synthetic-%")))
+        rng = random.Random(existing)
+        started = time.perf_counter()
+        for offset in range(existing, count, batch_size):
+            rows = []
+            for i in range(offset, min(offset + batch_size, count)):
+                noun = rng.choice(NOUNS)
+                rows.append({
+                    "name": f"synthetic-{i} {rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {noun}",
+                    "description": f"{rng.choice(ADJECTIVES)} {noun} by {rng.choice(BRANDS)}",
+                    "category": rng.choice(CATEGORIES),
+                    "price": 100.0, "price_before_discount": 100.0, "price_after_discount": 90.0,
+                    "expenditure_cost_inr": 50.0, "discount_percentage": 10.0, "profit_per_item_inr": 40.0,
+                    "total_stock": 100, "stock_remaining": 100, "image_url": "",
+                    "is_active": rng.random() > 0.1, "product_rating": 0.0,
+                })
+            db.execute(insert(Product), rows)
+            db.commit()
+        if count > existing:
+            print(f"Inserted {count - existing} products in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+def time_queries(run, rounds: int):
+    latencies = []
+    for _ in range(rounds):
+        for query in QUERIES:
+            started = time.perf_counter()
+            run(query)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.products:
+        prepare_catalog(args.products)
+
+    from app.crud.product import search_products_by_name
+    from app.database import SessionLocal
+    from app.models import Product
+    from app.search import search_index, uses_full_text_search
+
+    db = SessionLocal()
+    try:
+        def ilike(keyword):
+            return (
+                db.query(Product)
+                .filter(Product.name.ilike(f"%{keyword}%"), Product.is_active == True)
+                .limit(10)
+                .all()
+            )
+
+        def search(keyword):
+            return search_products_by_name(db, keyword, "customer", 0, 10)
+
+        backend = "postgres full-text" if uses_full_text_search(db) else "in-process index"
+        if backend == "in-process index":
+            started = time.perf_counter()
+            search(QUERIES[0])
+            print(f"Built the in-process index ({search_index.status()['products']} products) in {time.perf_counter() - started:.1f}s")
+
+        print(f"{'method':<28} {'p50 ms':>10} {'p99 ms':>10}")
+        for name, run in (("ilike", ilike), (f"search ({backend})", search)):
+            p50, p99 = time_queries(run, args.rounds)
+            print(f"{name:<28} {p50:>10.2f} {p99:>10.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark of product list serialization.
+
+Compares, for 10k in-memory products and both role projections,
+
+- `legacy`: per-row dicts with two `astimezone(IST).isoformat()` calls (from UTC), then
+  FastAPI's `list[dict]` response model validation and JSON encoding, and
+- `fast`: `serialize_products` + orjson (app/serializers.py).
+
+    python -m benchmarks.serializer_benchmark --products 10000 --rounds 20
+
+No database is needed.
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+IST = pytz.timezone("Asia/Kolkata")
+
+
+def make_products(count: int):
+    from app.models import Product
+
+    started = datetime(2025, 1, 1)
+    return [
+        Product(
+            id=i, name=f"Product {i}", description="A product used to benchmark serialization",
+            price=100.0 + i, price_before_discount=100.0 + i, price_after_discount=90.0 + i,
+            expenditure_cost_inr=50.0, discount_percentage=10.0, profit_per_item_inr=40.0 + i,
+            total_stock=100, stock_remaining=50, category="Electronics", image_url="https://example.com/p.png",
+            vendor_id=1, is_active=True, product_rating=4.5,
+            created_at=started + timedelta(minutes=i), updated_at=started + timedelta(minutes=i, seconds=30),
+        )
+        for i in range(count)
+    ]
+
+
+def legacy(products, user_role: str, adapter=TypeAdapter(list[dict])) -> bytes:
+    """What the listing routes did before app/serializers.py."""
+    product_list = []
+    for product in products:
+        product_data = {
+            "id": product.id,
+            "name": product.name,
+            "description": product.description,
+            "price_before_discount": product.price_before_discount,
+            "price_after_discount": product.price_after_discount,
+            "discount_percentage": product.discount_percentage,
+            "category": product.category,
+            "image_url": product.image_url,
+            "stock_remaining": product.stock_remaining,
+            "is_active": product.is_active,
+            "product_rating": product.product_rating,
+            "created_at": pytz.utc.localize(product.created_at).astimezone(IST).isoformat() if product.created_at else None,
+            "updated_at": pytz.utc.localize(product.updated_at).astimezone(IST).isoformat() if product.updated_at else None,
+        }
+        if user_role in ["admin", "vendor"]:
+            product_data.update({
+                "expenditure_cost_inr": product.expenditure_cost_inr,
+                "total_stock": product.total_stock,
+                "profit_per_item_inr": product.profit_per_item_inr,
+                "vendor_id": product.vendor_id,
+            })
+        product_list.append(product_data)
+    # response_model=list[dict]: validate, encode, render
+    validated = adapter.validate_python(product_list)
+    return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast(products, user_role: str) -> bytes:
+    from app.serializers import FastJSONResponse, serialize_products
+
+    return FastJSONResponse(serialize_products(products, user_role)).body
+
+
+def measure(run, products, user_role: str, rounds: int):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        run(products, user_role)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    for user_role in ("customer", "admin"):
+        assert json.loads(legacy(products, user_role)) == json.loads(fast(products, user_role))
+
+    print(f"{'role':<10} {'legacy ms':>10} {'fast ms':>10} {'speed-up':>10}")
+    for user_role in ("customer", "admin"):
+        before = measure(legacy, products, user_role, args.rounds)
+        after = measure(fast, products, user_role, args.rounds)
+        print(f"{user_role:<10} {before:>10.2f} {after:>10.2f} {before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Baseline schema
+
+Creates the tables that were previously created by `Base.metadata.create_all`
+at startup. Tables that already exist are left alone, so databases created
+before migrations were introduced can be upgraded in place.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _create_table(name, *columns):
+    if context.is_offline_mode() or not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *columns)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("username", sa.String(), unique=True, index=True),
+        sa.Column("email", sa.String(), unique=True, index=True),
+        sa.Column("phone_number", sa.String()),
+        sa.Column("hashed_password", sa.String()),
+        sa.Column("role", sa.String()),
+    )
+    _create_table(
+        "products",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("name", sa.String(), index=True),
+        sa.Column("description", sa.String()),
+        sa.Column("price", sa.Float()),
+        sa.Column("price_before_discount", sa.Float()),
+        sa.Column("price_after_discount", sa.Float()),
+        sa.Column("expenditure_cost_inr", sa.Float()),
+        sa.Column("discount_percentage", sa.Float()),
+        sa.Column("profit_per_item_inr", sa.Float()),
+        sa.Column("total_stock", sa.Integer()),
+        sa.Column("stock_remaining", sa.Integer()),
+        sa.Column("category", sa.String()),
+        sa.Column("image_url", sa.String()),
+        sa.Column("vendor_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("deleted_at", sa.DateTime(), nullable=True),
+        sa.Column("product_rating", sa.Float()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    _create_table(
+        "reviews",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE")),
+        sa.Column("rating", sa.Float(), nullable=False),
+        sa.Column("comment", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    _create_table(
+        "carts",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE")),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+    )
+    _create_table(
+        "wishlists",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE")),
+    )
+    _create_table(
+        "orders",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("total_price", sa.Float(), nullable=False),
+        sa.Column("status", sa.String()),
+        sa.Column("payment_status", sa.String(), nullable=True),
+        sa.Column("shipment_status", sa.String(), nullable=True),
+        sa.Column("transaction_id", sa.String(), nullable=True, unique=True),
+        sa.Column("tracking_id", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    _create_table(
+        "order_items",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("order_id", sa.Integer(), sa.ForeignKey("orders.id", ondelete="CASCADE")),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="SET NULL")),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Float()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in ("order_items", "orders", "wishlists", "carts", "reviews", "products", "users"):
+        op.drop_table(name)
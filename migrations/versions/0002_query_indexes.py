@@ -0,0 +1,60 @@
+"""Indexes on the columns used for filtering and joins
+
+Built with CREATE INDEX CONCURRENTLY on PostgreSQL so that the tables stay
+writable while the indexes are built.
+
+Revision ID: 0002_query_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-17 00:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_query_indexes"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_carts_user_id", "carts", ["user_id"]),
+    ("ix_wishlists_user_id", "wishlists", ["user_id"]),
+    ("ix_orders_user_id", "orders", ["user_id"]),
+    ("ix_orders_payment_status", "orders", ["payment_status"]),
+    ("ix_orders_created_at", "orders", ["created_at"]),
+    ("ix_order_items_order_id", "order_items", ["order_id"]),
+    ("ix_order_items_product_id", "order_items", ["product_id"]),
+    ("ix_reviews_product_id", "reviews", ["product_id"]),
+    ("ix_products_category", "products", ["category"]),
+    ("ix_products_vendor_id", "products", ["vendor_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+        op.create_index(
+            "ix_products_active",
+            "products",
+            ["id"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+            postgresql_where=sa.text("is_active"),
+            sqlite_where=sa.text("is_active"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_products_active", table_name="products", if_exists=True, postgresql_concurrently=True)
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
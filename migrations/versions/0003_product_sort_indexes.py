@@ -0,0 +1,42 @@
+"""Composite indexes for keyset pagination of the product listing
+
+One (sort key, id) index per sort order of GET /product/products, so every
+page is an index range scan no matter how deep the cursor is.
+
+Revision ID: 0003_product_sort_indexes
+Revises: 0002_query_indexes
+Create Date: 2026-10-17 00:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_product_sort_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_query_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_products_created_at_id", "products", ["created_at", "id"]),
+    ("ix_products_price_after_discount_id", "products", ["price_after_discount", "id"]),
+    ("ix_products_product_rating_id", "products", ["product_rating", "id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,59 @@
+"""Full-text and trigram search on products (PostgreSQL)
+
+Adds the generated `search_vector` tsvector column with a GIN index and the
+pg_trgm GIN indexes on name and category used by app/search.py. Nothing to do
+on SQLite, which uses the in-process search index instead.
+
+Adding a STORED generated column rewrites the products table while holding an
+ACCESS EXCLUSIVE lock; run this migration in a low-traffic window on large
+catalogs. The indexes are built CONCURRENTLY afterwards.
+
+Revision ID: 0004_product_search
+Revises: 0003_product_sort_indexes
+Create Date: 2026-10-17 00:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_product_search"
+down_revision: Union[str, Sequence[str], None] = "0003_product_sort_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_products_search_vector", "search_vector"),
+    ("ix_products_name_trgm", "name gin_trgm_ops"),
+    ("ix_products_category_trgm", "category gin_trgm_ops"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')) STORED"
+    )
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, expression in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON products USING gin ({expression})")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
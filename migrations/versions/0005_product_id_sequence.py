@@ -0,0 +1,41 @@
+"""Resynchronize the products id sequence (PostgreSQL)
+
+Products used to get explicit ids computed as MAX(id) + 1, which never
+advanced the sequence behind products.id. Now that inserts take their ids from
+the sequence, move it past the highest existing id. The sequence is created
+and attached to the column if the table was created without one.
+
+Revision ID: 0005_product_id_sequence
+Revises: 0004_product_search
+Create Date: 2026-10-17 00:00:04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_product_id_sequence"
+down_revision: Union[str, Sequence[str], None] = "0004_product_search"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        # SQLite assigns MAX(rowid) + 1 by itself
+        return
+    op.execute("CREATE SEQUENCE IF NOT EXISTS products_id_seq OWNED BY products.id")
+    op.execute("ALTER TABLE products ALTER COLUMN id SET DEFAULT nextval('products_id_seq'::regclass)")
+    op.execute(
+        "SELECT setval(pg_get_serial_sequence('products', 'id'), "
+        "COALESCE((SELECT MAX(id) FROM products), 0) + 1, false)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # The sequence stays, ids assigned from it remain valid
+    pass
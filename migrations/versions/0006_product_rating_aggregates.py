@@ -0,0 +1,50 @@
+"""Review aggregates on products
+
+Adds the review count, rating sums and 1-5 star histogram that reviews keep
+up to date. Existing products start at zero; fill them from their reviews with
+`python -m app.cli backfill-ratings` after upgrading.
+
+Revision ID: 0006_product_rating_aggregates
+Revises: 0005_product_id_sequence
+Create Date: 2026-10-17 00:00:05
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_product_rating_aggregates"
+down_revision: Union[str, Sequence[str], None] = "0005_product_id_sequence"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+COLUMNS = [
+    ("review_count", sa.Integer()),
+    ("rating_sum", sa.Float()),
+    ("rating_weighted_sum", sa.Float()),
+    ("rating_weight_total", sa.Integer()),
+    ("rating_1", sa.Integer()),
+    ("rating_2", sa.Integer()),
+    ("rating_3", sa.Integer()),
+    ("rating_4", sa.Integer()),
+    ("rating_5", sa.Integer()),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant default lets PostgreSQL add the columns without rewriting the table
+    with op.batch_alter_table("products") as batch_op:
+        for name, type_ in COLUMNS:
+            batch_op.add_column(sa.Column(name, type_, server_default="0", nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("products") as batch_op:
+        for name, _ in reversed(COLUMNS):
+            batch_op.drop_column(name)
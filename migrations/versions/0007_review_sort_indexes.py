@@ -0,0 +1,42 @@
+"""Composite indexes for keyset pagination of product reviews
+
+One (product_id, sort key, id) index per sort order of
+GET /reviews/products/{product_id}/reviews, so a page costs the same however
+many reviews the product has.
+
+Revision ID: 0007_review_sort_indexes
+Revises: 0006_product_rating_aggregates
+Create Date: 2026-10-17 00:00:06
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_review_sort_indexes"
+down_revision: Union[str, Sequence[str], None] = "0006_product_rating_aggregates"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ("ix_reviews_product_id_created_at_id", "reviews", ["product_id", "created_at", "id"]),
+    ("ix_reviews_product_id_rating_id", "reviews", ["product_id", "rating", "id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
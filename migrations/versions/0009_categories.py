@@ -0,0 +1,55 @@
+"""Categories table and products.category_id
+
+Categories get slugs, an optional parent and a precomputed count of their
+active products. Products keep their `category` name and point to the
+category through an indexed foreign key. Link existing products and fill the
+counts with `python -m app.cli rebuild-categories` after upgrading.
+
+Revision ID: 0009_categories
+Revises: 0008_product_updated_at_index
+Create Date: 2026-10-17 00:00:08
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_categories"
+down_revision: Union[str, Sequence[str], None] = "0008_product_updated_at_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "categories",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("slug", sa.String(), nullable=False, unique=True, index=True),
+        sa.Column("parent_id", sa.Integer(), sa.ForeignKey("categories.id", ondelete="SET NULL"), index=True),
+        sa.Column("active_product_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    # A nullable column without default is added without rewriting products
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(
+            sa.Column("category_id", sa.Integer(), sa.ForeignKey("categories.id", ondelete="SET NULL", name="fk_products_category_id"))
+        )
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_products_category_id", "products", ["category_id"], if_not_exists=True, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_products_category_id", table_name="products", if_exists=True, postgresql_concurrently=True)
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("category_id")
+    op.drop_table("categories")
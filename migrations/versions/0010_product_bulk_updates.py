@@ -0,0 +1,41 @@
+"""Audit table of bulk catalog updates
+
+One row per POST /product/products/bulk-update with the operation, the
+filter and the ids of the updated products.
+
+Revision ID: 0010_product_bulk_updates
+Revises: 0009_categories
+Create Date: 2026-10-17 00:00:09
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010_product_bulk_updates"
+down_revision: Union[str, Sequence[str], None] = "0009_categories"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "product_bulk_updates",
+        sa.Column("id", sa.Integer(), primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True),
+        sa.Column("operation", sa.String(), nullable=False),
+        sa.Column("value", sa.String(), nullable=True),
+        sa.Column("filters", sa.JSON(), nullable=False),
+        sa.Column("updated_count", sa.Integer(), nullable=False),
+        sa.Column("product_ids", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), index=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("product_bulk_updates")
@@ -0,0 +1,65 @@
+"""Co-purchase counts and related products
+
+product_co_purchases counts the paid orders containing each pair of
+products, related_products keeps the top ones per product for
+GET /product/products/{id}/related. Both are filled by
+`python -m app.cli build-related`, which marks counted orders in
+orders.co_purchases_counted_at.
+
+Revision ID: 0011_product_co_purchases
+Revises: 0010_product_bulk_updates
+Create Date: 2026-10-17 00:00:10
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0011_product_co_purchases"
+down_revision: Union[str, Sequence[str], None] = "0010_product_bulk_updates"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PENDING = "payment_status = 'Paid' AND co_purchases_counted_at IS NULL"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "product_co_purchases",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("related_product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("order_count", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "related_products",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("rank", sa.Integer(), primary_key=True),
+        sa.Column("related_product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("order_count", sa.Integer(), nullable=False),
+    )
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.add_column(sa.Column("co_purchases_counted_at", sa.DateTime(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_orders_co_purchases_pending",
+            "orders",
+            ["id"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+            postgresql_where=sa.text(PENDING),
+            sqlite_where=sa.text(PENDING),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_orders_co_purchases_pending", table_name="orders", if_exists=True, postgresql_concurrently=True)
+    with op.batch_alter_table("orders") as batch_op:
+        batch_op.drop_column("co_purchases_counted_at")
+    op.drop_table("related_products")
+    op.drop_table("product_co_purchases")
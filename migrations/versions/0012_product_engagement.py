@@ -0,0 +1,58 @@
+"""Product engagement counters and trending scores
+
+One row per product with views, cart adds and wishlist adds, written in
+batches by the workers' in-memory counters (app/engagement.py), and the
+trending score behind GET /product/products/trending.
+
+The counters start from the wishlists and carts rows that exist at upgrade
+time, so GET /sales/popular-products keeps its ranking across the upgrade.
+
+Revision ID: 0012_product_engagement
+Revises: 0011_product_co_purchases
+Create Date: 2026-10-17 00:00:11
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0012_product_engagement"
+down_revision: Union[str, Sequence[str], None] = "0011_product_co_purchases"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "product_engagement",
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("view_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("cart_add_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("wishlist_add_count", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("trending_score", sa.Float(), nullable=False, index=True),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+
+    # Backfill the add counts from the current rows. Their times are unknown, so their trending score is 0
+    # (one view at TRENDING_EPOCH in app/engagement.py): they never rank as trending, new engagement outweighs them.
+    if op.get_bind().dialect.name == "postgresql":
+        updated_at = "now() at time zone 'utc'"
+    else:
+        updated_at = "datetime('now')"
+    op.execute(
+        "INSERT INTO product_engagement (product_id, view_count, cart_add_count, wishlist_add_count, trending_score, updated_at) "
+        "SELECT id, 0, "
+        "(SELECT COUNT(*) FROM carts WHERE carts.product_id = products.id), "
+        "(SELECT COUNT(*) FROM wishlists WHERE wishlists.product_id = products.id), "
+        f"0, {updated_at} FROM products "
+        "WHERE id IN (SELECT product_id FROM carts) OR id IN (SELECT product_id FROM wishlists)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("product_engagement")
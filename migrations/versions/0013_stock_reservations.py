@@ -0,0 +1,77 @@
+"""Stock reservations for cart lines
+
+Adding to the cart now holds stock in stock_reservations until the hold
+expires, instead of decrementing products.stock_remaining. The quantities of
+existing cart lines are given back to stock_remaining and held again, so
+carts nobody comes back to free their stock once the holds expire.
+
+Revision ID: 0013_stock_reservations
+Revises: 0012_product_engagement
+Create Date: 2026-10-17 00:00:12
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0013_stock_reservations"
+down_revision: Union[str, Sequence[str], None] = "0012_product_engagement"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Hold of the existing cart lines (STOCK_HOLD_MINUTES default)
+EXISTING_CART_HOLD_MINUTES = 30
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_reservations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("products.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False, index=True),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index(
+        "ux_stock_reservations_user_id_product_id", "stock_reservations", ["user_id", "product_id"], unique=True
+    )
+    op.create_index(
+        "ix_stock_reservations_product_id_expires_at",
+        "stock_reservations",
+        ["product_id", "expires_at"],
+        postgresql_include=["quantity"],
+    )
+
+    # Existing cart lines: give their stock back and hold it instead (duplicate lines are merged)
+    if op.get_bind().dialect.name == "postgresql":
+        expires_at = f"now() at time zone 'utc' + interval '{EXISTING_CART_HOLD_MINUTES} minutes'"
+        created_at = "now() at time zone 'utc'"
+    else:
+        expires_at = f"datetime('now', '+{EXISTING_CART_HOLD_MINUTES} minutes')"
+        created_at = "datetime('now')"
+    op.execute(
+        "INSERT INTO stock_reservations (user_id, product_id, quantity, expires_at, created_at) "
+        f"SELECT user_id, product_id, SUM(quantity), {expires_at}, {created_at} FROM carts "
+        "WHERE user_id IS NOT NULL AND product_id IS NOT NULL GROUP BY user_id, product_id"
+    )
+    op.execute(
+        "UPDATE products SET stock_remaining = stock_remaining + "
+        "(SELECT SUM(quantity) FROM carts WHERE carts.product_id = products.id) "
+        "WHERE id IN (SELECT product_id FROM carts)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Cart lines go back to holding their stock in stock_remaining
+    op.execute(
+        "UPDATE products SET stock_remaining = stock_remaining - "
+        "(SELECT SUM(quantity) FROM carts WHERE carts.product_id = products.id) "
+        "WHERE id IN (SELECT product_id FROM carts)"
+    )
+    op.drop_table("stock_reservations")
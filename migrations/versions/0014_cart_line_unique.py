@@ -0,0 +1,49 @@
+"""One cart line per user and product
+
+Merges duplicate cart lines (quantities are added up into the oldest line)
+and adds the unique (user_id, product_id) index that PATCH /cart/cart/{id}
+and POST /cart/cart/bulk upsert against.
+
+Revision ID: 0014_cart_line_unique
+Revises: 0013_stock_reservations
+Create Date: 2026-10-17 00:00:13
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0014_cart_line_unique"
+down_revision: Union[str, Sequence[str], None] = "0013_stock_reservations"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "UPDATE carts SET quantity = (SELECT SUM(other.quantity) FROM carts other "
+        "WHERE other.user_id = carts.user_id AND other.product_id = carts.product_id) "
+        "WHERE id IN (SELECT MIN(id) FROM carts GROUP BY user_id, product_id HAVING COUNT(*) > 1)"
+    )
+    op.execute(
+        "DELETE FROM carts WHERE id NOT IN (SELECT MIN(id) FROM carts GROUP BY user_id, product_id)"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ux_carts_user_id_product_id",
+            "carts",
+            ["user_id", "product_id"],
+            unique=True,
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ux_carts_user_id_product_id", table_name="carts", if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+
+# The app reads DATABASE_URL on import: point it at a throwaway SQLite file first
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The app with its startup hooks run, tables included."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def login(client):
+    """`login(username, role)` registers a user with that role; returns their auth headers and id."""
+    from app.database import SessionLocal
+    from app.models import User
+
+    def login(username, role):
+        response = client.post("/auth/register", json={
+            "username": username, "password": "pw", "email": f"{username}@example.com", "phone_number": username,
+        })
+        assert response.status_code == 200, response.text
+        db = SessionLocal()
+        user = db.query(User).filter(User.username == username).one()
+        user.role = role
+        user_id = user.id
+        db.commit()
+        db.close()
+        token = client.post("/auth/login", json={"username": username, "password": "pw"}).json()["access_token"]
+        return {"Authorization": f"Bearer {token}"}, user_id
+
+    return login
+
+
+@pytest.fixture(scope="session")
+def add_product(client):
+    """`add_product(headers, vendor_id, name, **fields)` creates a product; returns its id."""
+    def add_product(headers, vendor_id, name, **fields):
+        response = client.post("/product/products", headers=headers, json={
+            "name": name, "description": "", "price": 100.0, "expenditure_cost_inr": 50.0, "discount_percentage": 10.0,
+            "total_stock": 10, "category": "Electronics", "image_url": "", "vendor_id": vendor_id, **fields,
+        })
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+
+    return add_product
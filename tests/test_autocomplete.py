@@ -0,0 +1,46 @@
+import time
+
+from app.autocomplete import AutocompleteIndex, _IndexState
+
+
+class FakeSession:
+    """Answers the index's product reads, recording whether the index lock was held meanwhile."""
+
+    def __init__(self, index, rows):
+        self.index = index
+        self.rows = rows
+        self.locked_during_read = []
+
+    def execute(self, stmt):
+        self.locked_during_read.append(self.index._lock.locked())
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def build_index(rows):
+    index = AutocompleteIndex()
+    index._state = _IndexState()
+    index._state.load(rows)
+    index._built_at = time.monotonic()
+    return index
+
+
+def test_pending_changes_are_read_outside_the_lock():
+    index = build_index([(1, "Wireless Headphones", 4.0, 10, True)])
+    index.invalidate([1, 2])
+    db = FakeSession(index, [(1, "Wireless Headphones", 4.0, 10, True), (2, "Wireless Mouse", 5.0, 50, True)])
+
+    assert index.complete(db, "wire", active_only=True) == [(2, "Wireless Mouse"), (1, "Wireless Headphones")]
+    assert db.locked_during_read == [False]
+    assert index.status()["pending"] == 0
+
+
+def test_deactivated_products_leave_the_active_scope():
+    index = build_index([(1, "Wireless Headphones", 4.0, 10, True)])
+    index.invalidate([1])
+    db = FakeSession(index, [(1, "Wireless Headphones", 4.0, 10, False)])
+
+    assert index.complete(db, "wire", active_only=True) == []
+    assert index.complete(db, "wire", active_only=False) == [(1, "Wireless Headphones")]
@@ -0,0 +1,26 @@
+import pytest
+
+LINES = 10
+
+
+@pytest.fixture(scope="module")
+def carts(client, login, add_product):
+    """Headers of a customer with one cart and wishlist line and of one with LINES of each."""
+    vendor, vendor_id = login("cart-queries-vendor", "vendor")
+    product_ids = [add_product(vendor, vendor_id, f"Cart queries product {i}") for i in range(LINES)]
+
+    (one, _), (many, _) = login("cart-queries-one", "customer"), login("cart-queries-many", "customer")
+    for headers, ids in ((one, product_ids[:1]), (many, product_ids)):
+        for product_id in ids:
+            assert client.post("/cart/cart", json={"product_id": product_id, "quantity": 1}, headers=headers).status_code == 200
+            assert client.post("/cart/wishlist", json={"product_id": product_id}, headers=headers).status_code == 200
+    return one, many
+
+
+@pytest.mark.parametrize("path", ["/cart/cart", "/cart/wishlist"])
+def test_query_count_does_not_grow_with_the_lines(client, carts, path):
+    one, many = carts
+    small, large = client.get(path, headers=one), client.get(path, headers=many)
+    assert small.status_code == large.status_code == 200
+    assert len(large.json()["cart_items"] if path == "/cart/cart" else large.json()) == LINES
+    assert small.headers["X-DB-Query-Count"] == large.headers["X-DB-Query-Count"]
@@ -0,0 +1,41 @@
+import threading
+
+from fastapi import HTTPException
+
+from app.crud.order import place_order
+from app.database import SessionLocal
+from app.models import Order, Product
+
+
+def test_concurrent_checkouts_of_one_cart_place_one_order(client, login, add_product):
+    vendor, vendor_id = login("checkout-vendor", "vendor")
+    product_id = add_product(vendor, vendor_id, "Checkout product", total_stock=10)
+    customer, customer_id = login("checkout-customer", "customer")
+    assert client.post("/cart/cart", json={"product_id": product_id, "quantity": 3}, headers=customer).status_code == 200
+
+    barrier = threading.Barrier(2)
+    outcomes = []
+
+    def checkout():
+        db = SessionLocal()
+        try:
+            barrier.wait()
+            outcomes.append(place_order(db, customer_id).id)
+        except HTTPException as exc:
+            outcomes.append(exc.status_code)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=checkout) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db = SessionLocal()
+    try:
+        assert db.query(Order).filter(Order.user_id == customer_id).count() == 1
+        assert len(outcomes) == 2 and 400 in outcomes  # the second one finds the cart empty
+        assert db.get(Product, product_id).stock_remaining == 7
+    finally:
+        db.close()
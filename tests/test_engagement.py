@@ -0,0 +1,49 @@
+import math
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from app.database import SessionLocal
+from app.engagement import EngagementCounters, _upsert, half_lives_since_epoch
+from app.models import ProductEngagement
+
+
+def test_flushes_of_several_workers_add_up(client, login, add_product):
+    vendor, vendor_id = login("engagement-vendor", "vendor")
+    product_id = add_product(vendor, vendor_id, "Engagement product")
+    workers = [EngagementCounters() for _ in range(4)]
+    for counters in workers:
+        counters.record(product_id, "view", 2)
+        counters.record(product_id, "cart_add")
+
+    barrier = threading.Barrier(len(workers))
+
+    def flush(counters):
+        barrier.wait()
+        counters.flush()
+
+    threads = [threading.Thread(target=flush, args=(counters,)) for counters in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db = SessionLocal()
+    try:
+        row = db.get(ProductEngagement, product_id)
+        assert (row.view_count, row.cart_add_count) == (8, 4)
+        # Four batches of weight 2 * 1 + 5, each scored at about the same time
+        expected = math.log2(4 * 7) + half_lives_since_epoch(datetime.now(timezone.utc))
+        assert abs(row.trending_score - expected) < 0.01
+    finally:
+        db.close()
+
+
+def test_score_is_log_added_by_postgresql_too():
+    class Session:
+        def get_bind(self):
+            return type("Bind", (), {"dialect": postgresql.dialect()})()
+
+    sql = str(_upsert(Session()).compile(dialect=postgresql.dialect()))
+    assert "greatest(product_engagement.trending_score, excluded.trending_score)" in sql
@@ -0,0 +1,81 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app import instrumentation
+from app.instrumentation import SQLInstrumentationMiddleware, query_budget
+
+engine = create_engine("sqlite://")
+
+api = FastAPI()
+api.add_middleware(SQLInstrumentationMiddleware)
+
+
+def run_queries(count: int):
+    with engine.connect() as connection:
+        for _ in range(count):
+            connection.execute(text("SELECT 1"))
+
+
+@api.get("/within")
+@query_budget(2)
+def within_budget():
+    run_queries(2)
+    return {"ok": True}
+
+
+@api.get("/over")
+@query_budget(2)
+def over_budget():
+    run_queries(3)
+    return {"ok": True}
+
+
+@api.get("/stream")
+@query_budget(2)
+def stream():
+    def body():
+        for i in range(3):
+            run_queries(1)
+            yield f"{i}\n"
+    return StreamingResponse(body(), media_type="text/plain")
+
+
+@pytest.fixture
+def strict_client(monkeypatch):
+    monkeypatch.setattr(instrumentation, "SQL_STRICT_MODE", True)
+    return TestClient(api)
+
+
+def test_route_within_budget_reports_its_queries(strict_client):
+    response = strict_client.get("/within")
+    assert response.status_code == 200
+    assert response.headers["X-DB-Query-Count"] == "2"
+
+
+def test_strict_mode_fails_route_over_budget(strict_client):
+    response = strict_client.get("/over")
+    assert response.status_code == 500
+    assert "Query budget exceeded" in response.json()["detail"]
+
+
+def test_budget_is_only_reported_without_strict_mode(monkeypatch):
+    monkeypatch.setattr(instrumentation, "SQL_STRICT_MODE", False)
+    response = TestClient(api).get("/over")
+    assert response.status_code == 200
+    assert response.headers["X-DB-Query-Count"] == "3"
+
+
+def test_streamed_queries_are_counted_after_the_body(strict_client, caplog):
+    with caplog.at_level(logging.INFO, logger=instrumentation.__name__):
+        response = strict_client.get("/stream")
+    assert response.status_code == 200
+    assert response.text == "0\n1\n2\n"
+    # Nothing ran before the headers were sent
+    assert response.headers["X-DB-Query-Count"] == "0"
+    assert "GET /stream status=200 queries=3" in caplog.text
+    assert "Query budget exceeded while streaming" in caplog.text
@@ -0,0 +1,65 @@
+import pytest
+
+from app import instrumentation
+from app.crud.product import product_cache
+from app.database import SessionLocal
+from app.engagement import engagement_counters
+from app.models import RelatedProduct
+
+LINES = 10
+
+
+@pytest.fixture(scope="module")
+def catalog(client, login, add_product):
+    """LINES products, all trending; the first has LINES - 1 related products and reviews, the second one of each."""
+    vendor, vendor_id = login("product-queries-vendor", "vendor")
+    product_ids = [add_product(vendor, vendor_id, f"Query budget gadget {i}") for i in range(LINES)]
+
+    db = SessionLocal()
+    for rank, related_id in enumerate(product_ids[1:], 1):
+        db.add(RelatedProduct(product_id=product_ids[0], rank=rank, related_product_id=related_id, order_count=LINES - rank))
+    db.add(RelatedProduct(product_id=product_ids[1], rank=1, related_product_id=product_ids[2], order_count=1))
+    db.commit()
+    for product_id in product_ids:
+        engagement_counters.record(product_id, "view")
+    engagement_counters.flush(db)
+    db.close()
+
+    customer, _ = login("product-queries-customer", "customer")
+    for product_id, count in ((product_ids[0], LINES - 1), (product_ids[1], 1)):
+        for _ in range(count):
+            review = {"product_id": product_id, "rating": 4, "comment": "Fine"}
+            assert client.post(f"/reviews/products/{product_id}/reviews", json=review, headers=customer).status_code == 200
+    return product_ids
+
+
+@pytest.fixture
+def strict(monkeypatch):
+    """Routes over their query budget fail with a 500."""
+    monkeypatch.setattr(instrumentation, "SQL_STRICT_MODE", True)
+
+
+def cold_get(client, path):
+    """GET with an empty product cache, so every product is read from the database."""
+    product_cache.clear()
+    response = client.get(path)
+    assert response.status_code == 200, response.text
+    return response
+
+
+@pytest.mark.parametrize("small, large, items", [
+    ("/product/products?limit=1", f"/product/products?limit={LINES}", lambda body: body["products"]),
+    ("/product/products/trending?limit=1", f"/product/products/trending?limit={LINES}", lambda body: body),
+    ("/product/products/autocomplete?q=query+budget+gadget+1&limit=1", "/product/products/autocomplete?q=query+budget+gad&limit=10", lambda body: body),
+    ("/product/products/batch?ids={ids[0]}", "/product/products/batch?ids={all}", lambda body: body["products"]),
+    ("/product/products/{ids[1]}/related", "/product/products/{ids[0]}/related", lambda body: body["related"]),
+    ("/reviews/products/{ids[1]}/reviews", "/reviews/products/{ids[0]}/reviews", lambda body: body["reviews"]),
+])
+def test_query_count_does_not_grow_with_the_results(client, catalog, strict, small, large, items):
+    small, large = (path.format(ids=catalog, all=",".join(map(str, catalog))) for path in (small, large))
+    # The first request may build the autocomplete index, later ones only apply pending changes
+    cold_get(client, small)
+    small, large = cold_get(client, small), cold_get(client, large)
+    assert len(items(small.json())) == 1
+    assert len(items(large.json())) >= LINES - 1
+    assert small.headers["X-DB-Query-Count"] == large.headers["X-DB-Query-Count"]
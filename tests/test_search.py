@@ -0,0 +1,44 @@
+import time
+from types import SimpleNamespace
+
+from app.search import ProductSearchIndex, transpositions
+
+
+def build_index(*names):
+    index = ProductSearchIndex()
+    for product_id, name in enumerate(names, start=1):
+        index._state.add(SimpleNamespace(id=product_id, name=name, category="Electronics", description="", is_active=True))
+    index._built_at = time.monotonic()
+    return index
+
+
+def test_transpositions_swap_adjacent_letters():
+    assert "phone" in transpositions("phnoe")
+    assert transpositions("ab") == set()
+
+
+def test_swapped_letters_match_like_the_database_search():
+    index = build_index("Smart Phone", "Laptop Stand")
+    assert index.search(None, "phnoe", active_only=True) == [1]
+    assert index.search(None, "lpatop", active_only=True) == [2]
+
+
+def test_exact_match_ranks_above_a_transposition():
+    # "form" and "from" are transpositions of each other
+    index = build_index("Memory Foam", "From Scratch Kit", "Form Filler")
+    assert index.search(None, "form", active_only=True)[:2] == [3, 2]
+
+
+def test_stale_index_is_rebuilt_outside_the_lock():
+    index = build_index("Smart Phone")
+    index._built_at = time.monotonic() - index.refresh_seconds - 1
+    locked_during_read = []
+
+    class Session:
+        def execute(self, stmt):
+            locked_during_read.append(index._lock.locked())
+            return [SimpleNamespace(id=2, name="Laptop Stand", category="Electronics", description="", is_active=True)]
+
+    assert index.search(Session(), "laptop", active_only=True) == [2]
+    assert index.search(Session(), "phone", active_only=True) == []
+    assert locked_during_read == [False]